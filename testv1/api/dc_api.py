@@ -1,17 +1,41 @@
-import requests
+import asyncio
+import aiohttp
 from bs4 import BeautifulSoup
-from datetime import datetime
+from config import Config
 
 class DCInsideAPI:
-    def __init__(self, app):
-        self.app = app
-        self.session = requests.Session()
-        self.session.headers.update({'User-Agent': app.config['USER_AGENT']})
-
-    def fetch_post_list(self, gallery_id, page=1):
-        url = f'https://gall.dcinside.com/board/lists/?id={gallery_id}&page={page}'
-        response = self.session.get(url)
-        soup = BeautifulSoup(response.text, 'html.parser')
+    """aiohttp 기반 디시인사이드 클라이언트. 동시 요청 수는 max_concurrent개로 제한한다."""
+
+    def __init__(self, user_agent=Config.USER_AGENT, timeout=Config.REQUEST_TIMEOUT,
+                 max_concurrent=Config.MAX_CONCURRENT_TASKS, base_url='https://gall.dcinside.com'):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.max_concurrent = max_concurrent
+        self.base_url = base_url
+        # 세션과 세마포어는 이벤트 루프 안에서 만들어야 하므로 첫 요청 때 만든다
+        self.session = None
+        self.semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def fetch_document(self, path, params):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                headers={'User-Agent': self.user_agent},
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self.semaphore = asyncio.Semaphore(self.max_concurrent)
+        async with self.semaphore:
+            async with self.session.get(f'{self.base_url}{path}', params=params) as response:
+                response.raise_for_status()
+                text = await response.text()
+        return BeautifulSoup(text, 'html.parser')
+
+    async def fetch_post_list(self, gallery_id, page=1):
+        soup = await self.fetch_document('/board/lists/', {'id': gallery_id, 'page': page})
         posts = []
 
         for row in soup.select('tr.ub-content'):
@@ -26,11 +50,21 @@ class DCInsideAPI:
 
         return posts
 
-    def fetch_post_detail(self, gallery_id, post_id):
-        url = f'https://gall.dcinside.com/board/view/?id={gallery_id}&no={post_id}'
-        response = self.session.get(url)
-        soup = BeautifulSoup(response.text, 'html.parser')
+    async def fetch_post_document(self, gallery_id, post_id):
+        # 게시물 페이지는 한 번만 받아 본문과 댓글 추출에 함께 사용한다
+        return await self.fetch_document('/board/view/', {'id': gallery_id, 'no': post_id})
 
+    async def fetch_post_with_comments(self, gallery_id, post_id):
+        soup = await self.fetch_post_document(gallery_id, post_id)
+        return self.parse_post_detail(post_id, soup), self.parse_comments(soup)
+
+    async def fetch_post_detail(self, gallery_id, post_id):
+        return self.parse_post_detail(post_id, await self.fetch_post_document(gallery_id, post_id))
+
+    async def fetch_comments(self, gallery_id, post_id):
+        return self.parse_comments(await self.fetch_post_document(gallery_id, post_id))
+
+    def parse_post_detail(self, post_id, soup):
         post = {}
         post['id'] = post_id
         post['title'] = soup.select_one('.title_subject').text.strip()
@@ -39,16 +73,13 @@ class DCInsideAPI:
         post['date'] = soup.select_one('.gall_date').text.strip()
         post['view_count'] = soup.select_one('.gall_count').text.strip()
         post['comment_count'] = soup.select_one('.gall_comment').text.strip()
-        
+
         # 이미지 URL 추출
         post['images'] = [img['src'] for img in soup.select('.write_div img')]
 
         return post
 
-    def fetch_comments(self, gallery_id, post_id):
-        url = f'https://gall.dcinside.com/board/view/?id={gallery_id}&no={post_id}'
-        response = self.session.get(url)
-        soup = BeautifulSoup(response.text, 'html.parser')
+    def parse_comments(self, soup):
         comments = []
 
         for comment in soup.select('.comment_box'):
@@ -61,5 +92,7 @@ class DCInsideAPI:
 
         return comments
 
-    def close(self):
-        self.session.close()
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
@@ -1,7 +1,17 @@
 # api/utils.py
 from datetime import datetime
 
+# 본문 페이지는 연도까지, 목록/댓글은 올해 글이면 연도 없이 시각을 보여준다
+TIME_FORMATS = ('%Y.%m.%d %H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y.%m.%d %H:%M', '%m.%d %H:%M:%S', '%Y.%m.%d', '%y.%m.%d')
+
 def parse_time(time_str):
-    # 문자열 형태의 시간을 datetime 객체로 변환하는 함수
-    # 예시 구현
-    return datetime.strptime(time_str, '%Y.%m.%d %H:%M:%S')
+    # 문자열 형태의 시간을 datetime 객체로 변환하는 함수. 알 수 없는 형식이면 None
+    for time_format in TIME_FORMATS:
+        try:
+            parsed = datetime.strptime(time_str, time_format)
+        except ValueError:
+            continue
+        if '%Y' not in time_format and '%y' not in time_format:
+            parsed = parsed.replace(year=datetime.now().year)
+        return parsed
+    return None
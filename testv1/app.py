@@ -1,8 +1,9 @@
 from flask import Flask, render_template, request, jsonify, abort, redirect, url_for, flash
 from config import Config
-from models import db, Gallery, Post, Comment, Image, CrawlingTask
-from api.dc_api import DCInsideAPI
+from models import db, Gallery, Post, Comment, CrawlingTask, ensure_indexes
+from crawler import crawl_gallery_once
 from datetime import datetime
+import asyncio
 import logging
 from logging.handlers import RotatingFileHandler
 
@@ -19,6 +20,8 @@ app.logger.setLevel(logging.INFO)
 with app.app_context():
 	db.drop_all()
 	db.create_all()
+	with db.engine.begin() as connection:
+		ensure_indexes(connection)
 
 
 @app.route('/')
@@ -64,67 +67,23 @@ def start_crawling(gallery_id):
     return jsonify({"success": True, "message": f"{gallery.name} 갤러리 크롤링이 시작되었습니다.", "task_id": task.id})
 
 def crawl_gallery(gallery_id, task_id):
-    api = DCInsideAPI(app)
     task = CrawlingTask.query.get(task_id)
     task.status = 'running'
     db.session.commit()
     
     try:
         app.logger.info(f"Starting crawling for gallery {gallery_id}")
-        posts = api.fetch_post_list(gallery_id)
-        for post_data in posts:
-            existing_post = Post.query.filter_by(id=post_data['id'], gallery_id=gallery_id).first()
-            if existing_post:
-                existing_post.title = post_data['title']
-                existing_post.content = post_data['content']
-                existing_post.updated_at = datetime.now()
-                app.logger.info(f"Updated post {existing_post.id}")
-            else:
-                new_post = Post(
-                    id=post_data['id'],
-                    gallery_id=gallery_id,
-                    title=post_data['title'],
-                    author=post_data['author'],
-                    content=post_data['content'],
-                    created_at=post_data['created_at']
-                )
-                db.session.add(new_post)
-                app.logger.info(f"Added new post {new_post.id}")
-            
-            comments = api.fetch_comments(gallery_id, post_data['id'])
-            for comment_data in comments:
-                existing_comment = Comment.query.filter_by(id=comment_data['id'], post_id=post_data['id']).first()
-                if not existing_comment:
-                    new_comment = Comment(
-                        id=comment_data['id'],
-                        post_id=post_data['id'],
-                        author=comment_data['author'],
-                        content=comment_data['content'],
-                        created_at=comment_data['created_at']
-                    )
-                    db.session.add(new_comment)
-                    app.logger.info(f"Added new comment {new_comment.id} for post {post_data['id']}")
-            
-            for image_url in post_data.get('images', []):
-                existing_image = Image.query.filter_by(file_path=image_url).first()
-                if not existing_image:
-                    new_image = Image(file_path=image_url)
-                    db.session.add(new_image)
-                    new_post.images.append(new_image)
-                    app.logger.info(f"Added new image {image_url} for post {post_data['id']}")
-        
-        db.session.commit()
+        # 게시물/댓글/이미지는 비동기 데이터 계층이 페이지 단위 bulk upsert로 저장한다
+        processed = asyncio.run(crawl_gallery_once(gallery_id))
         task.status = 'completed'
         task.completed_at = datetime.now()
         db.session.commit()
-        app.logger.info(f"Crawling completed for gallery {gallery_id}")
+        app.logger.info(f"Crawling completed for gallery {gallery_id}: {processed} posts")
     except Exception as e:
         app.logger.error(f"Crawling error for gallery {gallery_id}: {str(e)}")
         task.status = 'failed'
         task.error_message = str(e)
         db.session.commit()
-    finally:
-        api.close()
 
 @app.route('/api/crawling_status')
 def crawling_status():
@@ -156,8 +115,13 @@ def add_gallery():
 def search():
     query = request.args.get('q', '')
     page = request.args.get('page', 1, type=int)
-    posts = Post.query.filter(Post.title.contains(query) | Post.content.contains(query)).paginate(page=page, per_page=20)
-    return render_template('search_results.html', posts=posts, query=query)
+    if db.engine.dialect.name == 'mysql':
+        # 앞에 %가 붙은 LIKE는 인덱스를 못 타고 전체 게시물을 훑으므로 FULLTEXT 인덱스로 찾는다
+        condition = db.text("MATCH (posts.title, posts.content) AGAINST (:query IN NATURAL LANGUAGE MODE)").bindparams(query=query)
+    else:
+        condition = Post.title.contains(query) | Post.content.contains(query)
+    posts = Post.query.filter(condition).paginate(page=page, per_page=20)
+    return render_template('search_result.html', posts=posts, query=query)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,126 @@
+# async_db.py
+"""크롤러용 비동기 데이터 계층.
+
+웹 페이지는 Flask-SQLAlchemy 세션을 그대로 쓰고, 크롤러는 같은 테이블을 비동기 엔진(aiomysql)으로
+저장한다. 목록 한 페이지의 게시물/댓글/이미지는 배치마다 기존 id를 한 번에 조회한 뒤 dialect별
+upsert(MySQL은 INSERT ... ON DUPLICATE KEY UPDATE) 한 문장으로 저장하므로, 게시물/댓글/이미지마다
+조회하던 것과 달리 페이지 하나가 몇 개의 문장으로 끝난다.
+"""
+import logging
+from sqlalchemy import and_, case, select
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from config import Config
+from models import Gallery, Post, Comment, Image, PostImage
+
+logger = logging.getLogger(__name__)
+
+galleries = Gallery.__table__
+posts = Post.__table__
+comments = Comment.__table__
+images = Image.__table__
+post_images = PostImage.__table__
+
+def create_engine(url=Config.ASYNC_DATABASE_URI):
+    # MySQL은 wait_timeout이 지난 유휴 연결을 끊으므로 그 전에 연결을 바꾼다
+    return create_async_engine(url, pool_recycle=3600, pool_pre_ping=True)
+
+def create_session_factory(engine):
+    return sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+def batches(rows, size=Config.UPSERT_BATCH_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+def upsert_statement(dialect, table, rows, update_columns, match_columns=()):
+    """dialect별 bulk upsert. update_columns가 비어 있으면 이미 있는 행은 그대로 둔다.
+
+    match_columns를 주면 이미 있는 행은 그 열 값이 새 행과 같을 때만 갱신한다.
+    """
+    if dialect.name == 'mysql':
+        statement = mysql.insert(table).values(rows)
+        if not update_columns:
+            # 기본 키를 자기 값으로 바꾸는 것은 아무것도 바꾸지 않는다 (INSERT IGNORE는 다른 오류도 삼킨다)
+            update_columns = [column.name for column in table.primary_key]
+        # ON DUPLICATE KEY UPDATE에는 WHERE가 없으므로 열마다 조건이 맞지 않으면 원래 값을 둔다
+        matches = and_(*(table.c[name] == statement.inserted[name] for name in match_columns))
+        return statement.on_duplicate_key_update({
+            name: case((matches, statement.inserted[name]), else_=table.c[name]) if match_columns
+            else statement.inserted[name]
+            for name in update_columns})
+    if dialect.name == 'sqlite':
+        # 개발용 sqlite+aiosqlite
+        statement = sqlite.insert(table).values(rows)
+        if not update_columns:
+            return statement.on_conflict_do_nothing()
+        return statement.on_conflict_do_update(
+            index_elements=[column.name for column in table.primary_key],
+            set_={name: statement.excluded[name] for name in update_columns},
+            where=and_(*(table.c[name] == statement.excluded[name] for name in match_columns))
+            if match_columns else None)
+    raise NotImplementedError(f"지원하지 않는 데이터베이스: {dialect.name}")
+
+async def upsert(session, table, rows, update_columns=(), match_columns=()):
+    dialect = session.bind.dialect
+    for batch in batches(rows):
+        await session.execute(upsert_statement(dialect, table, batch, update_columns, match_columns))
+
+async def existing_values(session, column, values, result_column=None):
+    """values 중 이미 있는 값 -> 행 id(result_column을 주면 그 열 값). 배치마다 IN 조회 한 번."""
+    result_column = column.table.c.id if result_column is None else result_column
+    found = {}
+    for batch in batches(list(values)):
+        result = await session.execute(select(column, result_column).where(column.in_(batch)))
+        found.update(result.all())
+    return found
+
+async def get_galleries(session):
+    result = await session.execute(select(galleries))
+    return [dict(row._mapping) for row in result]
+
+async def save_posts(session, gallery_id, items):
+    """items: (게시물, 댓글 목록, 이미지 URL 목록). 호출한 쪽의 트랜잭션 안에서 저장하고 (새 게시물 수, 새 댓글 수)."""
+    if not items:
+        return 0, 0
+    # posts.id는 디시인사이드 글번호라 갤러리 안에서만 유일하므로 다른 갤러리의 게시물은 덮어쓰지 않는다
+    existing_posts = await existing_values(session, posts.c.id, [post['id'] for post, _, _ in items], posts.c.gallery_id)
+    conflicts = sorted(post_id for post_id, owner in existing_posts.items() if owner != gallery_id)
+    if conflicts:
+        logger.warning(f"갤러리 {gallery_id}: 다른 갤러리에 같은 번호로 저장된 게시물 {len(conflicts)}개는 저장하지 않습니다 "
+                       f"({', '.join(map(str, conflicts[:10]))})")
+        items = [item for item in items if item[0]['id'] not in existing_posts or
+                 existing_posts[item[0]['id']] == gallery_id]
+        existing_posts = {post_id: owner for post_id, owner in existing_posts.items() if owner == gallery_id}
+        if not items:
+            return 0, 0
+    post_rows = [post for post, _, _ in items]
+    comment_rows = [comment for _, post_comments, _ in items for comment in post_comments]
+
+    # 조회한 뒤 다른 갤러리 크롤링이 같은 번호를 넣었어도 덮어쓰지 않도록 문장에서도 갤러리를 확인한다
+    await upsert(session, posts, post_rows, ('title', 'content'), match_columns=('gallery_id',))
+
+    if comment_rows:
+        existing_comments = await existing_values(session, comments.c.id, [row['id'] for row in comment_rows])
+        # 댓글은 수정되지 않으므로 새 댓글만 넣는다
+        await upsert(session, comments, comment_rows)
+    else:
+        existing_comments = {}
+
+    urls = {url for _, _, post_urls in items for url in post_urls}
+    if urls:
+        image_ids = await existing_values(session, images.c.file_path, urls)
+        new_urls = urls - image_ids.keys()
+        if new_urls:
+            # 여러 행 INSERT는 새 id를 모두 돌려주지 않으므로 넣은 뒤 URL로 다시 조회한다
+            await upsert(session, images, [{'file_path': url} for url in sorted(new_urls)])
+            image_ids.update(await existing_values(session, images.c.file_path, new_urls))
+        links = [{'post_id': post['id'], 'image_id': image_ids[url]}
+                 for post, _, post_urls in items for url in dict.fromkeys(post_urls)]
+        await upsert(session, post_images, links)
+
+    new_posts = len(post_rows) - len(existing_posts)
+    new_comments = len(comment_rows) - len(existing_comments)
+    logger.info(f"갤러리 {gallery_id}: 게시물 {len(post_rows)}개 저장 (새 게시물 {new_posts}개, 새 댓글 {new_comments}개, "
+                f"이미지 {len(urls)}개)")
+    return new_posts, new_comments
@@ -10,3 +10,8 @@ class Config:
     USER_AGENT = 'Your User Agent'
     MAX_CONCURRENT_TASKS = 5
     REQUEST_TIMEOUT = 10
+    # 크롤러(crawler.py)가 쓰는 비동기 드라이버. 따로 지정하지 않으면 DATABASE_URL의 드라이버만 aiomysql로 바꾼다
+    ASYNC_DATABASE_URI = os.getenv('ASYNC_DATABASE_URL', SQLALCHEMY_DATABASE_URI.replace('+pymysql', '+aiomysql'))
+    MAX_CONCURRENT_GALLERIES = 2
+    # 한 번의 INSERT ... ON DUPLICATE KEY UPDATE에 넣을 최대 행 수 (max_allowed_packet을 넘지 않도록)
+    UPSERT_BATCH_SIZE = 500
@@ -1,27 +1,93 @@
 # crawler.py
 import asyncio
+import logging
+import aiohttp
+from datetime import datetime
 from api.dc_api import DCInsideAPI
+from api.utils import parse_time
 from config import Config
-from models import db, Gallery, Post, Comment, Image
-from app import app
-
-async def crawl_galleries():
-    async with app.app_context():
-        galleries = Gallery.query.all()
-        tasks = []
-        for gallery in galleries:
-            tasks.append(crawl_gallery(gallery))
-        await asyncio.gather(*tasks)
-
-async def crawl_gallery(gallery):
-    api = DCInsideAPI(app)
+from models import ensure_indexes
+import async_db
+
+logger = logging.getLogger(__name__)
+
+def build_rows(gallery_id, listed, detail, comments):
+    """API 결과를 posts/comments 행과 이미지 URL 목록으로 바꾼다."""
+    post_id = int(listed['id'])
+    post = {
+        'id': post_id,
+        'gallery_id': gallery_id,
+        'title': (detail['title'] or listed['title'])[:200],
+        'author': (detail['author'] or listed['author'])[:100],
+        'content': detail['content'],
+        'created_at': parse_time(detail['date']) or parse_time(listed['date']) or datetime.now(),
+    }
+    comment_rows = [{
+        'id': int(comment['id']),
+        'post_id': post_id,
+        'author': comment['author'][:100],
+        'content': comment['content'],
+        'created_at': parse_time(comment['date']) or post['created_at'],
+    } for comment in comments if comment['id'].isdigit()]
+    # images.file_path 길이를 넘는 URL은 저장할 수 없다
+    image_urls = [url for url in detail.get('images', []) if len(url) <= 200]
+    return post, comment_rows, image_urls
+
+async def fetch_post(api, gallery_id, listed):
+    try:
+        detail, comments = await api.fetch_post_with_comments(gallery_id, listed['id'])
+    except (aiohttp.ClientError, asyncio.TimeoutError, AttributeError) as e:
+        logger.error(f"게시물 {listed['id']} 크롤링 실패: {e}")
+        return None
+    return build_rows(gallery_id, listed, detail, comments)
+
+async def crawl_gallery(api, session_factory, gallery_id, page=1):
+    """목록 한 페이지의 게시물을 동시에 받아(동시 요청 수는 api가 제한) 한 트랜잭션으로 저장한다."""
+    listed_posts = await api.fetch_post_list(gallery_id, page)
+    # 공지/설문 행은 글번호 대신 글자가 있다
+    listed_posts = list({post['id']: post for post in listed_posts if post['id'].isdigit()}.values())
+    items = [item for item in await asyncio.gather(*(fetch_post(api, gallery_id, post) for post in listed_posts))
+             if item is not None]
+    async with session_factory() as session:
+        async with session.begin():
+            await async_db.save_posts(session, gallery_id, items)
+    return len(items)
+
+async def crawl_gallery_once(gallery_id, page=1):
+    """관리자 페이지의 크롤링 요청용. 엔진을 만들어 갤러리 한 페이지를 크롤링하고 정리한다."""
+    engine = async_db.create_engine()
+    try:
+        async with DCInsideAPI() as api:
+            return await crawl_gallery(api, async_db.create_session_factory(engine), gallery_id, page)
+    finally:
+        await engine.dispose()
+
+async def crawl_galleries(max_concurrent_galleries=Config.MAX_CONCURRENT_GALLERIES):
+    engine = async_db.create_engine()
+    session_factory = async_db.create_session_factory(engine)
+    # 갤러리 수만큼 한꺼번에 띄우지 않고 max_concurrent_galleries개씩만 크롤링한다
+    semaphore = asyncio.Semaphore(max_concurrent_galleries)
+
+    async def crawl(api, gallery):
+        async with semaphore:
+            try:
+                processed = await crawl_gallery(api, session_factory, gallery['id'])
+                logger.info(f"갤러리 {gallery['id']} 크롤링 완료: 게시물 {processed}개")
+            except Exception as e:
+                # 한 갤러리가 실패해도 나머지는 계속한다
+                logger.error(f"갤러리 {gallery['id']} 크롤링 실패: {e}")
+
     try:
-        posts = await api.fetch_post_list(gallery.id)
-        for post_data in posts:
-            # 데이터베이스에 게시물 저장
-            pass
+        async with engine.begin() as connection:
+            # 웹 앱을 띄우지 않고 기존 데이터베이스에 바로 크롤링할 때도 upsert에 필요한 색인을 맞춘다
+            await connection.run_sync(ensure_indexes)
+        async with session_factory() as session:
+            galleries = await async_db.get_galleries(session)
+        async with DCInsideAPI() as api:
+            await asyncio.gather(*(crawl(api, gallery) for gallery in galleries))
     finally:
-        await api.close()
+        await engine.dispose()
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     asyncio.run(crawl_galleries())
@@ -1,8 +1,11 @@
 # models.py
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, select, func, text
 from datetime import datetime
+import logging
 
 db = SQLAlchemy()
+logger = logging.getLogger(__name__)
 
 class Gallery(db.Model):
     __tablename__ = 'galleries'
@@ -22,6 +25,8 @@ class CrawlingTask(db.Model):
 
 class Post(db.Model):
     __tablename__ = 'posts'
+    # MySQL에서는 /search가 MATCH ... AGAINST로 찾는다
+    __table_args__ = (db.Index('ix_posts_title_content', 'title', 'content', mysql_prefix='FULLTEXT'),)
     id = db.Column(db.Integer, primary_key=True)
     gallery_id = db.Column(db.String(50), db.ForeignKey('galleries.id'), nullable=False)  # 변경된 부분
     title = db.Column(db.String(200), nullable=False)
@@ -42,9 +47,49 @@ class Comment(db.Model):
 class Image(db.Model):
     __tablename__ = 'images'
     id = db.Column(db.Integer, primary_key=True)
-    file_path = db.Column(db.String(200), nullable=False)
+    file_path = db.Column(db.String(200), nullable=False, unique=True)
 
 class PostImage(db.Model):
     __tablename__ = 'post_images'
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), primary_key=True)
     image_id = db.Column(db.Integer, db.ForeignKey('images.id'), primary_key=True)
+
+def merge_duplicate_images(connection):
+    """file_path가 같은 images 행을 가장 작은 id 하나로 합치고 post_images 연결을 그 행으로 옮긴다."""
+    images, post_images = Image.__table__, PostImage.__table__
+    duplicates = connection.execute(
+        select(images.c.file_path, func.min(images.c.id))
+        .group_by(images.c.file_path).having(func.count(images.c.id) > 1)).all()
+    for file_path, keep_id in duplicates:
+        linked = set(connection.execute(
+            select(post_images.c.post_id).where(post_images.c.image_id == keep_id)).scalars())
+        duplicate_ids = list(connection.execute(
+            select(images.c.id).where(images.c.file_path == file_path, images.c.id != keep_id)).scalars())
+        links = connection.execute(select(post_images).where(post_images.c.image_id.in_(duplicate_ids))).all()
+        for post_id, image_id in links:
+            link = (post_images.c.post_id == post_id) & (post_images.c.image_id == image_id)
+            if post_id in linked:
+                connection.execute(post_images.delete().where(link))
+            else:
+                connection.execute(post_images.update().where(link).values(image_id=keep_id))
+                linked.add(post_id)
+        connection.execute(images.delete().where(images.c.id.in_(duplicate_ids)))
+    return len(duplicates)
+
+def ensure_indexes(connection):
+    """create_all은 이미 있는 테이블을 바꾸지 않으므로, 예전에 만든 테이블에 없는 색인을 추가한다.
+
+    images.file_path 유일 색인이 없으면 크롤러의 이미지 upsert가 매번 새 행을 넣고, FULLTEXT 색인이
+    없으면 MySQL의 /search가 실패한다.
+    """
+    inspector = inspect(connection)
+    image_indexes = inspector.get_indexes('images') + inspector.get_unique_constraints('images')
+    if not any(index['column_names'] == ['file_path'] and index.get('unique', True) for index in image_indexes):
+        merged = merge_duplicate_images(connection)
+        connection.execute(text("CREATE UNIQUE INDEX uq_images_file_path ON images (file_path)"))
+        logger.info(f"images.file_path 유일 색인 추가 (중복 이미지 {merged}개 합침)")
+    if connection.dialect.name == 'mysql':
+        post_indexes = inspector.get_indexes('posts')
+        if not any(index['column_names'] == ['title', 'content'] for index in post_indexes):
+            connection.execute(text("CREATE FULLTEXT INDEX ix_posts_title_content ON posts (title, content)"))
+            logger.info("posts FULLTEXT 색인 추가")
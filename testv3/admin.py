@@ -1,11 +1,7 @@
-from flask import Blueprint, render_template, request, jsonify, send_file
+from flask import Blueprint, Response, render_template, request, jsonify, abort, stream_with_context
 from database import get_db
-from gallery_crawler import crawl_gallery
-from comment_crawler import crawl_comments
-from config import OUTPUT_FOLDER
-import csv
-import io
-import threading
+from export import EXPORT_FORMATS, export_posts, export_filename, export_mimetype
+from worker import enqueue_crawl
 
 
 admin = Blueprint('admin', __name__, url_prefix='/admin')
@@ -13,9 +9,7 @@ admin = Blueprint('admin', __name__, url_prefix='/admin')
 @admin.route('/')
 @admin.route('/panel')
 def admin_panel():
-    db = get_db()
-    progress = db.get_crawling_progress()
-    return render_template('admin/panel.html', progress=progress)
+    return render_template('admin/panel.html')
 
 @admin.route('/crawling_status')
 def crawling_status():
@@ -33,34 +27,56 @@ def crawling_status():
 
 @admin.route('/start_crawling', methods=['POST'])
 def start_crawling():
+    """크롤링 작업을 큐에 등록한다. 실행은 워커 프로세스(main.py --worker)가 맡는다."""
     crawl_type = request.form.get('type')
     target_url = request.form.get('target_url')
+    options = {}
+    if crawl_type == 'gallery':
+        options = {'engine': request.form.get('engine', 'sync'),
+                   'incremental': request.form.get('incremental') in ('1', 'true', 'on')}
+    try:
+        job_id = enqueue_crawl(get_db(), crawl_type, target_url, **options)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({'message': f'크롤링 작업 {job_id}이(가) 등록되었습니다.', 'job_id': job_id})
 
-    def crawl_task():
-        if crawl_type == 'gallery':
-            crawl_gallery(target_url, OUTPUT_FOLDER)
-        elif crawl_type == 'comments':
-            crawl_comments(target_url)
-        else:
-            logger.error('Invalid crawl type')
+@admin.route('/jobs')
+def jobs():
+    db = get_db()
+    return jsonify({
+        'counts': db.get_job_counts(),
+        'jobs': db.get_jobs(request.args.get('limit', 20, type=int), request.args.get('status')),
+    })
 
-    threading.Thread(target=crawl_task).start()
-    return jsonify({'message': '크롤링 작업이 시작되었습니다.'})
+@admin.route('/galleries')
+def galleries():
+    """스케줄러가 관리하는 갤러리별 도착률/폴링 간격/다음 폴링 시각."""
+    return jsonify({'galleries': get_db().get_gallery_schedule()})
+
+@admin.route('/crawl_runs')
+def crawl_runs():
+    """최근 크롤링 실행별 진행도 (목록 페이지, 게시물, 댓글 페이지, 이미지). 실행 중이면 체크포인트에서 센다."""
+    return jsonify({'runs': get_db().get_crawl_runs(request.args.get('limit', 10, type=int))})
+
+@admin.route('/jobs/<int:job_id>/retry', methods=['POST'])
+def retry_job(job_id):
+    if not get_db().requeue_job(job_id):
+        abort(404)
+    return jsonify({'message': f'작업 {job_id}을(를) 다시 등록했습니다.'})
     
+@admin.route('/export')
 @admin.route('/export_csv')
 def export_csv():
-    db = get_db()
-    db.cursor.execute("SELECT * FROM posts")
-    posts = db.cursor.fetchall()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['id', 'number', 'title', 'author', 'date', 'views', 'votes', 'content'])  # CSV 헤더
-    for post in posts:
-        writer.writerow(post)
-    output.seek(0)
-    return send_file(
-        output,
-        mimetype='text/csv',
-        as_attachment=True,
-        attachment_filename='posts_export.csv'
+    """게시물 내보내기. ?format=csv|jsonl, ?gzip=1, ?include=comments,images"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+    compress = request.args.get('gzip', '0') in ('1', 'true', 'yes')
+    include = {item for value in request.args.getlist('include') for item in value.split(',') if item}
+    chunks = export_posts(get_db(), fmt, compress,
+                          include_comments='comments' in include, include_images='images' in include)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=export_mimetype(fmt, compress),
+        headers={'Content-Disposition': f'attachment; filename={export_filename(fmt, compress)}'}
     )
@@ -0,0 +1,355 @@
+import asyncio
+import time
+import logging
+from urllib.parse import urlparse
+import aiohttp
+from config import (MAX_PAGES, CONCURRENCY_PER_HOST, REQUESTS_PER_SECOND, REQUEST_BURST,
+                    COMMENT_MAX_PAGES, HTTP_RETRIES, HTTP_RETRY_STATUSES, PARSE_WORKERS,
+                    PIPELINE_QUEUE_SIZE)
+from database import get_db
+from gallery_crawler import (build_post, save_post, crawl_comments, select_changed_posts,
+                             reached_high_water_mark)
+from galleries import get_gallery_id
+from comment_crawler import build_comment_request
+from parse_pool import create_parse_executor, parse_list_page, parse_view_page, parse_comment_page
+from image_downloader import ImageDownloader
+from http_cache import get_cache
+from http_client import create_async_session, retry_delay
+from checkpoints import CrawlRun
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """초당 rate개씩 채워지는 토큰 버킷. 고정 sleep 대신 요청 속도를 제한한다."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class HostLimiter:
+    """호스트별 동시 요청 수와 요청 속도를 함께 제한한다."""
+
+    def __init__(self, concurrency, rate, burst):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate, burst)
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            self.semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+
+class Stage:
+    """파이프라인 단계. inbox의 항목을 handler로 처리해 다음 단계의 inbox에 넣는 작업 workers개."""
+
+    def __init__(self, handler, workers, queue_size=PIPELINE_QUEUE_SIZE):
+        self.handler = handler
+        self.workers = max(workers, 1)
+        # 큐가 가득 차면 앞 단계가 기다리므로 느린 단계 앞에 받은 페이지가 끝없이 쌓이지 않는다
+        self.inbox = asyncio.Queue(queue_size)
+
+    async def run(self, next_stage=None):
+        async def work():
+            while (item := await self.inbox.get()) is not None:
+                result = await self.handler(item)
+                if next_stage is not None:
+                    await next_stage.inbox.put(result)
+
+        await asyncio.gather(*(work() for _ in range(self.workers)))
+        if next_stage is not None:
+            await next_stage.close()
+
+    async def close(self):
+        # 작업마다 종료 신호를 하나씩 넣는다
+        for _ in range(self.workers):
+            await self.inbox.put(None)
+
+class AsyncGalleryCrawler:
+    def __init__(self, db, concurrency_per_host=CONCURRENCY_PER_HOST,
+                 requests_per_second=REQUESTS_PER_SECOND, burst=REQUEST_BURST,
+                 selenium_fallback=True, downloader=None, parse_workers=PARSE_WORKERS):
+        self.db = db
+        self.concurrency_per_host = concurrency_per_host
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.selenium_fallback = selenium_fallback
+        self.downloader = downloader
+        self.parse_workers = parse_workers
+        self.parse_executor = None
+        self.limiters = {}
+        self.session = None
+        self.run = None
+        self.cache = get_cache()
+
+    def limiter(self, url):
+        host = urlparse(url).netloc
+        if host not in self.limiters:
+            self.limiters[host] = HostLimiter(self.concurrency_per_host,
+                                              self.requests_per_second, self.burst)
+        return self.limiters[host]
+
+    async def request(self, method, url, **kwargs):
+        """429/5xx와 연결 오류는 백오프하며 재시도한다. 마지막 (응답, 본문)을 반환한다."""
+        for attempt in range(HTTP_RETRIES + 1):
+            retry_after = None
+            try:
+                async with self.limiter(url):
+                    async with self.session.request(method, url, **kwargs) as response:
+                        body = await response.read()
+                        if response.status not in HTTP_RETRY_STATUSES or attempt == HTTP_RETRIES:
+                            return response, body
+                        retry_after = response.headers.get('Retry-After')
+                        logger.warning(f"요청 실패 ({response.status}), 재시도 {attempt + 1}/{HTTP_RETRIES}: {url}")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == HTTP_RETRIES:
+                    raise
+                logger.warning(f"연결 오류, 재시도 {attempt + 1}/{HTTP_RETRIES}: {url}: {e}")
+            # 대기하는 동안에는 호스트 동시성 슬롯을 다른 요청에 넘긴다
+            await asyncio.sleep(retry_delay(attempt, retry_after))
+
+    async def fetch(self, url):
+        """(본문 바이트, charset). 디코딩과 파싱은 파서 풀에서 한다. 실패하면 None."""
+        entry = self.cache.get(url) if self.cache else None
+        if entry and entry.is_fresh:
+            return entry.body, entry.charset
+        headers = entry.conditional_headers() if entry else None
+        response, body = await self.request('GET', url, headers=headers)
+        if response.status == 304 and entry:
+            self.cache.refresh(entry, response.headers)
+            return entry.body, entry.charset
+        if response.status != 200:
+            logger.warning(f"요청 실패 ({response.status}): {url}")
+            return None
+        if self.cache:
+            self.cache.put(url, response.headers, body)
+        return body, response.charset
+
+    async def parse(self, function, *args):
+        """파서 풀이 있으면 풀에서, 없으면 이벤트 루프에서 파싱한다."""
+        if self.parse_executor is None:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.parse_executor, function, *args)
+
+    async def fetch_comments(self, post_url, params, progress=None):
+        comments, start_page = progress.resume() if progress else ([], 1)
+        for page in range(start_page, COMMENT_MAX_PAGES + 1):
+            url, data, headers = build_comment_request(post_url, params, page)
+            try:
+                response, body = await self.request('POST', url, data=data, headers=headers)
+                response.raise_for_status()
+                page_comments, total = await self.parse(parse_comment_page, body)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning(f"댓글 AJAX 요청 실패 ({post_url}, 페이지 {page}): {e}")
+                return None
+
+            comments.extend(page_comments)
+            last = not page_comments or len(comments) >= total or page == COMMENT_MAX_PAGES
+            if progress:
+                progress.page_done(page, page_comments, total, last)
+            if last:
+                break
+        return comments
+
+    async def fetch_post(self, post):
+        """본문 요청 단계: (게시물, 본문 페이지). 본문을 받지 못하면 post['fetch_failed']가 True다."""
+        post['content'] = "내용을 불러올 수 없습니다."
+        post['image_urls'] = []
+        post['comments'] = []
+        post['fetch_failed'] = False
+        page = None
+        if post['url']:
+            try:
+                page = await self.fetch(post['url'])
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"게시물 {post['number']} 요청 실패: {e}")
+            post['fetch_failed'] = page is None
+        else:
+            logger.warning(f"게시물 {post['number']}의 URL을 찾을 수 없음")
+        return post, page
+
+    async def parse_post(self, item):
+        """파싱 단계: (게시물, 댓글 요청 파라미터)."""
+        post, page = item
+        view = await self.parse(parse_view_page, *page) if page else None
+        if view and view['text'] is not None:
+            post['content'], post['image_urls'] = view['text'], view['image_urls']
+            logger.debug(f"게시물 {post['number']}에서 발견된 이미지 수: {len(post['image_urls'])}")
+        elif post['url']:
+            logger.warning(f"게시물 {post['number']} 내용을 찾을 수 없음")
+            post['fetch_failed'] = True
+        return post, view['comment_params'] if view else None
+
+    async def fetch_post_comments(self, item):
+        """댓글 요청 단계: 댓글을 채운 게시물."""
+        post, comment_params = item
+        if not post['url']:
+            return post
+        progress = self.run.comments(post['number']) if self.run else None
+        comments = await self.fetch_comments(post['url'], comment_params, progress) if comment_params else None
+        if comments is None and self.selenium_fallback:
+            # Selenium 댓글 크롤링은 블로킹이므로 스레드에서 실행한다
+            logger.info(f"게시물 {post['number']} 댓글 AJAX 조회 실패, Selenium으로 재시도합니다.")
+            async with self.limiter(post['url']):
+                comments = await asyncio.to_thread(crawl_comments, post['url'], post['number'])
+        post['comments'] = comments or []
+        logger.info(f"게시물 {post['number']}에서 {len(post['comments'])}개의 댓글을 크롤링했습니다.")
+        return post
+
+    async def persist_post(self, post):
+        """저장 단계. sqlite 연결은 이 스레드 것이므로 작업 하나가 차례로 저장한다."""
+        with self.db.transaction():
+            post_id = save_post(self.db, post)
+            # 본문을 받지 못한 게시물은 체크포인트를 남기지 않아 이어받을 때 다시 받는다
+            if self.run and post_id and not post['fetch_failed']:
+                self.run.post_done(post['number'], post_id)
+        if self.downloader and post_id:
+            # 큐가 가득 차면 기다려야 하므로 이벤트 루프를 막지 않도록 스레드에서 넣는다
+            for job in self.db.get_pending_image_jobs(post_id):
+                await asyncio.to_thread(self.downloader.submit, job)
+        return post
+
+    async def fetch_list(self, url):
+        """목록 페이지의 게시물. 페이지를 받지 못하면 None."""
+        logger.info(f"갤러리 페이지 크롤링 시작: {url}")
+        try:
+            page = await self.fetch(url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"갤러리 페이지 요청 실패: {url}: {e}")
+            return None
+        if page is None:
+            return None
+
+        posts = [build_post(row, url) for row in await self.parse(parse_list_page, *page)]
+        posts = [post for post in posts if post is not None]
+        logger.info(f"총 {len(posts)}개의 게시물 발견")
+        return posts
+
+    async def crawl_posts(self, posts):
+        """본문 요청 -> 파싱 -> 댓글 요청 -> 저장 단계를 크기가 제한된 큐로 잇는다.
+
+        파싱이 파서 풀에서 도는 동안에도 요청 단계는 다음 페이지를 받고, 한 단계가 실패하면
+        TaskGroup이 나머지 단계를 취소한다.
+        """
+        saved = []
+
+        async def persist(post):
+            saved.append(await self.persist_post(post))
+
+        stages = [
+            Stage(self.fetch_post, self.concurrency_per_host),
+            Stage(self.parse_post, self.parse_workers),
+            Stage(self.fetch_post_comments, self.concurrency_per_host),
+            Stage(persist, 1),
+        ]
+        async with asyncio.TaskGroup() as group:
+            for stage, next_stage in zip(stages, stages[1:] + [None]):
+                group.create_task(stage.run(next_stage))
+            for post in posts:
+                await stages[0].inbox.put(post)
+            await stages[0].close()
+        return sorted(saved, key=lambda x: int(x['number']), reverse=True)
+
+    async def crawl_page(self, url):
+        """(처리한 게시물, 목록 페이지와 게시물을 모두 받았는지)."""
+        listed_posts = await self.fetch_list(url)
+        if listed_posts is None:
+            return [], False
+        posts = await self.crawl_posts(self.run.pending_posts(listed_posts))
+        return posts, not any(post['fetch_failed'] for post in posts)
+
+    async def crawl_incremental(self, gallery_url, max_pages):
+        # 이미 본 번호에 닿으면 멈춰야 하므로 목록 페이지는 순서대로 받고, 페이지 안의 게시물만 동시에 처리한다
+        high_water_mark = self.run.high_water_mark
+        total_processed = 0
+        for page in range(1, max_pages + 1):
+            if self.run.listing_finished:
+                break
+            if self.run.is_page_done(page):
+                continue
+            listed_posts = await self.fetch_list(f"{gallery_url}&page={page}")
+            if listed_posts is None:
+                # 이 페이지가 최고 글번호에 닿는지 알 수 없으므로 더 진행하지 않고 다음 실행이 이어받게 한다
+                self.run.page_failed(page)
+                break
+            posts = await self.crawl_posts(select_changed_posts(self.db, self.run.pending_posts(listed_posts)))
+            total_processed += len(posts)
+            if any(post['fetch_failed'] for post in posts):
+                # 뒤 페이지에서 멈추면 이어받을 때 이 페이지로 돌아오지 않으므로 여기서 멈춘다
+                logger.warning(f"{page} 페이지의 게시물을 모두 받지 못해 크롤링을 멈춥니다.")
+                self.run.page_failed(page)
+                break
+            logger.info(f"{page}/{max_pages} 페이지 크롤링 완료")
+            reached = reached_high_water_mark(listed_posts, high_water_mark)
+            self.run.page_done(page, final=reached)
+            if reached:
+                logger.info(f"이전 크롤링의 최고 글번호 {high_water_mark}에 도달하여 {page} 페이지에서 멈춥니다.")
+        return total_processed
+
+    async def crawl(self, gallery_url, max_pages=MAX_PAGES, incremental=False):
+        """중단된 같은 갤러리/방식의 실행이 있으면 체크포인트에서 이어받는다. 실행은 self.run에 남는다."""
+        self.run = CrawlRun.start(self.db, get_gallery_id(gallery_url), gallery_url, 'async', incremental, max_pages)
+        if self.downloader:
+            for job in self.run.pending_image_jobs():
+                await asyncio.to_thread(self.downloader.submit, job)
+        self.parse_executor = create_parse_executor(self.parse_workers)
+        try:
+            return await self.crawl_pages(gallery_url, max_pages, incremental)
+        finally:
+            if self.parse_executor is not None:
+                self.parse_executor.shutdown(cancel_futures=True)
+                self.parse_executor = None
+
+    async def crawl_pages(self, gallery_url, max_pages, incremental):
+        async with create_async_session(self.concurrency_per_host) as session:
+            self.session = session
+            if incremental:
+                total_processed = await self.crawl_incremental(gallery_url, max_pages)
+            else:
+                total_processed = 0
+                pages = [page for page in range(1, max_pages + 1) if not self.run.is_page_done(page)]
+                tasks = [asyncio.create_task(self.crawl_page(f"{gallery_url}&page={page}")) for page in pages]
+                # 목록 페이지는 순서대로 체크포인트를 남기되, 게시물 처리는 모든 페이지에서 동시에 진행된다
+                for page, task in zip(pages, tasks):
+                    posts, complete = await task
+                    total_processed += len(posts)
+                    if complete:
+                        logger.info(f"{page}/{max_pages} 페이지 크롤링 완료")
+                        self.run.page_done(page)
+                    else:
+                        logger.warning(f"{page}/{max_pages} 페이지를 모두 받지 못했습니다. 다음 크롤링이 이어받습니다.")
+                        self.run.page_failed(page)
+            self.session = None
+
+        logger.info(f"크롤링 완료. 총 {total_processed}개의 게시물 처리됨.")
+        return total_processed
+
+def crawl_gallery_async(gallery_url, output_folder, max_pages=MAX_PAGES, incremental=False):
+    downloader = ImageDownloader().start()
+    try:
+        crawler = AsyncGalleryCrawler(get_db(), downloader=downloader)
+        total_processed = asyncio.run(crawler.crawl(gallery_url, max_pages, incremental))
+    finally:
+        downloader.close()
+    # 예외로 빠져나가거나 받지 못한 페이지가 있으면 실행을 남겨 두어 다음 크롤링이 이어받는다
+    crawler.run.finish()
+    return total_processed
@@ -0,0 +1,344 @@
+"""로컬 스텁 서버를 이용한 크롤러 성능 측정 스크립트.
+
+    uv run benchmark.py crawl --pages 3 --latency 0.05
+    uv run benchmark.py cache --pages 3
+    uv run benchmark.py parse --iterations 20
+    uv run benchmark.py db --posts 200 --comments-per-post 50
+"""
+import argparse
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+STUB_FIRST_NUMBER = 9000000
+PAGE_FIXTURES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testv2', 'final', 'page_source.html'),
+]
+
+class StubGalleryHandler(BaseHTTPRequestHandler):
+    """목록/본문/이미지/댓글 요청에 지연 시간을 두고 응답하는 DCInside 모사 핸들러."""
+    latency = 0.05
+    posts_per_page = 20
+    images_per_post = 2
+    comments_per_post = 30
+    comments_per_page = 100
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body, content_type, etag=None, status=200):
+        time.sleep(self.latency)
+        if etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.bytes_sent += len(body)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        if parsed.path.endswith('/lists/'):
+            page = int(query.get('page', ['1'])[0])
+            self.send_body(self.render_list(page).encode('utf-8'), 'text/html; charset=utf-8')
+        elif parsed.path.endswith('/view/'):
+            number = int(query['no'][0])
+            self.send_body(self.render_view(number).encode('utf-8'), 'text/html; charset=utf-8',
+                           etag=f'"view-{number}"')
+        elif parsed.path.startswith('/images/'):
+            # 이어받기를 확인할 수 있도록 경로마다 같은 내용을 보내고 Range 요청을 지원한다
+            body = render_image(parsed.path)
+            range_header = self.headers.get('Range', '')
+            if range_header.startswith('bytes='):
+                start = int(range_header[len('bytes='):].split('-')[0])
+                self.send_body(body[start:], 'image/png', status=206)
+            else:
+                self.send_body(body, 'image/png')
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/board/comment/':
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        if form.get('e_s_n_o') != ['stubtoken']:
+            self.send_body(b'', 'text/html; charset=utf-8')
+            return
+        number = int(form['no'][0])
+        page = int(form['comment_page'][0])
+        self.send_body(json.dumps(self.render_comments(number, page)).encode('utf-8'),
+                       'application/json; charset=utf-8')
+
+    def render_comments(self, number, page):
+        start = (page - 1) * self.comments_per_page
+        end = min(start + self.comments_per_page, self.comments_per_post)
+        comments = [{
+            'no': str(number * 1000 + index + 1),
+            'name': f'댓글러{index}',
+            'user_id': '',
+            'ip': '1.2',
+            'memo': f'댓글 {index}',
+            'reg_date': '10.15 16:44:42',
+            'nicktype': '00',
+        } for index in range(start, end)]
+        return {'total_cnt': self.comments_per_post, 'comments': comments}
+
+    def render_list(self, page):
+        first = STUB_FIRST_NUMBER - (page - 1) * self.posts_per_page
+        rows = []
+        for number in range(first, first - self.posts_per_page, -1):
+            rows.append(f'''
+            <tr class="ub-content us-post" data-no="{number}">
+                <td class="gall_num">{number}</td>
+                <td class="gall_tit ub-word"><a href="/mgallery/board/view/?id=stub&no={number}">제목 {number}</a> <span class="reply_num">[{self.comments_per_post}]</span></td>
+                <td class="gall_writer ub-writer" data-nick="작성자" data-uid="" data-ip="1.2">작성자</td>
+                <td class="gall_date">2024.10.15</td>
+                <td class="gall_count">{number % 100}</td>
+                <td class="gall_recommend">0</td>
+            </tr>''')
+        return f"<html><body><table><tbody>{''.join(rows)}</tbody></table></body></html>"
+
+    def render_view(self, number):
+        host = self.headers['Host']
+        images = ''.join(f'<img class="tx-content-image" src="http://{host}/images/{number}_{index}.jpg">'
+                         for index in range(self.images_per_post))
+        return f'''<html><body>
+            <input type="hidden" id="gallery_id" name="gallery_id" value="stub">
+            <input type="hidden" id="no" name="gallery_no" value="{number}">
+            <input type="hidden" id="e_s_n_o" name="e_s_n_o" value="stubtoken">
+            <input type="hidden" id="_GALLTYPE_" name="_GALLTYPE_" value="M">
+            <div class="writing_view_box"><div class="write_div"><p>본문 {number}</p>{images}</div></div>
+        </body></html>'''
+
+def render_image(path):
+    # 경로마다 같은 내용의 실제 PNG (노이즈 96x96, 약 28KB)
+    from PIL import Image
+
+    pixels = random.Random(path).randbytes(96 * 96 * 3)
+    output = io.BytesIO()
+    Image.frombytes('RGB', (96, 96), pixels).save(output, 'PNG')
+    return output.getvalue()
+
+def start_stub_server(latency, posts_per_page, images_per_post, comments_per_post):
+    handler = type('Handler', (StubGalleryHandler,), {
+        'latency': latency,
+        'posts_per_page': posts_per_page,
+        'images_per_post': images_per_post,
+        'comments_per_post': comments_per_post,
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.bytes_sent = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def bench_crawl(args):
+    import gallery_crawler
+    import image_manager
+    import async_crawler
+    import http_cache
+    from database import Database
+    from image_downloader import ImageDownloader
+
+    server = start_stub_server(args.latency, args.posts_per_page, args.images_per_post,
+                               args.comments_per_post)
+    gallery_url = f"http://127.0.0.1:{server.server_address[1]}/mgallery/board/lists/?id=stub"
+    total_posts = args.pages * args.posts_per_page
+    comment_pages = max(1, -(-args.comments_per_post // StubGalleryHandler.comments_per_page))
+    total_requests = args.pages + total_posts * (1 + args.images_per_post + comment_pages)
+
+    # Selenium 댓글 대체 경로와 요청 간 sleep은 측정에서 제외한다
+    gallery_crawler.crawl_comments = lambda post_url, post_number: []
+    gallery_crawler.DELAY = args.delay
+
+    parse_workers = async_crawler.PARSE_WORKERS if args.parse_workers is None else args.parse_workers
+    results = {}
+    for engine in ('sync', 'async'):
+        with tempfile.TemporaryDirectory() as workdir:
+            image_manager.IMAGES_FOLDER = workdir
+            # 두 엔진이 서로의 응답 캐시를 재사용하지 않도록 엔진마다 빈 캐시를 쓴다
+            http_cache._cache = http_cache.ResponseCache(os.path.join(workdir, 'http_cache.db'))
+            db_path = os.path.join(workdir, 'bench.db')
+            db = Database(db_path)
+            started = time.perf_counter()
+            # 이미지는 두 엔진 모두 같은 다운로드 워커 풀로 받고, 모두 받을 때까지 측정한다
+            downloader = ImageDownloader(concurrency_per_host=args.concurrency, db_path=db_path).start()
+            if engine == 'sync':
+                for page in range(1, args.pages + 1):
+                    gallery_crawler.crawl_gallery_page(f"{gallery_url}&page={page}", db, downloader)
+            else:
+                crawler = async_crawler.AsyncGalleryCrawler(
+                    db, concurrency_per_host=args.concurrency,
+                    requests_per_second=args.rate, burst=args.concurrency,
+                    selenium_fallback=False, downloader=downloader, parse_workers=parse_workers)
+                async_crawler.asyncio.run(crawler.crawl(gallery_url, args.pages))
+            downloader.close()
+            elapsed = time.perf_counter() - started
+            db.close()
+            http_cache._cache.close()
+        results[engine] = elapsed
+        print(f"{engine:>5}: {elapsed:7.2f}s  {total_posts / elapsed:7.1f} posts/s  "
+              f"{total_requests / elapsed:7.1f} req/s")
+
+    server.shutdown()
+    print(f"speedup: {results['sync'] / results['async']:.1f}x")
+
+def bench_cache(args):
+    import gallery_crawler
+    import image_manager
+    import http_cache
+    from database import Database
+
+    server = start_stub_server(args.latency, args.posts_per_page, 0, 0)
+    gallery_url = f"http://127.0.0.1:{server.server_address[1]}/mgallery/board/lists/?id=stub"
+    gallery_crawler.crawl_comments = lambda post_url, post_number: []
+    gallery_crawler.DELAY = 0
+
+    with tempfile.TemporaryDirectory() as workdir:
+        image_manager.IMAGES_FOLDER = workdir
+        http_cache._cache = http_cache.ResponseCache(os.path.join(workdir, 'http_cache.db'))
+        db = Database(os.path.join(workdir, 'bench.db'))
+        # 같은 페이지를 두 번 크롤링해 두 번째 실행에서 304로 절약되는 전송량과 시간을 본다
+        for run in ('cold', 'warm'):
+            server.bytes_sent = 0
+            started = time.perf_counter()
+            for page in range(1, args.pages + 1):
+                gallery_crawler.crawl_gallery_page(f"{gallery_url}&page={page}", db)
+            elapsed = time.perf_counter() - started
+            print(f"{run:>5}: {elapsed:7.2f}s  {server.bytes_sent / 1024:9.1f} KB sent by server")
+        db.close()
+        http_cache._cache.close()
+    server.shutdown()
+
+def bench_parse(args):
+    import parsers
+
+    for fixture in args.fixtures:
+        with open(fixture, encoding='utf-8') as f:
+            html = f.read()
+        print(f"{os.path.basename(fixture)} ({len(html.encode('utf-8')) // 1024} KB)")
+
+        expected = None
+        for name in parsers.BACKENDS:
+            try:
+                parser = parsers.BACKENDS[name]()
+            except ImportError:
+                print(f"  {name:>10}: not installed")
+                continue
+            result = (parser.parse_list(html), parser.parse_view(html))
+            if expected is None:
+                expected = result
+            same = 'same' if result == expected else 'DIFFERENT'
+
+            timings = {}
+            for method in ('parse_list', 'parse_view'):
+                parse = getattr(parser, method)
+                started = time.process_time()
+                for _ in range(args.iterations):
+                    parse(html)
+                timings[method] = (time.process_time() - started) / args.iterations * 1000
+            print(f"  {name:>10}: list {timings['parse_list']:7.2f} ms/page  "
+                  f"view {timings['parse_view']:7.2f} ms/page  "
+                  f"({len(result[0])} rows, output {same} as bs4)")
+
+def make_posts(count, comments_per_post, first_number=STUB_FIRST_NUMBER):
+    posts = []
+    for number in range(first_number, first_number - count, -1):
+        posts.append({
+            'number': str(number),
+            'title': f'제목 {number}',
+            'author': '작성자',
+            'date': '2024-10-15 12:00:00',
+            'views': number % 1000,
+            'votes': number % 10,
+            'content': f'본문 {number} ' * 20,
+            'comments': [{
+                'data_no': str(number * 1000 + index),
+                'author': f'댓글러{index}',
+                'author_id': '',
+                'author_ip': '1.2',
+                'content': f'댓글 {index}',
+                'date': '10.15 16:44:42',
+            } for index in range(comments_per_post)],
+            'image_urls': [],
+        })
+    return posts
+
+def bench_db(args):
+    from database import Database
+    import gallery_crawler
+
+    posts = make_posts(args.posts, args.comments_per_post)
+    total_rows = args.posts * (1 + args.comments_per_post)
+
+    def per_row(db):
+        for post in posts:
+            post_id = db.insert_post(post)
+            for comment in post['comments']:
+                db.insert_comment(post_id, comment)
+
+    def per_post_transaction(db):
+        for post in posts:
+            gallery_crawler.save_post(db, post)
+
+    for name, write in (('commit per row', per_row), ('transaction per post', per_post_transaction)):
+        with tempfile.TemporaryDirectory() as workdir:
+            db = Database(os.path.join(workdir, 'bench.db'))
+            started = time.perf_counter()
+            write(db)
+            elapsed = time.perf_counter() - started
+            db.close()
+        print(f"{name:>22}: {elapsed:7.2f}s  {total_rows / elapsed:9.0f} rows/s")
+
+def main():
+    parser = argparse.ArgumentParser(description='DC Inside crawler benchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    crawl_parser = subparsers.add_parser('crawl', help='Compare sync and async engines against a local stub server')
+    crawl_parser.add_argument('--pages', type=int, default=3)
+    crawl_parser.add_argument('--posts-per-page', type=int, default=20)
+    crawl_parser.add_argument('--images-per-post', type=int, default=2)
+    crawl_parser.add_argument('--comments-per-post', type=int, default=30)
+    crawl_parser.add_argument('--latency', type=float, default=0.05, help='Stub server latency per response (seconds)')
+    crawl_parser.add_argument('--delay', type=float, default=0, help='Sync engine DELAY between posts (seconds)')
+    crawl_parser.add_argument('--concurrency', type=int, default=8, help='Async engine concurrency per host')
+    crawl_parser.add_argument('--rate', type=float, default=1000, help='Async engine requests per second per host')
+    crawl_parser.add_argument('--parse-workers', type=int, default=None,
+                              help='Async engine parser processes (default: config.PARSE_WORKERS, 0: parse on the event loop)')
+    crawl_parser.set_defaults(func=bench_crawl)
+
+    cache_parser = subparsers.add_parser('cache', help='Cold vs. warm crawl with the conditional response cache')
+    cache_parser.add_argument('--pages', type=int, default=3)
+    cache_parser.add_argument('--posts-per-page', type=int, default=20)
+    cache_parser.add_argument('--latency', type=float, default=0.05, help='Stub server latency per response (seconds)')
+    cache_parser.set_defaults(func=bench_cache)
+
+    parse_parser = subparsers.add_parser('parse', help='Per-page CPU time of each parser backend on saved pages')
+    parse_parser.add_argument('--iterations', type=int, default=20)
+    parse_parser.add_argument('--fixtures', nargs='+', default=PAGE_FIXTURES)
+    parse_parser.set_defaults(func=bench_parse)
+
+    db_parser = subparsers.add_parser('db', help='Insert throughput of per-row commits vs. per-post transactions')
+    db_parser.add_argument('--posts', type=int, default=200)
+    db_parser.add_argument('--comments-per-post', type=int, default=50)
+    db_parser.set_defaults(func=bench_db)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
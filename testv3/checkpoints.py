@@ -0,0 +1,121 @@
+"""갤러리 크롤링 실행(run)별 체크포인트.
+
+크롤링을 시작하면 crawl_runs에 실행을 만들고, 끝낸 목록 페이지와 저장한 게시물, 받은 댓글
+페이지를 crawl_checkpoints에 기록한다. 프로세스가 죽은 뒤 같은 갤러리를 같은 방식(전체/증분)으로
+다시 크롤링하면 끝나지 않은 실행을 이어받아 끝낸 목록 페이지와 게시물은 건너뛰고, 여러
+페이지인 댓글은 받아 둔 페이지 다음부터 요청한다. 이미지는 image_jobs가 상태를 가지므로 실행이
+저장한 게시물 중 받지 못한 이미지만 다시 큐에 넣는다. 받지 못한 목록 페이지나 게시물은 체크포인트를
+남기지 않고 실행도 끝내지 않으므로 다음 크롤링이 이어받아 다시 시도한다.
+"""
+import json
+import logging
+from config import CRAWL_RESUME_MAX_AGE
+
+logger = logging.getLogger(__name__)
+
+class CommentProgress:
+    """게시물 하나의 댓글 페이지 체크포인트."""
+
+    def __init__(self, run, number, pages):
+        self.run = run
+        self.number = number
+        # [(페이지, 댓글 목록, 전체 댓글 수)] 이전 실행에서 받아 둔 페이지
+        self.pages = sorted(pages, key=lambda page: page[0])
+        self.last_page = self.pages[-1][0] if self.pages else 0
+
+    def resume(self):
+        """(받아 둔 댓글, 다음에 요청할 댓글 페이지)."""
+        comments = [comment for _, page_comments, _ in self.pages for comment in page_comments]
+        return comments, self.last_page + 1
+
+    def page_done(self, page, page_comments, total, last):
+        self.last_page = page
+        if last:
+            # 마지막 페이지는 게시물을 저장할 때 함께 기록하므로 한 페이지짜리 댓글은 따로 쓰지 않는다
+            return
+        # 게시물을 저장하기 전에 죽어도 이어받을 수 있도록 받은 댓글을 남긴다
+        data = json.dumps({'comments': page_comments, 'total': total}, ensure_ascii=False)
+        self.run.db.save_crawl_checkpoints(self.run.id, 'comments', [(f"{self.number}:{page}", None, data)])
+
+class CrawlRun:
+    def __init__(self, db, run, resumed=False):
+        self.db = db
+        self.id = run['id']
+        self.gallery_id = run['gallery_id']
+        # 증분 크롤링이 멈출 글번호. 이어받아도 처음 시작할 때의 값을 쓴다
+        self.high_water_mark = run['high_water_mark']
+        self.resumed = resumed
+        self.comment_progress = {}
+        self.done_pages = set()
+        # 이번 실행에서 목록이나 게시물을 받지 못한 페이지. 체크포인트를 남기지 않아 다음 실행이 다시 크롤링한다
+        self.failed_pages = set()
+        self.listing_finished = False
+        for key, _, data in db.get_crawl_checkpoints(self.id, 'list'):
+            self.done_pages.add(int(key))
+            self.listing_finished = self.listing_finished or data == 'final'
+        self.done_posts = {key for key, _, _ in db.get_crawl_checkpoints(self.id, 'post')}
+        self.saved_comment_pages = {}
+        for key, _, data in db.get_crawl_checkpoints(self.id, 'comments', with_data=True):
+            number, page = key.split(':')
+            data = json.loads(data)
+            self.saved_comment_pages.setdefault(number, []).append((int(page), data['comments'], data['total']))
+        if resumed:
+            logger.info(f"크롤링 실행 {self.id} 이어받기: 목록 페이지 {len(self.done_pages)}개, "
+                        f"게시물 {len(self.done_posts)}개 완료")
+
+    @classmethod
+    def start(cls, db, gallery_id, gallery_url, engine, incremental, max_pages):
+        high_water_mark = db.get_high_water_mark(gallery_id) if incremental else 0
+        run, resumed = db.start_crawl_run(gallery_id, gallery_url, engine, incremental, max_pages,
+                                          high_water_mark, CRAWL_RESUME_MAX_AGE)
+        return cls(db, run, resumed)
+
+    def is_page_done(self, page):
+        return page in self.done_pages
+
+    def page_done(self, page, final=False):
+        """final: 증분 크롤링이 이 페이지에서 멈췄다 (이어받아도 다음 페이지로 가지 않는다)."""
+        self.db.save_crawl_checkpoints(self.id, 'list', [(page, None, 'final' if final else None)])
+        self.done_pages.add(page)
+        self.listing_finished = self.listing_finished or final
+
+    def page_failed(self, page):
+        self.failed_pages.add(page)
+
+    def pending_posts(self, posts):
+        """이미 저장한 게시물을 뺀 목록."""
+        pending = [post for post in posts if str(post['number']) not in self.done_posts]
+        if len(pending) < len(posts):
+            logger.info(f"이미 저장한 게시물 {len(posts) - len(pending)}개를 건너뜁니다")
+        return pending
+
+    def comments(self, number):
+        number = str(number)
+        progress = CommentProgress(self, number, self.saved_comment_pages.pop(number, []))
+        self.comment_progress[number] = progress
+        return progress
+
+    def post_done(self, number, post_id):
+        """게시물을 저장한 트랜잭션 안에서 호출한다."""
+        number = str(number)
+        progress = self.comment_progress.pop(number, None)
+        comment_pages = progress.last_page if progress else 0
+        with self.db.transaction():
+            self.db.save_crawl_checkpoints(self.id, 'post', [(number, post_id, None)])
+            if comment_pages:
+                # 이어받기용으로 남겨 둔 댓글은 지우고 받은 페이지만 기록한다
+                self.db.save_crawl_checkpoints(self.id, 'comments', [
+                    (f"{number}:{page}", post_id, None) for page in range(1, comment_pages + 1)])
+        self.done_posts.add(number)
+
+    def pending_image_jobs(self):
+        """이어받은 실행이 저장했지만 받지 못한 이미지 작업."""
+        return self.db.get_crawl_run_pending_image_jobs(self.id) if self.resumed else []
+
+    def finish(self):
+        """실행을 끝낸다. 실패한 페이지가 있으면 실행을 남겨 두어 다음 크롤링이 이어받고 False를 반환한다."""
+        if self.failed_pages:
+            logger.warning(f"크롤링 실행 {self.id}: 페이지 {sorted(self.failed_pages)}를 끝내지 못해 다음 크롤링이 이어받습니다")
+            return False
+        self.db.finish_crawl_run(self.id)
+        return True
@@ -3,61 +3,117 @@
 import requests
 from bs4 import BeautifulSoup
 import logging
-from config import HEADERS
-import time
-import random
+from urllib.parse import urljoin
+from config import HEADERS, COMMENT_API_PATH, COMMENT_MAX_PAGES, REQUEST_TIMEOUT
+from parsers import parse_view
+from http_cache import cached_get
+from http_client import get_session
 
 logger = logging.getLogger(__name__)
 
-def crawl_comments(post_url):
-    logger.info(f"댓글 크롤링 시작: {post_url}")
-    response = requests.get(post_url, headers=HEADERS)
-    soup = BeautifulSoup(response.text, 'html.parser')
+def extract_comment_params(inputs):
+    """게시물 페이지의 hidden input 값(id -> value)에서 댓글 AJAX 요청에 필요한 값을 고른다."""
+    params = {
+        'gallery_id': inputs.get('gallery_id') or inputs.get('id'),
+        'no': inputs.get('no'),
+        'e_s_n_o': inputs.get('e_s_n_o'),
+        'gall_type': inputs.get('_GALLTYPE_') or 'G',
+    }
+    if not (params['gallery_id'] and params['no'] and params['e_s_n_o']):
+        logger.debug("댓글 요청 파라미터를 찾을 수 없음")
+        return None
+    return params
 
-    comments = crawl_comments(post_url)
-    page = 1
+def build_comment_request(post_url, params, page):
+    """댓글 AJAX 요청의 (url, form data, headers)를 만든다."""
+    url = urljoin(post_url, COMMENT_API_PATH)
+    data = {
+        'id': params['gallery_id'],
+        'no': params['no'],
+        'cmt_id': params['gallery_id'],
+        'cmt_no': params['no'],
+        'focus_cno': '',
+        'focus_pno': '',
+        'e_s_n_o': params['e_s_n_o'],
+        'comment_page': page,
+        'sort': '',
+        'prevCnt': '',
+        'board_type': '',
+        '_GALLTYPE_': params['gall_type'],
+    }
+    headers = dict(HEADERS)
+    headers.update({
+        'Referer': post_url,
+        'X-Requested-With': 'XMLHttpRequest',
+        'Accept': 'application/json, text/javascript, */*; q=0.01',
+    })
+    return url, data, headers
 
-    while True:
-        logger.debug(f"댓글 페이지 {page} 크롤링 중...")
-        comment_elements = soup.select('.comment_wrap .comment_list .ub-content')
+def parse_comment_memo(memo):
+    soup = BeautifulSoup(memo or '', 'html.parser')
+    if soup.select_one('img.written_dccon'):
+        return "디시콘 (이미지)"
+    return soup.get_text(strip=True)
 
-        if not comment_elements:
-            logger.debug("더 이상 댓글이 없습니다.")
-            break
+def parse_comment_response(data):
+    """댓글 JSON 응답을 (댓글 목록, 전체 댓글 수)로 변환한다."""
+    if not isinstance(data, dict):
+        raise ValueError(f"예상하지 못한 댓글 응답: {str(data)[:100]}")
+    comments = []
+    for item in data.get('comments') or []:
+        # 광고용 '댓글돌이' 항목은 실제 댓글이 아니다
+        if item.get('nicktype') == 'COMMENT_BOY' or str(item.get('no', '0')) == '0':
+            continue
+        comments.append({
+            'data_no': str(item.get('no')),
+            'author': item.get('name', '익명'),
+            'author_id': item.get('user_id', ''),
+            'author_ip': item.get('ip', ''),
+            'content': parse_comment_memo(item.get('memo')),
+            'date': item.get('reg_date', ''),
+        })
+    total = int(data.get('total_cnt') or 0)
+    return comments, total
+
+def fetch_comments(post_url, params, session=None, progress=None):
+    """댓글 AJAX 엔드포인트를 페이지 단위로 조회한다. 실패하면 None을 반환한다.
+
+    progress(checkpoints.CommentProgress)를 주면 이전 실행에서 받아 둔 페이지 다음부터 요청하고,
+    받은 페이지마다 기록한다.
+    """
+    session = session or get_session()
+    comments, start_page = progress.resume() if progress else ([], 1)
+    for page in range(start_page, COMMENT_MAX_PAGES + 1):
+        url, data, headers = build_comment_request(post_url, params, page)
+        try:
+            response = session.post(url, data=data, headers=headers, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            page_comments, total = parse_comment_response(response.json())
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"댓글 AJAX 요청 실패 ({post_url}, 페이지 {page}): {e}")
+            return None
 
-        for comment_element in comment_elements:
-            author_element = comment_element.select_one('.nick')
-            content_element = comment_element.select_one('.comment')
-            date_element = comment_element.select_one('.date_time')
-
-            if author_element and content_element and date_element:
-                author = author_element.text.strip()
-                content = content_element.text.strip()
-                date = date_element.text.strip()
-
-                comment_data = {
-                    'author': author,
-                    'content': content,
-                    'date': date
-                }
-                comments.append(comment_data)
-            else:
-                logger.warning("댓글 요소를 찾을 수 없습니다.")
-
-        # 다음 페이지로 이동
-        next_page_element = soup.select_one('.comment_wrap .pagination a.page_next')
-        if next_page_element and 'href' in next_page_element.attrs:
-            next_page_url = next_page_element['href']
-            response = requests.get(next_page_url, headers=HEADERS)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            page += 1
-
-            # 요청 사이에 지연 시간 추가
-            delay = random.uniform(1, 2)
-            time.sleep(delay)
-        else:
-            logger.debug("댓글의 마지막 페이지에 도달했습니다.")
+        comments.extend(page_comments)
+        logger.debug(f"댓글 페이지 {page}: {len(page_comments)}개 (전체 {total}개)")
+        last = not page_comments or len(comments) >= total or page == COMMENT_MAX_PAGES
+        if progress:
+            progress.page_done(page, page_comments, total, last)
+        if last:
             break
+    return comments
+
+def crawl_comments(post_url):
+    logger.info(f"댓글 크롤링 시작: {post_url}")
+    response = cached_get(post_url)
+
+    params = extract_comment_params(parse_view(response.text)['inputs'])
+    comments = fetch_comments(post_url, params) if params else None
+    if comments is None:
+        # AJAX 요청이 실패한 경우에만 브라우저로 렌더링한다
+        logger.info("댓글 AJAX 조회 실패, Selenium으로 재시도합니다.")
+        # 셀레니움은 이때만 필요하므로 여기서 가져온다 (파서 프로세스는 이 모듈을 가볍게 불러온다)
+        from selenium_comment_crawler import crawl_comments_selenium
+        comments = crawl_comments_selenium(post_url)
 
     logger.info(f"총 {len(comments)}개의 댓글을 크롤링했습니다.")
     return comments
@@ -1,53 +1,186 @@
+"""오래된 게시물 보관.
+
+보관할 게시물(댓글/이미지 연결 포함)을 한 건씩 JSON 한 줄로 만들어 zstd 프레임으로 압축하고,
+세그먼트 파일(archive/segment-000001.jsonl.zst)에 이어 붙인다. 프레임은 처음 보관할 때 학습한
+공용 사전으로 압축하므로 작은 게시물도 잘 줄어들고, 프레임마다 따로 풀 수 있어 archived_posts
+색인의 (세그먼트, 오프셋, 길이)로 한 게시물만 바로 읽을 수 있다. 세그먼트 전체는
+`zstd -D <사전> -d`로 풀면 그대로 JSONL이다.
+
+예전 형식(post_<id>.json.gz)은 decompress_data로 계속 읽을 수 있다.
+"""
+import os
 import json
 import gzip
 import logging
-import os
+import zstandard
 from datetime import datetime, timedelta
-from config import COMPRESSED_DATA_FOLDER
+from config import (COMPRESSED_DATA_FOLDER, ARCHIVE_SEGMENT_BYTES, ARCHIVE_CHUNK_SIZE, ARCHIVE_DICT_SIZE,
+                    ARCHIVE_COMPRESSION_LEVEL, ARCHIVE_VACUUM)
 from database import get_db  # db 대신 get_db 함수를 import
+from export import parse_post_date
 
 logger = logging.getLogger(__name__)
 
-def compress_old_data(days_old=30):
+ARCHIVE_FOLDER = os.path.join(COMPRESSED_DATA_FOLDER, "archive")
+DICTIONARY_FOLDER = os.path.join(ARCHIVE_FOLDER, "dictionaries")
+# 사전 학습에 쓸 최소 표본 수. 이보다 적으면 사전 없이 압축한다.
+MIN_DICTIONARY_SAMPLES = 100
+
+def load_dictionaries():
+    """사전 id -> ZstdCompressionDict. 프레임 헤더의 사전 id로 풀 때 쓸 사전을 찾는다."""
+    dictionaries = {}
+    if os.path.isdir(DICTIONARY_FOLDER):
+        for name in os.listdir(DICTIONARY_FOLDER):
+            if name.endswith('.zdict'):
+                with open(os.path.join(DICTIONARY_FOLDER, name), 'rb') as f:
+                    dictionary = zstandard.ZstdCompressionDict(f.read())
+                dictionaries[dictionary.dict_id()] = dictionary
+    return dictionaries
+
+def train_dictionary(samples):
+    if len(samples) < MIN_DICTIONARY_SAMPLES:
+        return None
     try:
-        db = get_db()  # 데이터베이스 연결 가져오기
-        cutoff_date = datetime.now() - timedelta(days=days_old)
-        
-        # 오래된 게시물 조회
-        db.cursor.execute("SELECT * FROM posts WHERE date < ?", (cutoff_date.strftime('%Y-%m-%d'),))
-        old_posts = db.cursor.fetchall()
-
-        for post in old_posts:
-            post_id = post[0]
-            post_data = {
-                'post': post,
-                'comments': db.get_comments(post_id),
-                'images': db.get_images(post_id)
-            }
-
-            # JSON으로 변환
-            json_data = json.dumps(post_data, ensure_ascii=False)
-
-            # gzip으로 압축
-            compressed_file_path = os.path.join(COMPRESSED_DATA_FOLDER, f"post_{post_id}.json.gz")
-            with gzip.open(compressed_file_path, 'wt', encoding='utf-8') as f:
-                f.write(json_data)
-
-            logger.info(f"게시물 {post_id} 압축 완료: {compressed_file_path}")
-
-            # 데이터베이스에서 삭제
-            db.cursor.execute("DELETE FROM posts WHERE id = ?", (post_id,))
-            db.cursor.execute("DELETE FROM comments WHERE post_id = ?", (post_id,))
-            db.cursor.execute("DELETE FROM images WHERE post_id = ?", (post_id,))
-
-        db.conn.commit()
-        logger.info("오래된 데이터 압축 및 정리 완료")
+        dictionary = zstandard.train_dictionary(ARCHIVE_DICT_SIZE, samples)
+    except zstandard.ZstdError as e:
+        logger.warning(f"보관용 zstd 사전 학습 실패, 사전 없이 압축합니다: {e}")
+        return None
+    os.makedirs(DICTIONARY_FOLDER, exist_ok=True)
+    path = os.path.join(DICTIONARY_FOLDER, f"{dictionary.dict_id()}.zdict")
+    with open(path, 'wb') as f:
+        f.write(dictionary.as_bytes())
+        f.flush()
+        os.fsync(f.fileno())
+    logger.info(f"보관용 zstd 사전 학습 완료: {path} (표본 {len(samples)}개)")
+    return dictionary
+
+class ArchiveWriter:
+    """세그먼트 파일에 게시물 프레임을 이어 쓰고, 크기가 ARCHIVE_SEGMENT_BYTES를 넘으면 새 세그먼트를 연다."""
+
+    def __init__(self, last_segment=None, segment_bytes=ARCHIVE_SEGMENT_BYTES):
+        os.makedirs(ARCHIVE_FOLDER, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.segment = last_segment
+        self.file = None
+        self.compressor = None
+        dictionaries = load_dictionaries()
+        # 가장 최근에 학습한 사전을 계속 쓴다 (파일 수정 시각 순)
+        self.dictionary = max(dictionaries.values(), key=self.dictionary_mtime, default=None)
+
+    @staticmethod
+    def dictionary_mtime(dictionary):
+        return os.path.getmtime(os.path.join(DICTIONARY_FOLDER, f"{dictionary.dict_id()}.zdict"))
+
+    def prepare(self, records):
+        """첫 보관이면 이번 청크를 표본으로 사전을 학습한다."""
+        if self.compressor:
+            return
+        if self.dictionary is None:
+            self.dictionary = train_dictionary(records)
+        self.compressor = zstandard.ZstdCompressor(level=ARCHIVE_COMPRESSION_LEVEL, dict_data=self.dictionary,
+                                                   write_content_size=True, write_checksum=True)
+
+    def open_segment(self):
+        path = os.path.join(ARCHIVE_FOLDER, self.segment) if self.segment else None
+        if path is None or os.path.getsize(path) >= self.segment_bytes:
+            number = int(self.segment.split('-')[1].split('.')[0]) + 1 if self.segment else 1
+            self.segment = f"segment-{number:06d}.jsonl.zst"
+            path = os.path.join(ARCHIVE_FOLDER, self.segment)
+        self.file = open(path, 'ab')
 
+    def write(self, records):
+        """records: JSON 한 줄(bytes) 목록. 각 레코드의 (세그먼트, 오프셋, 길이)를 반환한다."""
+        self.prepare(records)
+        locations = []
+        for record in records:
+            if self.file is None or self.file.tell() >= self.segment_bytes:
+                self.close()
+                self.open_segment()
+            frame = self.compressor.compress(record)
+            offset = self.file.tell()
+            self.file.write(frame)
+            locations.append((self.segment, offset, len(frame)))
+        # 색인을 커밋하고 원본을 지우기 전에 프레임이 디스크에 있어야 한다
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return locations
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+def to_record(post):
+    return (json.dumps(post, ensure_ascii=False) + '\n').encode('utf-8')
+
+def compress_old_data(days_old=30):
+    """days_old일보다 오래된 게시물을 보관 세그먼트로 옮기고 데이터베이스에서 지운다."""
+    db = get_db()  # 데이터베이스 연결 가져오기
+    cutoff_date = datetime.now() - timedelta(days=days_old)
+    writer = ArchiveWriter(db.get_last_archive_segment())
+    archived = 0
+    try:
+        # 크롤러는 목록의 title 속성에서 'YYYY-MM-DD HH:MM:SS'를 저장하지만 예전 행에는 'YY.MM.DD' 등이 섞여
+        # 있어 문자열 비교로 거를 수 없으므로 파싱해서 비교하고, 예전 'HH:MM'처럼 날짜를 알 수 없는 값은 보관하지 않는다
+        posts = db.iter_posts(ARCHIVE_CHUNK_SIZE, include_comments=True, include_images=True)
+        chunk = []
+        for post in posts:
+            posted_at = parse_post_date(post['date'])
+            if posted_at is None or posted_at >= cutoff_date:
+                continue
+            chunk.append(post)
+            if len(chunk) >= ARCHIVE_CHUNK_SIZE:
+                archived += archive_posts(db, writer, chunk)
+                chunk = []
+        if chunk:
+            archived += archive_posts(db, writer, chunk)
     except Exception as e:
         logger.error(f"데이터 압축 중 오류 발생: {e}")
-        db.conn.rollback()
+        db.rollback()
+        return archived
+    finally:
+        writer.close()
+
+    if archived and ARCHIVE_VACUUM:
+        db.vacuum()
+    logger.info(f"오래된 데이터 압축 및 정리 완료: 게시물 {archived}개 보관")
+    return archived
+
+def archive_posts(db, writer, posts):
+    locations = writer.write([to_record(post) for post in posts])
+    with db.transaction():
+        db.insert_archived_posts([(post['id'], post['number'], post.get('gallery_id'), post['date'],
+                                   segment, offset, length)
+                                  for post, (segment, offset, length) in zip(posts, locations)])
+        db.delete_posts([post['id'] for post in posts])
+    logger.info(f"게시물 {len(posts)}개 보관 완료 ({locations[-1][0]})")
+    return len(posts)
+
+_dictionaries = {}
+
+def read_frame(segment, offset, length):
+    with open(os.path.join(ARCHIVE_FOLDER, segment), 'rb') as f:
+        f.seek(offset)
+        frame = f.read(length)
+    dict_id = zstandard.get_frame_parameters(frame).dict_id
+    if dict_id and dict_id not in _dictionaries:
+        _dictionaries.update(load_dictionaries())
+    decompressor = zstandard.ZstdDecompressor(dict_data=_dictionaries.get(dict_id) if dict_id else None)
+    return json.loads(decompressor.decompress(frame))
+
+def load_archived_post(db, post_id):
+    """보관된 게시물 {게시물 열..., 'comments': [...], 'images': [...]}. 없으면 None."""
+    entry = db.get_archived_post(post_id)
+    if not entry:
+        return None
+    try:
+        return read_frame(entry['segment'], entry['offset'], entry['length'])
+    except (OSError, zstandard.ZstdError, ValueError) as e:
+        logger.error(f"보관 게시물 {post_id}을 읽을 수 없음: {e}")
+        return None
 
 def decompress_data(compressed_file_path):
+    """예전 형식(게시물마다 post_<id>.json.gz) 파일을 읽는다."""
     try:
         with gzip.open(compressed_file_path, 'rt', encoding='utf-8') as f:
             json_data = f.read()
@@ -7,21 +7,135 @@ DATA_DIR = os.path.join(BASE_DIR, 'dc_gallery_data')
 
 # 갤러리 URL
 GALLERY_URL = "https://gall.dcinside.com/mgallery/board/lists/?id=vr"
-# 포스팅할 갤러리 최소넘버
+# GALLERY_URL 갤러리에서 포스팅할 최소넘버
 MIN_POSTING_ID = 4243000
+# 스케줄러(main.py --scheduler)가 돌아가며 크롤링할 갤러리.
+# weight: 요청 예산이 모자랄 때 나눠 갖는 비율, freshness: 새 글을 몇 초 안에 수집할지 (신선도 목표),
+# min_posting_id: 이 글번호 미만은 건너뛴다 (기본 0). 글번호는 갤러리마다 따로 매겨진다
+GALLERIES = [
+    {'url': GALLERY_URL, 'weight': 1.0, 'freshness': 600, 'min_posting_id': MIN_POSTING_ID},
+]
 
 # 출력 폴더 설정
 OUTPUT_FOLDER = os.path.join(DATA_DIR, "output")
 IMAGES_FOLDER = os.path.join(DATA_DIR, "images")
+DERIVATIVES_FOLDER = os.path.join(DATA_DIR, "derivatives")
 COMPRESSED_DATA_FOLDER = os.path.join(DATA_DIR, "compressed")
 LOG_FOLDER = os.path.join(DATA_DIR, "logs")
 
 # 데이터베이스 설정
 DB_PATH = os.path.join(DATA_DIR, "dc_gallery.db")
+SQLITE_CACHE_SIZE_KB = 64 * 1024  # 연결당 페이지 캐시 크기 (KB)
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # 메모리 맵 크기 (바이트)
 
 # 크롤링 설정
 MAX_PAGES = 5  # 크롤링할 최대 페이지 수
 DELAY = 2  # 요청 사이의 지연 시간 (초)
+# 증분 크롤링(--incremental)에서 본문을 다시 받을지 판단하는 목록 값.
+# 조회수는 읽을 때마다 바뀌므로 기본값에서 제외하고, 목록 값으로만 갱신한다.
+INCREMENTAL_SIGNALS = ('votes', 'comment_count')
+# 이 시간(초) 안에 멈춘 같은 갤러리/방식의 크롤링은 체크포인트에서 이어받는다
+CRAWL_RESUME_MAX_AGE = 24 * 3600
+
+# 비동기 크롤링 설정 (--engine async)
+CONCURRENCY_PER_HOST = 4  # 호스트당 동시 요청 수
+REQUESTS_PER_SECOND = 2.0  # 호스트당 초당 요청 수 (토큰 버킷 충전 속도)
+REQUEST_BURST = 4  # 토큰 버킷 최대 용량
+REQUEST_TIMEOUT = 30  # 요청 타임아웃 (초)
+
+# HTTP 연결 풀/재시도 설정 (http_client)
+HTTP_POOL_CONNECTIONS = 8  # 연결 풀을 유지할 호스트 수 (gall, dcimg1~9 등)
+HTTP_POOL_MAXSIZE = 8  # 호스트당 유지할 keep-alive 연결 수
+HTTP_RETRIES = 3  # 429/5xx/연결 오류 재시도 횟수
+HTTP_BACKOFF_FACTOR = 1.0  # 재시도 간격: factor * 2^(시도 횟수) 초
+HTTP_BACKOFF_MAX = 30  # 재시도 간격 상한 (초)
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# HTTP 응답 캐시 설정 (ETag/Last-Modified 조건부 요청)
+HTTP_CACHE_ENABLED = True
+HTTP_CACHE_PATH = os.path.join(DATA_DIR, "http_cache.db")
+HTTP_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 압축된 본문 기준 최대 크기 (바이트)
+
+# 이미지 저장 설정
+IMAGE_CHUNK_SIZE = 64 * 1024  # 스트리밍 다운로드 청크 크기 (바이트)
+IMAGE_WORKERS = 8  # 이미지 다운로드 워커 스레드 수
+IMAGE_QUEUE_SIZE = 256  # 다운로드 대기열 최대 길이 (가득 차면 크롤러가 기다린다)
+IMAGE_CONCURRENCY_PER_HOST = 4  # 이미지 호스트(dcimg*)당 동시 다운로드 수
+IMAGE_RETRIES = 3  # 이미지당 재시도 횟수 (받은 부분부터 이어받는다)
+IMAGE_JOB_LEASE = 900  # 이미지 작업 임대 시간 (초). 받던 프로세스가 죽으면 이 시간 뒤에 다른 프로세스가 받는다
+IMAGE_CLAIM_POLL = 1.0  # 다른 프로세스가 같은 URL을 받는 중일 때 다시 임대를 시도하는 간격 (초)
+IMAGE_NEAR_DUPLICATE_THRESHOLD = 6  # 유사 이미지로 볼 pHash/dHash 해밍 거리 (64비트 중)
+IMAGE_LINK_NEAR_DUPLICATES = False  # True면 유사 이미지를 저장하지 않고 기존 파일에 연결
+IMAGE_ORPHAN_GRACE = 3600  # 유사 이미지로 연결하고 남은 파일을 참조가 없는지 다시 보고 지우기까지 기다리는 시간 (초)
+
+# 파생 이미지(썸네일/WebP) 설정
+IMAGE_VARIANTS = {
+    'thumb': {'size': (320, 320), 'quality': 75, 'animated': False},  # 목록/상세 미리보기 (첫 프레임)
+    'medium': {'size': (1280, 1280), 'quality': 80, 'animated': True},  # 상세 페이지 본문 (움직이는 GIF 유지)
+}
+DERIVATIVE_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 파생 이미지 캐시 최대 크기 (바이트)
+IMAGE_EAGER_THUMBNAILS = True  # 다운로드 워커가 새 이미지의 썸네일을 미리 만든다
+IMAGE_CACHE_MAX_AGE = 365 * 24 * 3600  # 내용 주소 이미지/파생 이미지의 Cache-Control max-age (초)
+IMAGE_LEGACY_CACHE_MAX_AGE = 3600  # 예전 평면 경로 이미지의 max-age (초, 내용이 바뀔 수 있다)
+
+# 전문 검색 설정 (SQLite FTS5)
+# 'trigram': 세 글자 단위 색인이라 띄어쓰기/조사와 상관없이 한국어 부분 문자열을 찾는다 (SQLite 3.34+)
+# 'unicode61': 공백/구두점 단위 단어 색인. 색인이 작지만 '게임'으로 '게임을'을 찾지 못한다
+# 바꾼 뒤에는 main.py --rebuild-search로 색인을 다시 만든다.
+SEARCH_TOKENIZER = 'trigram'
+SEARCH_SNIPPET_TOKENS = 24  # 검색 결과 발췌문 길이 (토큰 수)
+SEARCH_TITLE_WEIGHT = 5.0  # BM25 순위에서 본문 대비 제목 가중치
+SEARCH_COMMENT_WEIGHT = 0.5  # 댓글에서만 일치한 게시물의 순위 가중치
+
+# 내보내기 설정 (관리자 페이지)
+EXPORT_CHUNK_SIZE = 1000  # 한 번에 읽는 게시물 수
+EXPORT_BUFFER_BYTES = 256 * 1024  # 이 크기만큼 모아서 응답으로 보낸다
+PARQUET_EXPORT_FOLDER = os.path.join(OUTPUT_FOLDER, "parquet")  # main.py --export-parquet 기본 위치
+PARQUET_ROW_GROUP_SIZE = 50000  # 파티션마다 이 행 수만큼 모아 한 행 그룹으로 쓴다
+PARQUET_COMPRESSION = 'zstd'
+
+# 오래된 게시물 보관 설정 (main.py --compress)
+ARCHIVE_SEGMENT_BYTES = 64 * 1024 * 1024  # 세그먼트 파일 최대 크기 (바이트)
+ARCHIVE_CHUNK_SIZE = 1000  # 한 번에 보관하고 지우는 게시물 수
+ARCHIVE_DICT_SIZE = 112 * 1024  # 게시물 프레임 공용 zstd 사전 크기 (바이트)
+ARCHIVE_COMPRESSION_LEVEL = 10
+ARCHIVE_VACUUM = True  # 보관 후 VACUUM (처음 한 번 전체 VACUUM, 이후 incremental_vacuum)
+
+# 작업 큐/워커 설정 (main.py --worker)
+WORKER_PROCESSES = 2  # -j 기본값
+JOB_VISIBILITY_TIMEOUT = 300  # 하트비트 없이 이 시간이 지나면 다른 워커가 작업을 가져간다 (초)
+JOB_HEARTBEAT_INTERVAL = 60  # 실행 중인 작업의 임대 연장 간격 (초)
+JOB_POLL_INTERVAL = 5  # 대기 중인 작업이 없을 때 다시 확인하는 간격 (초)
+JOB_MAX_ATTEMPTS = 3  # 이만큼 실패하면 dead로 옮긴다
+JOB_RETRY_BACKOFF = 60  # 재시도 간격: backoff * 2^(시도 횟수 - 1) 초
+JOB_RETRY_BACKOFF_MAX = 3600
+
+# 갤러리 스케줄러 설정 (main.py --scheduler)
+SCHEDULER_REQUESTS_PER_MINUTE = 60  # 모든 갤러리가 나눠 쓰는 요청 예산
+SCHEDULER_REQUEST_BURST = 120  # 예산 토큰 버킷 최대 용량 (요청 수)
+SCHEDULER_DEFAULT_FRESHNESS = 600  # GALLERIES 항목에 freshness가 없을 때 (초)
+SCHEDULER_TICK = 5  # 폴링할 갤러리를 확인하는 간격 (초)
+SCHEDULER_MIN_INTERVAL = 60  # 갤러리 폴링 간격 하한 (초)
+SCHEDULER_MAX_INTERVAL = 6 * 3600  # 조용한 갤러리의 폴링 간격 상한 (초)
+SCHEDULER_MIN_POSTS_PER_POLL = 1.0  # 신선도 목표 동안 이보다 적게 올라오면 이만큼 쌓일 때까지 간격을 늘린다
+SCHEDULER_MAX_POSTS_PER_POLL = 100  # 한 번에 이보다 많이 쌓이기 전에 폴링한다 (목록 MAX_PAGES 페이지 안에서)
+SCHEDULER_RATE_SMOOTHING = 0.3  # 도착률/요청 수 지수 이동 평균 가중치 (최근 폴링 비중)
+
+# 파서 설정
+PARSER_BACKEND = 'lxml'  # 'bs4', 'lxml', 'selectolax' (설치되지 않았으면 bs4 사용)
+# 비동기 엔진은 HTML/댓글 JSON 파싱을 파서 프로세스 풀에서 실행한다 (0이면 이벤트 루프에서 직접 파싱)
+PARSE_WORKERS = os.cpu_count() or 1
+PIPELINE_QUEUE_SIZE = 32  # 본문 요청 -> 파싱 -> 댓글 요청 -> 저장 단계 사이 큐 크기
+
+# 댓글 AJAX 설정
+COMMENT_API_PATH = '/board/comment/'  # 게시물 URL 기준 댓글 JSON 엔드포인트
+COMMENT_MAX_PAGES = 50  # 게시물당 최대 댓글 페이지 수
+
+# Selenium 드라이버 풀 설정
+DRIVER_POOL_SIZE = 2  # 동시에 유지할 Chrome 인스턴스 수
+DRIVER_MAX_PAGES = 50  # 이 페이지 수만큼 사용한 드라이버는 재생성
+DRIVER_HEADLESS = True
+DRIVER_CHECKOUT_TIMEOUT = 120  # 드라이버 대여 대기 시간 (초)
 
 # User-Agent 설정
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
@@ -37,5 +151,5 @@ LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 LOG_LEVEL = logging.INFO
 
 # 출력 폴더 생성
-for folder in [DATA_DIR, OUTPUT_FOLDER, IMAGES_FOLDER, COMPRESSED_DATA_FOLDER, LOG_FOLDER]:
+for folder in [DATA_DIR, OUTPUT_FOLDER, IMAGES_FOLDER, DERIVATIVES_FOLDER, COMPRESSED_DATA_FOLDER, LOG_FOLDER]:
     os.makedirs(folder, exist_ok=True)
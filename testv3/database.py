@@ -1,10 +1,70 @@
+import json
+import time
+import base64
 import sqlite3
 import logging
+from contextlib import contextmanager
 from threading import local
-from config import DB_PATH
+from config import DB_PATH, SEARCH_TITLE_WEIGHT, SEARCH_COMMENT_WEIGHT, SEARCH_SNIPPET_TOKENS
+from schema import apply_pragmas, migrate
 
 logger = logging.getLogger(__name__)
 
+# 같은 게시물의 같은 댓글 번호(data_no)는 한 행만 유지하고, 내용이 바뀐 경우에만 갱신한다.
+UPSERT_COMMENT_SQL = '''
+    INSERT INTO comments (post_id, data_no, author, content, date)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(post_id, data_no) DO UPDATE SET
+        author = excluded.author,
+        content = excluded.content,
+        date = excluded.date
+    WHERE comments.author IS NOT excluded.author
+       OR comments.content IS NOT excluded.content
+       OR comments.date IS NOT excluded.date
+'''
+
+# data_no가 없는 댓글(Selenium 대체 경로)은 완전히 같은 행이 없을 때만 삽입한다.
+INSERT_UNNUMBERED_COMMENT_SQL = '''
+    INSERT INTO comments (post_id, data_no, author, content, date)
+    SELECT ?1, NULL, ?2, ?3, ?4
+    WHERE NOT EXISTS (
+        SELECT 1 FROM comments
+        WHERE post_id = ?1 AND data_no IS NULL AND author IS ?2 AND content IS ?3 AND date IS ?4
+    )
+'''
+
+def write_comments(cursor, post_id, comments):
+    numbered = []
+    unnumbered = []
+    for comment in comments:
+        if comment.get('data_no'):
+            numbered.append((post_id, comment['data_no'], comment['author'],
+                             comment['content'], comment.get('date', '')))
+        else:
+            unnumbered.append((post_id, comment['author'], comment['content'], comment.get('date', '')))
+    if numbered:
+        cursor.executemany(UPSERT_COMMENT_SQL, numbered)
+    if unnumbered:
+        cursor.executemany(INSERT_UNNUMBERED_COMMENT_SQL, unnumbered)
+
+def like_pattern(term):
+    """부분 문자열 LIKE 패턴 (ESCAPE '\\'와 함께 쓴다)."""
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def encode_cursor(post):
+    """목록 페이지 경계 게시물의 (date, id)를 URL에 넣을 문자열로 만든다."""
+    value = f"{post['id']}:{post['date'] or ''}"
+    return base64.urlsafe_b64encode(value.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """(date, id). 잘못된 값이면 None."""
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        post_id, date = value.split(':', 1)
+        return date, int(post_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
 class DatabaseManager:
     def __init__(self):
         self.local = local()
@@ -15,11 +75,39 @@ class DatabaseManager:
         return self.local.db
 
 class Database:
-    def __init__(self):
-        self.conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    def __init__(self, db_path=DB_PATH):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
         self.cursor = self.conn.cursor()
+        self.transaction_active = False
+        apply_pragmas(self.conn)
         self.create_tables()
+        migrate(self.conn)
+
+    @contextmanager
+    def transaction(self):
+        """블록 안의 쓰기를 하나의 트랜잭션으로 묶는다. 예외가 발생하면 전부 롤백한다."""
+        if self.transaction_active:
+            # 이미 열린 트랜잭션에 합류한다
+            yield self
+            return
+        self.transaction_active = True
+        try:
+            yield self
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        finally:
+            self.transaction_active = False
+
+    def commit(self):
+        if not self.transaction_active:
+            self.conn.commit()
+
+    def rollback(self):
+        if not self.transaction_active:
+            self.conn.rollback()
         
     def create_tables(self):
         self.cursor.execute('''
@@ -35,16 +123,6 @@ class Database:
             )
         ''')
 
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS crawling_progress (
-                id INTEGER PRIMARY KEY,
-                current_page INTEGER,
-                total_pages INTEGER,
-                total_processed INTEGER
-            )
-        ''')
-
-
         self.cursor.execute('''
             CREATE TABLE IF NOT EXISTS comments (
                 id INTEGER PRIMARY KEY,
@@ -71,12 +149,13 @@ class Database:
     def insert_post(self, post_data):
         try:
             self.cursor.execute('''
-                INSERT INTO posts (number, title, author, date, views, votes, content)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (post_data['number'], post_data['title'], post_data['author'],
+                INSERT INTO posts (number, gallery_id, title, author, author_id, author_ip, date, views, votes, content)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (post_data['number'], post_data.get('gallery_id'), post_data['title'], post_data['author'],
+                post_data.get('author_id'), post_data.get('author_ip'),
                 post_data['date'], post_data['views'], post_data['votes'],
                 post_data['content']))
-            self.conn.commit()
+            self.commit()
             return self.cursor.lastrowid  # 삽입된 행의 ID 반환
         except sqlite3.Error as e:
             logger.error(f"데이터베이스 오류 (게시물 삽입): {e}")
@@ -84,20 +163,423 @@ class Database:
 
     def insert_comment(self, post_id, comment_data):
         try:
-            self.cursor.execute('''
-                INSERT INTO comments (post_id, author, content, date)
-                VALUES (?, ?, ?, ?)
-                ''', (post_id, comment_data['author'], comment_data['content'], comment_data['date']))
-            self.conn.commit()
+            write_comments(self.cursor, post_id, [comment_data])
+            self.commit()
             return self.cursor.lastrowid
         except sqlite3.Error as e:
             logger.error(f"데이터베이스 오류 (댓글 삽입): {e}")
             return None
 
 
-    def get_post_by_number(self, number):
+    def insert_posts_bulk(self, posts):
+        try:
+            with self.transaction():
+                self.cursor.executemany('''
+                    INSERT INTO posts (number, gallery_id, title, author, author_id, author_ip, date, views, votes, content)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [(post['number'], post.get('gallery_id'), post['title'], post['author'], post.get('author_id'),
+                       post.get('author_ip'), post['date'], post['views'], post['votes'], post['content'])
+                      for post in posts])
+            return len(posts)
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (게시물 일괄 삽입): {e}")
+            return 0
+
+    def insert_comments_bulk(self, post_id, comments):
+        try:
+            with self.transaction():
+                write_comments(self.cursor, post_id, comments)
+            return len(comments)
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (댓글 일괄 삽입): {e}")
+            return 0
+
+    def insert_images_bulk(self, post_id, images):
+        """images: image_manager 이미지 레코드 목록. 게시물에 이미 연결된 파일은 건너뛴다."""
+        try:
+            with self.transaction():
+                self.cursor.executemany('''
+                    INSERT OR IGNORE INTO images
+                    (post_id, file_path, sha256, url, position, size, phash, dhash, duplicate_of)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [(post_id, image['file_path'], image['sha256'], image['url'], image.get('position'),
+                       image['size'], image.get('phash'), image.get('dhash'), image.get('duplicate_of'))
+                      for image in images])
+            return len(images)
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (이미지 일괄 삽입): {e}")
+            return 0
+
+    def get_image_by_url(self, url):
+        """이미 받은 URL이면 이미지 레코드를, 아니면 None을 반환한다."""
+        try:
+            self.cursor.execute('''
+                SELECT url, file_path, sha256, size, phash, dhash, duplicate_of FROM images
+                WHERE url = ? AND sha256 IS NOT NULL
+                LIMIT 1
+            ''', (url,))
+            result = self.cursor.fetchone()
+            if result:
+                return dict(zip([column[0] for column in self.cursor.description], result))
+            return None
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (이미지 URL 조회): {e}")
+            return None
+
+    def get_image(self, image_id):
+        try:
+            self.cursor.execute("SELECT * FROM images WHERE id = ?", (image_id,))
+            result = self.cursor.fetchone()
+            return dict(result) if result else None
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (이미지 조회): {e}")
+            return None
+
+    def get_images_by_file_paths(self, file_paths):
+        if not file_paths:
+            return []
+        try:
+            self.cursor.execute(
+                f"SELECT * FROM images WHERE file_path IN ({', '.join('?' * len(file_paths))}) ORDER BY id",
+                file_paths)
+            return [dict(row) for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (파일 경로로 이미지 조회): {e}")
+            return []
+
+    def count_image_references(self, file_path):
+        try:
+            self.cursor.execute("SELECT COUNT(*) FROM images WHERE file_path = ?", (file_path,))
+            return self.cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (이미지 참조 수 조회): {e}")
+            # 셀 수 없으면 파일을 지우지 않도록 0 대신 None
+            return None
+
+    def add_image_orphan(self, file_path):
+        try:
+            self.cursor.execute("INSERT OR REPLACE INTO image_orphans (file_path, created_at) VALUES (?, ?)",
+                                (file_path, time.time()))
+            self.commit()
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (정리할 이미지 등록): {e}")
+
+    def get_image_orphans(self, created_before):
+        try:
+            self.cursor.execute("SELECT file_path FROM image_orphans WHERE created_at < ?", (created_before,))
+            return [row[0] for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (정리할 이미지 조회): {e}")
+            return []
+
+    def delete_image_orphan(self, file_path):
+        try:
+            self.cursor.execute("DELETE FROM image_orphans WHERE file_path = ?", (file_path,))
+            self.commit()
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (정리할 이미지 삭제): {e}")
+
+    def get_image_hashes(self):
+        """유사 이미지 색인에 넣을 (file_path, phash, dhash). 파일마다 한 행."""
+        try:
+            self.cursor.execute('''
+                SELECT file_path, MIN(phash), MIN(dhash) FROM images
+                WHERE phash IS NOT NULL AND duplicate_of IS NULL
+                GROUP BY file_path
+            ''')
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (이미지 해시 조회): {e}")
+            return []
+
+    def get_unhashed_image_paths(self):
+        try:
+            self.cursor.execute("SELECT DISTINCT file_path FROM images WHERE phash IS NULL")
+            return [row[0] for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (해시 없는 이미지 조회): {e}")
+            return []
+
+    def update_image_hashes(self, file_path, phash, dhash):
+        try:
+            self.cursor.execute("UPDATE images SET phash = ?, dhash = ? WHERE file_path = ?",
+                                (phash, dhash, file_path))
+            self.commit()
+        except sqlite3.Error as e:
+            self.rollback()
+            logger.error(f"데이터베이스 오류 (이미지 해시 갱신): {e}")
+
+    def enqueue_image_jobs(self, post_id, image_urls):
+        """게시물의 이미지 URL을 다운로드 작업으로 등록한다. 이미 등록된 URL은 건너뛴다."""
+        try:
+            with self.transaction():
+                self.cursor.executemany('''
+                    INSERT OR IGNORE INTO image_jobs (post_id, url, position, updated_at)
+                    VALUES (?, ?, ?, datetime('now'))
+                ''', [(post_id, url, position) for position, url in enumerate(image_urls)])
+            return len(image_urls)
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (이미지 작업 등록): {e}")
+            return 0
+
+    def get_pending_image_jobs(self, post_id=None, include_failed=False, limit=None):
+        """아직 끝나지 않은 이미지 작업 (id, post_id, url, position) 목록. 임대가 만료된 작업도 포함한다.
+
+        작업을 가져가지는 않으므로 받기 전에 claim_image_job으로 임대해야 한다.
+        """
+        statuses = ('pending', 'failed') if include_failed else ('pending',)
+        query = f"""
+            SELECT id, post_id, url, position FROM image_jobs
+            WHERE (status IN ({', '.join('?' * len(statuses))}) OR (status = 'running' AND lease_expires_at < ?))
+        """
+        params = [*statuses, time.time()]
+        if post_id is not None:
+            query += " AND post_id = ?"
+            params.append(post_id)
+        query += " ORDER BY id"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        try:
+            self.cursor.execute(query, params)
+            return [tuple(row) for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (이미지 작업 조회): {e}")
+            return []
+
+    def claim_image_job(self, job_id, lease):
+        """이미지 작업을 lease초 동안 임대한다.
+
+        대기 중이거나 실패했거나 임대가 만료된 작업만 임대하고, 같은 URL의 다른 작업이 임대 중이면
+        임대하지 않는다. 반환값은 'claimed'(임대함), 'busy'(같은 URL을 다른 작업이 받는 중), 'taken'(이미
+        끝났거나 다른 워커가 임대함).
+        """
+        now = time.time()
+        try:
+            with self.transaction():
+                self.cursor.execute('''
+                    UPDATE image_jobs SET status = 'running', lease_expires_at = ?, updated_at = datetime('now')
+                    WHERE id = ?
+                      AND (status IN ('pending', 'failed') OR (status = 'running' AND lease_expires_at < ?))
+                      AND NOT EXISTS (
+                          SELECT 1 FROM image_jobs other
+                          WHERE other.url = image_jobs.url AND other.id != image_jobs.id
+                            AND other.status = 'running' AND other.lease_expires_at >= ?
+                      )
+                    RETURNING id
+                ''', (now + lease, job_id, now, now))
+                # RETURNING 결과는 커밋 전에 읽어야 한다
+                if self.cursor.fetchone():
+                    return 'claimed'
+                self.cursor.execute('''
+                    SELECT 1 FROM image_jobs
+                    WHERE id = ?
+                      AND (status IN ('pending', 'failed') OR (status = 'running' AND lease_expires_at < ?))
+                ''', (job_id, now))
+                return 'busy' if self.cursor.fetchone() else 'taken'
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (이미지 작업 임대): {e}")
+            return 'taken'
+
+    def finish_image_job(self, job_id, post_id, image):
+        """이미지 레코드를 넣고 작업을 끝낸다. 레코드를 넣지 못하면 작업은 그대로 두고 False를 반환한다."""
+        try:
+            with self.transaction():
+                if not self.insert_images_bulk(post_id, [image]):
+                    # insert_images_bulk는 오류를 기록만 하므로 여기서 트랜잭션을 되돌린다
+                    raise sqlite3.Error("이미지 레코드 삽입 실패")
+                self.cursor.execute('''
+                    UPDATE image_jobs
+                    SET status = 'done', attempts = attempts + 1, bytes_done = ?, error = NULL,
+                        lease_expires_at = NULL, updated_at = datetime('now')
+                    WHERE id = ?
+                ''', (image['size'], job_id))
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (이미지 작업 완료): {e}")
+            return False
+
+    def fail_image_job(self, job_id, error, bytes_done=0, final=False):
+        """실패를 기록한다. final이면 더 재시도하지 않도록 failed로 표시한다."""
+        try:
+            self.cursor.execute('''
+                UPDATE image_jobs
+                SET status = ?, attempts = attempts + 1, bytes_done = ?, error = ?, lease_expires_at = NULL,
+                    updated_at = datetime('now')
+                WHERE id = ?
+            ''', ('failed' if final else 'pending', bytes_done, str(error), job_id))
+            self.commit()
+        except sqlite3.Error as e:
+            self.rollback()
+            logger.error(f"데이터베이스 오류 (이미지 작업 실패 기록): {e}")
+
+    def get_image_job_counts(self):
+        """상태별 이미지 작업 수 {'pending': n, 'done': n, 'failed': n}."""
+        try:
+            self.cursor.execute("SELECT status, COUNT(*) FROM image_jobs GROUP BY status")
+            return {status: count for status, count in self.cursor.fetchall()}
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (이미지 작업 통계): {e}")
+            return {}
+
+    def enqueue_job(self, kind, payload=None, priority=0, max_attempts=3, dedupe_key=None, delay=0):
+        """작업을 등록하고 id를 반환한다. dedupe_key가 같은 작업이 대기/실행 중이면 그 작업의 id."""
+        now = time.time()
+        try:
+            with self.transaction():
+                self.cursor.execute('''
+                    INSERT OR IGNORE INTO jobs (kind, payload, priority, max_attempts, dedupe_key, run_at, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (kind, json.dumps(payload or {}, ensure_ascii=False), priority, max_attempts, dedupe_key,
+                      now + delay, now))
+                if self.cursor.rowcount:
+                    return self.cursor.lastrowid
+                self.cursor.execute(
+                    "SELECT id FROM jobs WHERE dedupe_key = ? AND status IN ('queued', 'running')", (dedupe_key,))
+                return self.cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (작업 등록): {e}")
+            return None
+
+    def lease_job(self, owner, visibility_timeout, kinds=None):
+        """실행할 작업 하나를 owner에게 visibility_timeout초 동안 빌려주고 행(dict)을 반환한다. 없으면 None.
+
+        대기 중이고 실행 시각이 된 작업, 또는 임대가 만료된(워커가 죽은) 실행 중 작업을 우선순위,
+        등록 순으로 고른다. 만료된 작업이 이미 max_attempts번 시도했으면 dead로 옮긴다.
+        """
+        now = time.time()
+        params = {'owner': owner, 'now': now, 'expires': now + visibility_timeout}
+        kind_filter = ''
+        if kinds:
+            params.update({f"kind{index}": kind for index, kind in enumerate(kinds)})
+            kind_filter = f"AND kind IN ({', '.join(f':kind{index}' for index in range(len(kinds)))})"
+        try:
+            with self.transaction():
+                self.cursor.execute('''
+                    UPDATE jobs SET status = 'dead', finished_at = :now,
+                                    last_error = COALESCE(last_error, '임대 만료 (워커 응답 없음)')
+                    WHERE status = 'running' AND lease_expires_at < :now AND attempts >= max_attempts
+                ''', params)
+                self.cursor.execute(f'''
+                    UPDATE jobs SET status = 'running', lease_owner = :owner, lease_expires_at = :expires,
+                                    heartbeat_at = :now, attempts = attempts + 1
+                    WHERE id = (
+                        SELECT id FROM jobs
+                        WHERE ((status = 'queued' AND run_at <= :now)
+                               OR (status = 'running' AND lease_expires_at < :now)) {kind_filter}
+                        ORDER BY priority DESC, id
+                        LIMIT 1
+                    )
+                    RETURNING *
+                ''', params)
+                # RETURNING 결과는 커밋 전에 읽어야 한다
+                result = self.cursor.fetchone()
+            if not result:
+                return None
+            job = dict(result)
+            job['payload'] = json.loads(job['payload'])
+            return job
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (작업 임대): {e}")
+            return None
+
+    def heartbeat_job(self, job_id, owner, visibility_timeout):
+        """임대를 연장한다. 임대를 잃었으면(만료 후 다른 워커가 가져감) False."""
+        now = time.time()
+        try:
+            self.cursor.execute('''
+                UPDATE jobs SET lease_expires_at = ?, heartbeat_at = ?
+                WHERE id = ? AND lease_owner = ? AND status = 'running'
+            ''', (now + visibility_timeout, now, job_id, owner))
+            self.commit()
+            return self.cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (작업 하트비트): {e}")
+            return False
+
+    def complete_job(self, job_id, owner):
+        try:
+            self.cursor.execute('''
+                UPDATE jobs SET status = 'done', finished_at = ?, lease_owner = NULL, lease_expires_at = NULL,
+                                last_error = NULL
+                WHERE id = ? AND lease_owner = ?
+            ''', (time.time(), job_id, owner))
+            self.commit()
+            return self.cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (작업 완료): {e}")
+            return False
+
+    def fail_job(self, job_id, owner, error, retry_delay):
+        """실패를 기록한다. 시도 횟수가 남았으면 retry_delay초 뒤 다시 대기시키고, 아니면 dead로 옮긴다."""
+        now = time.time()
+        try:
+            self.cursor.execute('''
+                UPDATE jobs SET
+                    status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,
+                    finished_at = CASE WHEN attempts >= max_attempts THEN ? END,
+                    run_at = ?, last_error = ?, lease_owner = NULL, lease_expires_at = NULL
+                WHERE id = ? AND lease_owner = ?
+            ''', (now, now + retry_delay, str(error), job_id, owner))
+            self.commit()
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (작업 실패 기록): {e}")
+
+    def requeue_job(self, job_id):
+        """dead 작업을 시도 횟수를 초기화해 다시 대기시킨다."""
+        try:
+            self.cursor.execute('''
+                UPDATE jobs SET status = 'queued', attempts = 0, run_at = ?, finished_at = NULL
+                WHERE id = ? AND status = 'dead'
+            ''', (time.time(), job_id))
+            self.commit()
+            return self.cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (작업 재등록): {e}")
+            return False
+
+    def get_jobs(self, limit=20, status=None):
+        """최근 작업 목록 (관리자 페이지)."""
+        try:
+            if status:
+                self.cursor.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit))
+            else:
+                self.cursor.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+            jobs = [dict(row) for row in self.cursor.fetchall()]
+            for job in jobs:
+                job['payload'] = json.loads(job['payload'])
+            return jobs
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (작업 목록 조회): {e}")
+            return []
+
+    def is_job_active(self, dedupe_key):
+        """같은 dedupe_key의 작업이 대기/실행 중인지 확인한다."""
+        try:
+            self.cursor.execute('''
+                SELECT 1 FROM jobs WHERE dedupe_key = ? AND status IN ('queued', 'running') LIMIT 1
+            ''', (dedupe_key,))
+            return self.cursor.fetchone() is not None
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (작업 상태 확인): {e}")
+            return False
+
+    def get_job_counts(self):
+        """상태별 작업 수 {'queued': n, 'running': n, 'done': n, 'dead': n}."""
+        try:
+            self.cursor.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+            return {status: count for status, count in self.cursor.fetchall()}
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (작업 통계): {e}")
+            return {}
+
+    def get_post_by_number(self, number, gallery_id=None):
+        """갤러리의 글번호로 게시물을 찾는다. gallery_id가 없으면 글번호만으로 찾는다."""
         try:
-            self.cursor.execute("SELECT * FROM posts WHERE number = ?", (number,))
+            if gallery_id is None:
+                self.cursor.execute("SELECT * FROM posts WHERE number = ? ORDER BY id LIMIT 1", (number,))
+            else:
+                self.cursor.execute("SELECT * FROM posts WHERE number = ? AND gallery_id = ?", (number, gallery_id))
             result = self.cursor.fetchone()
             if result:
                 return dict(zip([column[0] for column in self.cursor.description], result))
@@ -109,55 +591,244 @@ class Database:
 
     def insert_image(self, post_id, file_path, md5_hash):
         try:
-            filename = os.path.basename(file_path)
             self.cursor.execute('''
                 INSERT INTO images (post_id, file_path, md5_hash)
                 VALUES (?, ?, ?)
-            ''', (post_id, filename, md5_hash))
-            self.conn.commit()
+            ''', (post_id, file_path, md5_hash))
+            self.commit()
             return self.cursor.lastrowid
         except sqlite3.IntegrityError as e:
-            self.conn.rollback()
+            self.rollback()
             logger.warning(f"이미지 삽입 중 무결성 오류 발생: {e}. 이미 존재하는 이미지일 수 있습니다.")
             return None
         except sqlite3.Error as e:
-            self.conn.rollback()
+            self.rollback()
             logger.error(f"데이터베이스 오류 (이미지 삽입): {e}")
             return None
 
 
-    def get_posts_with_details(self, page, per_page):
-        offset = (page - 1) * per_page
-        self.cursor.execute("SELECT COUNT(*) FROM posts")
-        total_posts = self.cursor.fetchone()[0]
+    def get_posts_page(self, per_page, before=None, after=None):
+        """최신순 게시물 목록 한 페이지 (키셋 페이지네이션).
 
-        self.cursor.execute("""
-            SELECT p.*, COUNT(c.id) as comment_count,
-            (SELECT GROUP_CONCAT(file_path, '|') FROM images WHERE post_id = p.id) as image_paths
+        before=(date, id)이면 그보다 오래된 게시물, after=(date, id)이면 그보다 새 게시물을 가져온다.
+        OFFSET 없이 (date, id) 인덱스에서 바로 시작하므로 몇 번째 페이지든 비용이 같다.
+        반환값은 (게시물 목록, 더 오래된 게시물이 있는지, 더 새 게시물이 있는지).
+        """
+        select = '''
+            SELECT p.id, p.number, p.title, p.author, p.date, p.views, p.votes,
+                   p.comment_count, p.image_count,
+                   CASE WHEN p.image_count > 0 THEN
+                       (SELECT file_path FROM images WHERE post_id = p.id ORDER BY position, id LIMIT 1)
+                   END AS thumbnail_path
             FROM posts p
-            LEFT JOIN comments c ON p.id = c.post_id
-            GROUP BY p.id
-            ORDER BY p.date DESC LIMIT ? OFFSET ?
-        """, (per_page, offset))
-        posts = [dict(row) for row in self.cursor.fetchall()]
-        return posts, total_posts
+        '''
+        try:
+            if after:
+                # 새 게시물 방향으로는 오름차순으로 읽고 뒤집는다
+                self.cursor.execute(select + "WHERE (p.date, p.id) > (?, ?) ORDER BY p.date, p.id LIMIT ?",
+                                    (*after, per_page + 1))
+                rows = [dict(row) for row in self.cursor.fetchall()]
+                has_newer = len(rows) > per_page
+                return list(reversed(rows[:per_page])), True, has_newer
+            if before:
+                self.cursor.execute(select + "WHERE (p.date, p.id) < (?, ?) ORDER BY p.date DESC, p.id DESC LIMIT ?",
+                                    (*before, per_page + 1))
+            else:
+                self.cursor.execute(select + "ORDER BY p.date DESC, p.id DESC LIMIT ?", (per_page + 1,))
+            rows = [dict(row) for row in self.cursor.fetchall()]
+            return rows[:per_page], len(rows) > per_page, before is not None
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (게시물 목록 조회): {e}")
+            return [], False, False
 
+    def search_posts(self, match, limit, offset=0):
+        """FTS5 MATCH 식과 일치하는 게시물을 BM25 순으로 반환한다.
 
+        제목/본문 일치와 댓글 일치 중 게시물마다 순위가 가장 좋은 것 하나를 쓰며, 그 발췌문을
+        snippet에 담는다 (일치 구간은 \\x02, \\x03으로 표시).
+        """
+        try:
+            self.cursor.execute('''
+                WITH hits AS (
+                    SELECT rowid AS post_id, bm25(posts_fts, ?, 1.0) AS rank,
+                           highlight(posts_fts, 0, char(2), char(3)) AS title_highlight,
+                           snippet(posts_fts, 1, char(2), char(3), '…', ?) AS snippet
+                    FROM posts_fts WHERE posts_fts MATCH ?
+                    UNION ALL
+                    SELECT c.post_id, bm25(comments_fts) * ? AS rank, NULL AS title_highlight,
+                           snippet(comments_fts, 0, char(2), char(3), '…', ?) AS snippet
+                    FROM comments_fts JOIN comments c ON c.id = comments_fts.rowid
+                    WHERE comments_fts MATCH ?
+                ), best AS (
+                    -- MIN()과 함께 고른 열은 순위가 가장 좋은 행의 값이다
+                    SELECT post_id, MIN(rank) AS rank, title_highlight, snippet FROM hits GROUP BY post_id
+                )
+                SELECT p.id, p.number, p.title, p.author, p.date, p.views, p.votes,
+                       p.comment_count, p.image_count, best.rank, best.title_highlight, best.snippet
+                FROM best JOIN posts p ON p.id = best.post_id
+                ORDER BY best.rank, p.id DESC
+                LIMIT ? OFFSET ?
+            ''', (SEARCH_TITLE_WEIGHT, SEARCH_SNIPPET_TOKENS, match,
+                  SEARCH_COMMENT_WEIGHT, SEARCH_SNIPPET_TOKENS, match, limit, offset))
+            return [dict(row) for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (게시물 검색): {e}")
+            return []
+
+    def search_posts_like(self, terms, limit, offset=0):
+        """색인으로 찾을 수 없는 짧은 검색어용 LIKE 검색. 최신순이며 match_text에 일치한 본문/댓글이 있다."""
+        conditions = []
+        params = []
+        for term in terms:
+            pattern = like_pattern(term)
+            conditions.append('''(p.title LIKE ? ESCAPE '\\' OR p.content LIKE ? ESCAPE '\\'
+                OR EXISTS (SELECT 1 FROM comments c WHERE c.post_id = p.id AND c.content LIKE ? ESCAPE '\\'))''')
+            params += [pattern, pattern, pattern]
+        first = like_pattern(terms[0])
+        try:
+            self.cursor.execute(f'''
+                SELECT p.id, p.number, p.title, p.author, p.date, p.views, p.votes,
+                       p.comment_count, p.image_count, NULL AS rank,
+                       CASE WHEN p.title LIKE ? ESCAPE '\\' OR p.content LIKE ? ESCAPE '\\' THEN p.content
+                            ELSE (SELECT c.content FROM comments c
+                                  WHERE c.post_id = p.id AND c.content LIKE ? ESCAPE '\\' LIMIT 1)
+                       END AS match_text
+                FROM posts p
+                WHERE {' AND '.join(conditions)}
+                ORDER BY p.date DESC, p.id DESC
+                LIMIT ? OFFSET ?
+            ''', (first, first, first, *params, limit, offset))
+            return [dict(row) for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (게시물 LIKE 검색): {e}")
+            return []
+
+    def get_gallery_ids(self):
+        """게시물이 있는 갤러리 id 목록. 갤러리를 모르는 예전 게시물이 있으면 None도 포함한다."""
+        try:
+            self.cursor.execute("SELECT DISTINCT gallery_id FROM posts ORDER BY gallery_id")
+            return [row[0] for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (갤러리 목록 조회): {e}")
+            return []
+
+    def iter_posts(self, chunk_size=1000, include_comments=False, include_images=False, gallery_ids=None):
+        """게시물을 id 순으로 chunk_size개씩 읽어 한 행씩 내보낸다 (내보내기/보관용).
+
+        gallery_ids를 주면 그 갤러리의 게시물만 읽는다 (목록의 None은 갤러리를 모르는 게시물).
+
+        청크마다 id 키셋으로 새 쿼리를 실행하므로 긴 읽기 트랜잭션을 잡지 않고, 댓글/이미지는
+        청크의 게시물을 한 번에 조회해 붙인다 (게시물마다 쿼리하지 않는다).
+        """
+        cursor = self.conn.cursor()
+        condition = ''
+        params = ()
+        if gallery_ids is not None:
+            condition = 'AND (' + ' OR '.join(['gallery_id IS ?'] * len(gallery_ids)) + ')'
+            params = tuple(gallery_ids)
+        last_id = 0
+        while True:
+            cursor.execute(f"SELECT * FROM posts WHERE id > ? {condition} ORDER BY id LIMIT ?",
+                           (last_id, *params, chunk_size))
+            posts = [dict(row) for row in cursor.fetchall()]
+            if not posts:
+                return
+            last_id = posts[-1]['id']
+            placeholders = ', '.join('?' * len(posts))
+            post_ids = [post['id'] for post in posts]
+            comments = {}
+            if include_comments:
+                cursor.execute(f'''
+                    SELECT post_id, data_no, author, content, date FROM comments
+                    WHERE post_id IN ({placeholders}) ORDER BY post_id, id
+                ''', post_ids)
+                for row in cursor.fetchall():
+                    comments.setdefault(row['post_id'], []).append(
+                        {key: row[key] for key in ('data_no', 'author', 'content', 'date')})
+            images = {}
+            if include_images:
+                cursor.execute(f'''
+                    SELECT post_id, file_path, sha256, url, position, size FROM images
+                    WHERE post_id IN ({placeholders}) ORDER BY post_id, position, id
+                ''', post_ids)
+                for row in cursor.fetchall():
+                    images.setdefault(row['post_id'], []).append(
+                        {key: row[key] for key in ('file_path', 'sha256', 'url', 'position', 'size')})
+            for post in posts:
+                if include_comments:
+                    post['comments'] = comments.get(post['id'], [])
+                if include_images:
+                    post['images'] = images.get(post['id'], [])
+                yield post
+
+    def delete_posts(self, post_ids):
+        """게시물과 댓글/이미지 연결/이미지 작업을 한 번에 지운다. 이미지 파일은 지우지 않는다."""
+        if not post_ids:
+            return 0
+        placeholders = ', '.join('?' * len(post_ids))
+        try:
+            with self.transaction():
+                for table in ('comments', 'images', 'image_jobs'):
+                    self.cursor.execute(f"DELETE FROM {table} WHERE post_id IN ({placeholders})", post_ids)
+                self.cursor.execute(f"DELETE FROM posts WHERE id IN ({placeholders})", post_ids)
+                return self.cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (게시물 일괄 삭제): {e}")
+            raise
+
+    def insert_archived_posts(self, entries):
+        """entries: (post_id, number, gallery_id, date, segment, offset, length) 목록."""
+        self.cursor.executemany('''
+            INSERT OR REPLACE INTO archived_posts
+            (post_id, number, gallery_id, date, segment, offset, length, archived_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))
+        ''', entries)
+        self.commit()
+
+    def get_archived_post(self, post_id):
+        """보관된 게시물의 색인 행 (segment, offset, length 등). 없으면 None."""
+        try:
+            self.cursor.execute("SELECT * FROM archived_posts WHERE post_id = ?", (post_id,))
+            result = self.cursor.fetchone()
+            return dict(result) if result else None
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (보관 게시물 조회): {e}")
+            return None
+
+    def get_last_archive_segment(self):
+        try:
+            self.cursor.execute("SELECT MAX(segment) FROM archived_posts")
+            return self.cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (보관 세그먼트 조회): {e}")
+            return None
+
+    def vacuum(self, incremental=True):
+        """삭제로 빈 페이지를 파일 시스템에 돌려준다.
+
+        auto_vacuum이 INCREMENTAL이면 incremental_vacuum만 실행한다. 아니면 auto_vacuum을
+        INCREMENTAL로 바꾸고 VACUUM으로 파일을 다시 써서 다음부터 전체 VACUUM이 필요 없게 한다.
+        """
+        try:
+            self.conn.commit()
+            mode = self.conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            if incremental and mode == 2:
+                # incremental_vacuum은 결과 행을 모두 읽어야 끝까지 실행된다
+                self.conn.execute("PRAGMA incremental_vacuum").fetchall()
+            else:
+                self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                self.conn.execute("VACUUM")
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (VACUUM): {e}")
 
     def get_recent_posts(self, limit):
-        self.cursor.execute("SELECT * FROM posts ORDER BY date DESC LIMIT ?", (limit,))
+        self.cursor.execute("SELECT * FROM posts ORDER BY date DESC, id DESC LIMIT ?", (limit,))
         return self.cursor.fetchall()
 
     def get_post(self, post_id):
         try:
-            self.cursor.execute("""
-                SELECT p.*, COUNT(c.id) as comment_count,
-                (SELECT GROUP_CONCAT(file_path, '|') FROM images WHERE post_id = p.id) as image_paths
-                FROM posts p
-                LEFT JOIN comments c ON p.id = c.post_id
-                WHERE p.id = ?
-                GROUP BY p.id
-            """, (post_id,))
+            self.cursor.execute("SELECT * FROM posts WHERE id = ?", (post_id,))
             result = self.cursor.fetchone()
             if result:
                 return dict(result)
@@ -170,11 +841,8 @@ class Database:
         try:
             offset = (page - 1) * per_page
             self.cursor.execute("""
-                SELECT p.*, COUNT(c.id) as comment_count
-                FROM posts p
-                LEFT JOIN comments c ON p.id = c.post_id
-                GROUP BY p.id
-                ORDER BY p.date DESC
+                SELECT * FROM posts
+                ORDER BY date DESC, id DESC
                 LIMIT ? OFFSET ?
             """, (per_page, offset))
             columns = [column[0] for column in self.cursor.description]
@@ -185,7 +853,8 @@ class Database:
 
     def get_total_posts(self):
         try:
-            self.cursor.execute("SELECT COUNT(*) FROM posts")
+            # 트리거가 유지하는 행 수 (schema.add_post_counters)
+            self.cursor.execute("SELECT row_count FROM row_counts WHERE table_name = 'posts'")
             return self.cursor.fetchone()[0]
         except sqlite3.Error as e:
             logger.error(f"데이터베이스 오류 (총 게시물 수 조회): {e}")
@@ -193,8 +862,9 @@ class Database:
 
     def get_comment_count(self, post_id):
         try:
-            self.cursor.execute("SELECT COUNT(*) FROM comments WHERE post_id = ?", (post_id,))
-            return self.cursor.fetchone()[0]
+            self.cursor.execute("SELECT comment_count FROM posts WHERE id = ?", (post_id,))
+            result = self.cursor.fetchone()
+            return result[0] if result else 0
         except sqlite3.Error as e:
             logger.error(f"데이터베이스 오류 (댓글 수 조회): {e}")
             return 0
@@ -211,7 +881,7 @@ class Database:
 
     def get_images(self, post_id):
         try:
-            self.cursor.execute("SELECT * FROM images WHERE post_id = ?", (post_id,))
+            self.cursor.execute("SELECT * FROM images WHERE post_id = ? ORDER BY position, id", (post_id,))
             columns = [column[0] for column in self.cursor.description]
             return [dict(zip(columns, row)) for row in self.cursor.fetchall()]
         except sqlite3.Error as e:
@@ -225,37 +895,266 @@ class Database:
         try:
             self.cursor.execute('''
                 UPDATE posts 
-                SET title = ?, author = ?, date = ?, views = ?, votes = ?, content = ?
+                SET title = ?, author = ?, date = ?, views = ?, votes = ?, content = ?,
+                    author_id = COALESCE(?, author_id), author_ip = COALESCE(?, author_ip)
                 WHERE id = ?
             ''', (post_data['title'], post_data['author'], post_data['date'],
-                  post_data['views'], post_data['votes'], post_data['content'], post_id))
-            self.conn.commit()
+                  post_data['views'], post_data['votes'], post_data['content'],
+                  post_data.get('author_id'), post_data.get('author_ip'), post_id))
+            self.commit()
             return self.cursor.rowcount
         except sqlite3.Error as e:
             logger.error(f"데이터베이스 오류 (게시물 업데이트): {e}")
             return 0
 
-    def update_crawling_progress(self, current_page, total_pages, total_processed):
+    def start_crawl_run(self, gallery_id, url, engine, incremental, max_pages, high_water_mark, resume_max_age):
+        """같은 갤러리/방식의 끝나지 않은 실행이 있으면 이어받고, 없으면 새로 만든다. (실행 dict, 이어받았는지)."""
+        now = time.time()
         try:
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO crawling_progress (id, current_page, total_pages, total_processed)
-                VALUES (1, ?, ?, ?)
-            ''', (current_page, total_pages, total_processed))
-            self.conn.commit()
+            with self.transaction():
+                # 너무 오래 멈춰 있던 실행은 이어받지 않는다 (목록이 많이 바뀌었다)
+                self.cursor.execute('''
+                    UPDATE crawl_runs SET status = 'abandoned', finished_at = ?
+                    WHERE gallery_id = ? AND status = 'running' AND updated_at < ?
+                ''', (now, gallery_id, now - resume_max_age))
+                self.cursor.execute('''
+                    UPDATE crawl_runs SET engine = ?, max_pages = ?, updated_at = ?
+                    WHERE id = (
+                        SELECT id FROM crawl_runs
+                        WHERE gallery_id = ? AND url = ? AND incremental = ? AND status = 'running'
+                        ORDER BY id DESC
+                        LIMIT 1
+                    )
+                    RETURNING *
+                ''', (engine, max_pages, now, gallery_id, url, int(incremental)))
+                result = self.cursor.fetchone()
+                if result:
+                    return dict(result), True
+                self.cursor.execute('''
+                    INSERT INTO crawl_runs
+                    (gallery_id, url, engine, incremental, max_pages, high_water_mark, started_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    RETURNING *
+                ''', (gallery_id, url, engine, int(incremental), max_pages, high_water_mark, now, now))
+                return dict(self.cursor.fetchone()), False
         except sqlite3.Error as e:
-            logger.error(f"데이터베이스 오류 (크롤링 진행도 업데이트): {e}")
+            logger.error(f"데이터베이스 오류 (크롤링 실행 시작): {e}")
+            raise
 
-    def get_crawling_progress(self):
+    def save_crawl_checkpoints(self, run_id, kind, entries):
+        """entries: (key, post_id, data) 목록. 같은 key는 덮어쓴다."""
+        now = time.time()
         try:
-            self.cursor.execute("SELECT * FROM crawling_progress WHERE id = 1")
-            return self.cursor.fetchone()
+            with self.transaction():
+                self.cursor.executemany('''
+                    INSERT OR REPLACE INTO crawl_checkpoints (run_id, kind, key, post_id, data, done_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [(run_id, kind, str(key), post_id, data, now) for key, post_id, data in entries])
+                self.cursor.execute("UPDATE crawl_runs SET updated_at = ? WHERE id = ?", (now, run_id))
+        except sqlite3.Error as e:
+            # 기록하지 못한 작업은 이어받을 때 다시 할 뿐이므로 크롤링은 계속한다
+            logger.error(f"데이터베이스 오류 (크롤링 체크포인트 저장): {e}")
+
+    def get_crawl_checkpoints(self, run_id, kind, with_data=False):
+        """(key, post_id, data) 목록. with_data면 data가 있는 항목만."""
+        try:
+            self.cursor.execute(f'''
+                SELECT key, post_id, data FROM crawl_checkpoints
+                WHERE run_id = ? AND kind = ? {'AND data IS NOT NULL' if with_data else ''}
+            ''', (run_id, kind))
+            return [tuple(row) for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (크롤링 체크포인트 조회): {e}")
+            return []
+
+    def get_crawl_run_progress(self, run_id):
+        """{'pages', 'posts', 'comment_pages', 'images': {상태: 수}}. 이미지는 실행이 저장한 게시물의 image_jobs."""
+        try:
+            self.cursor.execute('''
+                SELECT kind, COUNT(*) FROM crawl_checkpoints WHERE run_id = ? GROUP BY kind
+            ''', (run_id,))
+            counts = dict(self.cursor.fetchall())
+            self.cursor.execute('''
+                SELECT j.status, COUNT(*) FROM crawl_checkpoints c
+                JOIN image_jobs j ON j.post_id = c.post_id
+                WHERE c.run_id = ? AND c.kind = 'post'
+                GROUP BY j.status
+            ''', (run_id,))
+            images = dict(self.cursor.fetchall())
+            return {'pages': counts.get('list', 0), 'posts': counts.get('post', 0),
+                    'comment_pages': counts.get('comments', 0), 'images': images}
         except sqlite3.Error as e:
             logger.error(f"데이터베이스 오류 (크롤링 진행도 조회): {e}")
-            return None
-            
+            return {'pages': 0, 'posts': 0, 'comment_pages': 0, 'images': {}}
+
+    def get_crawl_run_pending_image_jobs(self, run_id):
+        """실행이 저장한 게시물 중 받지 못한 이미지 작업 (id, post_id, url, position) 목록."""
+        try:
+            self.cursor.execute('''
+                SELECT j.id, j.post_id, j.url, j.position FROM crawl_checkpoints c
+                JOIN image_jobs j ON j.post_id = c.post_id
+                WHERE c.run_id = ? AND c.kind = 'post'
+                  AND (j.status = 'pending' OR (j.status = 'running' AND j.lease_expires_at < ?))
+                ORDER BY j.id
+            ''', (run_id, time.time()))
+            return [tuple(row) for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (실행 이미지 작업 조회): {e}")
+            return []
+
+    def finish_crawl_run(self, run_id):
+        """실행을 끝내고 진행도를 summary에 남긴 뒤 체크포인트를 지운다."""
+        summary = self.get_crawl_run_progress(run_id)
+        now = time.time()
+        try:
+            with self.transaction():
+                self.cursor.execute('''
+                    UPDATE crawl_runs SET status = 'done', summary = ?, finished_at = ?, updated_at = ?
+                    WHERE id = ?
+                ''', (json.dumps(summary), now, now, run_id))
+                self.cursor.execute("DELETE FROM crawl_checkpoints WHERE run_id = ?", (run_id,))
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (크롤링 실행 종료): {e}")
+
+    def get_crawl_runs(self, limit=10):
+        """최근 크롤링 실행과 진행도 (관리자 페이지). 실행 중이면 체크포인트에서 센다."""
+        try:
+            self.cursor.execute("SELECT * FROM crawl_runs ORDER BY id DESC LIMIT ?", (limit,))
+            runs = [dict(row) for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (크롤링 실행 조회): {e}")
+            return []
+        for run in runs:
+            summary = run.pop('summary')
+            run['progress'] = json.loads(summary) if summary else self.get_crawl_run_progress(run['id'])
+        return runs
+
+    def get_high_water_mark(self, gallery_id):
+        try:
+            self.cursor.execute("SELECT high_water_mark FROM gallery_state WHERE gallery_id = ?", (gallery_id,))
+            result = self.cursor.fetchone()
+            return result[0] if result else 0
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (최고 게시물 번호 조회): {e}")
+            return 0
+
+    def get_post_signals(self, gallery_id, numbers):
+        """글번호 -> (조회수, 추천수, 댓글수). 목록에서 본 값과 비교해 변경 여부를 판단한다."""
+        numbers = [int(number) for number in numbers]
+        if not numbers:
+            return {}
+        try:
+            placeholders = ', '.join('?' * len(numbers))
+            self.cursor.execute(f'''
+                SELECT number, views, votes, comment_count FROM post_signals
+                WHERE gallery_id = ? AND number IN ({placeholders})
+            ''', (gallery_id, *numbers))
+            return {row['number']: (row['views'], row['votes'], row['comment_count'])
+                    for row in self.cursor.fetchall()}
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (게시물 변경 신호 조회): {e}")
+            return {}
+
+    def save_post_signals(self, gallery_id, posts):
+        """목록에서 본 조회수/추천수/댓글수를 기록하고 갤러리의 최고 게시물 번호를 올린다."""
+        if not posts:
+            return
+        try:
+            with self.transaction():
+                self.cursor.executemany('''
+                    INSERT INTO post_signals (gallery_id, number, views, votes, comment_count)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(gallery_id, number) DO UPDATE SET
+                        views = excluded.views,
+                        votes = excluded.votes,
+                        comment_count = excluded.comment_count
+                ''', [(gallery_id, int(post['number']), post['views'], post['votes'],
+                       post.get('comment_count', 0)) for post in posts])
+                self.cursor.execute('''
+                    INSERT INTO gallery_state (gallery_id, high_water_mark, updated_at)
+                    VALUES (?, ?, datetime('now'))
+                    ON CONFLICT(gallery_id) DO UPDATE SET
+                        high_water_mark = MAX(high_water_mark, excluded.high_water_mark),
+                        updated_at = excluded.updated_at
+                ''', (gallery_id, max(int(post['number']) for post in posts)))
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (게시물 변경 신호 저장): {e}")
+
+    def update_post_counts(self, posts):
+        """본문을 다시 받지 않은 게시물의 조회수/추천수와 작성일을 목록 값으로 갱신한다.
+
+        작성일도 덮어쓰므로 예전에 'HH:MM'으로 저장된 게시물도 다시 보면 전체 작성 시각을 갖는다.
+        """
+        try:
+            with self.transaction():
+                self.cursor.executemany(
+                    "UPDATE posts SET views = ?, votes = ?, date = ? WHERE number = ? AND gallery_id IS ?",
+                    [(post['views'], post['votes'], post['date'], post['number'], post.get('gallery_id'))
+                     for post in posts])
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (게시물 조회수 갱신): {e}")
+
+    def sync_gallery_schedule(self, galleries):
+        """설정의 갤러리 목록 [{'gallery_id', 'url', 'weight', 'freshness_target'}]을 반영한다.
+
+        관찰한 도착률/요청 수/다음 폴링 시각은 유지하고, 목록에 없는 갤러리는 끈다.
+        """
+        try:
+            with self.transaction():
+                self.cursor.execute("UPDATE gallery_schedule SET enabled = 0")
+                self.cursor.executemany('''
+                    INSERT INTO gallery_schedule (gallery_id, url, weight, freshness_target, enabled)
+                    VALUES (:gallery_id, :url, :weight, :freshness_target, 1)
+                    ON CONFLICT(gallery_id) DO UPDATE SET
+                        url = excluded.url,
+                        weight = excluded.weight,
+                        freshness_target = excluded.freshness_target,
+                        enabled = 1
+                ''', galleries)
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (갤러리 스케줄 동기화): {e}")
+
+    def get_gallery_schedule(self, due_before=None):
+        """켜진 갤러리의 스케줄 행 목록. due_before를 주면 그때까지 폴링할 갤러리만."""
+        try:
+            if due_before is None:
+                self.cursor.execute("SELECT * FROM gallery_schedule WHERE enabled = 1 ORDER BY gallery_id")
+            else:
+                self.cursor.execute('''
+                    SELECT * FROM gallery_schedule WHERE enabled = 1 AND next_poll_at <= ?
+                    ORDER BY next_poll_at
+                ''', (due_before,))
+            return [dict(row) for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (갤러리 스케줄 조회): {e}")
+            return []
+
+    def set_gallery_next_poll(self, gallery_id, next_poll_at):
+        try:
+            self.cursor.execute("UPDATE gallery_schedule SET next_poll_at = ? WHERE gallery_id = ?",
+                                (next_poll_at, gallery_id))
+            self.commit()
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (갤러리 다음 폴링 시각 저장): {e}")
+
+    def record_gallery_poll(self, gallery_id, polled_at, high_water_mark, new_posts, arrival_rate,
+                            request_cost, poll_interval):
+        """폴링 결과와 갱신한 도착률/요청 수/간격을 저장하고 다음 폴링 시각을 정한다."""
+        try:
+            self.cursor.execute('''
+                UPDATE gallery_schedule SET
+                    last_polled_at = ?, last_high_water_mark = ?, last_new_posts = ?,
+                    arrival_rate = ?, request_cost = ?, poll_interval = ?, next_poll_at = ?
+                WHERE gallery_id = ?
+            ''', (polled_at, high_water_mark, new_posts, arrival_rate, request_cost, poll_interval,
+                  polled_at + poll_interval, gallery_id))
+            self.commit()
+        except sqlite3.Error as e:
+            logger.error(f"데이터베이스 오류 (갤러리 폴링 결과 저장): {e}")
+
     def get_total_comments(self):
         try:
-            self.cursor.execute("SELECT COUNT(*) FROM comments")
+            self.cursor.execute("SELECT row_count FROM row_counts WHERE table_name = 'comments'")
             return self.cursor.fetchone()[0]
         except sqlite3.Error as e:
             logger.error(f"데이터베이스 오류 (총 댓글 수 조회): {e}")
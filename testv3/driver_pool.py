@@ -0,0 +1,153 @@
+import atexit
+import queue
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from functools import lru_cache
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException, InvalidSessionIdException
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+from config import DRIVER_POOL_SIZE, DRIVER_MAX_PAGES, DRIVER_HEADLESS, DRIVER_CHECKOUT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=None)
+def get_driver_path():
+    # ChromeDriverManager().install()은 네트워크 조회를 하므로 프로세스당 한 번만 실행한다
+    path = ChromeDriverManager().install()
+    logger.info(f"Chrome driver 경로: {path}")
+    return path
+
+def create_driver(headless=DRIVER_HEADLESS):
+    logger.debug("Chrome driver 설정 시작...")
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument('--headless')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+
+    service = Service(get_driver_path())
+    driver = webdriver.Chrome(service=service, options=options)
+    logger.debug("Chrome driver 설정 완료.")
+    return driver
+
+class PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+class DriverPool:
+    """오래 유지되는 Chrome 인스턴스를 최대 size개까지 만들어 빌려주고 돌려받는다."""
+
+    def __init__(self, size=DRIVER_POOL_SIZE, max_pages=DRIVER_MAX_PAGES, headless=DRIVER_HEADLESS):
+        self.size = size
+        self.max_pages = max_pages
+        self.headless = headless
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def is_healthy(self, pooled):
+        try:
+            pooled.driver.execute_script('return 1;')
+            return True
+        except WebDriverException as e:
+            logger.warning(f"응답하지 않는 Chrome driver 폐기: {e}")
+            return False
+
+    def discard(self, pooled):
+        try:
+            pooled.driver.quit()
+        except WebDriverException as e:
+            logger.debug(f"Chrome driver 종료 중 오류: {e}")
+        with self.lock:
+            self.created -= 1
+
+    def checkout(self, timeout=DRIVER_CHECKOUT_TIMEOUT):
+        if self.closed:
+            raise RuntimeError("DriverPool이 이미 종료되었습니다.")
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                pooled = self.idle.get_nowait()
+            except queue.Empty:
+                with self.lock:
+                    can_create = self.created < self.size
+                    if can_create:
+                        self.created += 1
+                if can_create:
+                    try:
+                        return PooledDriver(create_driver(self.headless))
+                    except Exception:
+                        with self.lock:
+                            self.created -= 1
+                        raise
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"{timeout}초 안에 사용 가능한 Chrome driver가 없습니다.")
+                try:
+                    # 폐기로 빈 자리가 생길 수 있으므로 짧게 기다리며 다시 확인한다
+                    pooled = self.idle.get(timeout=min(remaining, 1))
+                except queue.Empty:
+                    continue
+
+            if self.is_healthy(pooled):
+                return pooled
+            self.discard(pooled)
+
+    def checkin(self, pooled, broken=False):
+        pooled.pages += 1
+        if broken or self.closed or pooled.pages >= self.max_pages:
+            if not broken and pooled.pages >= self.max_pages:
+                logger.debug(f"Chrome driver {pooled.pages}페이지 사용 후 재생성")
+            self.discard(pooled)
+            return
+        try:
+            # 다음 사용자를 위해 이전 페이지의 상태를 비운다
+            pooled.driver.delete_all_cookies()
+            pooled.driver.get('about:blank')
+        except WebDriverException:
+            self.discard(pooled)
+            return
+        self.idle.put(pooled)
+
+    @contextmanager
+    def driver(self):
+        pooled = self.checkout()
+        broken = False
+        try:
+            yield pooled.driver
+        except InvalidSessionIdException:
+            broken = True
+            raise
+        except WebDriverException:
+            # 페이지 로드 타임아웃, 없는 요소 같은 페이지 오류는 브라우저가 멀쩡하므로 응답하지 않을 때만 버린다
+            broken = not self.is_healthy(pooled)
+            raise
+        finally:
+            self.checkin(pooled, broken)
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                pooled = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(pooled)
+        logger.debug("DriverPool 종료")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_driver_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool()
+            atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,245 @@
+"""게시물 내보내기.
+
+Database.iter_posts로 게시물을 청크 단위로 읽고, CSV/JSONL 바이트 조각을 차례로 만들어
+스트리밍 응답에 그대로 넘긴다. 전체 결과를 메모리에 모으지 않으므로 아카이브 크기와
+상관없이 메모리 사용량이 일정하다.
+
+분석용으로는 갤러리/월별로 나눈 Parquet 데이터셋을 쓴다 (export_parquet, main.py --export-parquet).
+pyarrow가 필요하다 (uv sync --extra analytics).
+"""
+import io
+import os
+import csv
+import json
+import zlib
+import shutil
+import logging
+from datetime import datetime
+from config import EXPORT_CHUNK_SIZE, EXPORT_BUFFER_BYTES, PARQUET_ROW_GROUP_SIZE, PARQUET_COMPRESSION
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+POST_COLUMNS = ['id', 'number', 'title', 'author', 'date', 'views', 'votes',
+                'comment_count', 'image_count', 'content']
+
+def iter_csv(posts, include_comments=False, include_images=False):
+    columns = list(POST_COLUMNS)
+    if include_comments:
+        columns.append('comments')
+    if include_images:
+        columns.append('images')
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # 엑셀에서 한글이 깨지지 않도록 UTF-8 BOM을 붙인다
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    for post in posts:
+        # 댓글/이미지 목록은 CSV 한 칸에 JSON으로 넣는다
+        writer.writerow([json.dumps(post[column], ensure_ascii=False)
+                         if column in ('comments', 'images') else post.get(column)
+                         for column in columns])
+        if buffer.tell() >= EXPORT_BUFFER_BYTES:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+def iter_jsonl(posts, include_comments=False, include_images=False):
+    lines = []
+    size = 0
+    for post in posts:
+        line = json.dumps(post, ensure_ascii=False) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_BUFFER_BYTES:
+            yield ''.join(lines).encode('utf-8')
+            lines = []
+            size = 0
+    yield ''.join(lines).encode('utf-8')
+
+def gzip_stream(chunks, level=6):
+    """바이트 조각을 받는 대로 gzip으로 압축해 내보낸다."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip 헤더/트레일러
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_posts(db, fmt='csv', compress=False, include_comments=False, include_images=False,
+                 chunk_size=EXPORT_CHUNK_SIZE):
+    """내보내기 파일 내용을 바이트 조각으로 내보내는 제너레이터."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"지원하지 않는 내보내기 형식: {fmt}")
+    posts = db.iter_posts(chunk_size, include_comments, include_images)
+    encode = iter_csv if fmt == 'csv' else iter_jsonl
+    chunks = encode(posts, include_comments, include_images)
+    return gzip_stream(chunks) if compress else chunks
+
+def export_filename(fmt, compress=False):
+    return f"posts_export.{fmt}" + ('.gz' if compress else '')
+
+def export_mimetype(fmt, compress=False):
+    if compress:
+        return 'application/gzip'
+    return 'text/csv; charset=utf-8' if fmt == 'csv' else 'application/x-ndjson; charset=utf-8'
+
+# 크롤러는 목록 작성일 칸의 title 속성('YYYY-MM-DD HH:MM:SS')을 저장한다. 그 전에 저장된 행에는 칸에 보이는
+# 'YY.MM.DD'처럼 연도가 짧은 형식도 있고, 'HH:MM'(오늘), 'MM.DD'(올해)는 크롤링한 날짜를 알아야 하므로 월을 정하지 않는다.
+DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y.%m.%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d', '%Y.%m.%d', '%y.%m.%d')
+# 갤러리/월을 모르는 행의 파티션 값. pyarrow 등 Hive 파티션을 읽는 도구는 null로 읽는다.
+UNKNOWN_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+# 값의 종류가 적어 사전 인코딩으로 크게 줄어드는 열
+DICTIONARY_COLUMNS = ('author', 'author_id', 'author_ip')
+
+def parse_post_date(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+def parquet_schemas():
+    """게시물/댓글 파일 스키마. gallery_id, month는 파일이 아니라 파티션 경로에 들어간다."""
+    import pyarrow as pa
+
+    category = pa.dictionary(pa.int32(), pa.string())
+    posts = pa.schema([
+        ('id', pa.int64()),
+        ('number', pa.int64()),
+        ('title', pa.string()),
+        ('author', category),
+        ('author_id', category),
+        ('author_ip', category),
+        ('date', pa.string()),
+        ('posted_at', pa.timestamp('s')),
+        ('views', pa.int64()),
+        ('votes', pa.int64()),
+        ('comment_count', pa.int32()),
+        ('image_count', pa.int32()),
+        ('content', pa.string()),
+    ])
+    comments = pa.schema([
+        ('post_id', pa.int64()),
+        ('data_no', pa.string()),
+        ('author', category),
+        ('content', pa.string()),
+        ('date', pa.string()),
+    ])
+    return posts, comments
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class PartitionedParquetWriter:
+    """Hive 형식(gallery_id=.../month=.../part-0.parquet) 분할 데이터셋 쓰기.
+
+    파티션마다 행을 모았다가 row_group_size개가 되면 한 행 그룹으로 쓴다.
+    """
+
+    def __init__(self, root, schema, row_group_size=PARQUET_ROW_GROUP_SIZE, compression=PARQUET_COMPRESSION):
+        self.root = root
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.writers = {}
+        self.buffers = {}
+        self.rows = 0
+
+    def partition_path(self, gallery_id, month):
+        # 갤러리 id는 영문/숫자/밑줄이지만 경로 구분자는 막아 둔다
+        gallery = gallery_id.replace('/', '_').replace(os.sep, '_') if gallery_id else UNKNOWN_PARTITION
+        return os.path.join(self.root, f"gallery_id={gallery}", f"month={month}")
+
+    def write(self, gallery_id, month, row):
+        key = (gallery_id, month)
+        self.buffers.setdefault(key, []).append(row)
+        if len(self.buffers[key]) >= self.row_group_size:
+            self.flush(key)
+
+    def flush(self, key):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        rows = self.buffers.pop(key, None)
+        if not rows:
+            return
+        if key not in self.writers:
+            path = self.partition_path(*key)
+            os.makedirs(path, exist_ok=True)
+            self.writers[key] = pq.ParquetWriter(
+                os.path.join(path, 'part-0.parquet'), self.schema, compression=self.compression,
+                use_dictionary=[column for column in DICTIONARY_COLUMNS if column in self.schema.names])
+        self.writers[key].write_table(pa.Table.from_pylist(rows, schema=self.schema))
+        self.rows += len(rows)
+
+    def close_gallery(self, gallery_id):
+        """갤러리 하나를 다 쓰면 그 파티션 파일을 닫아 열린 파일 수를 갤러리의 월 수로 제한한다."""
+        for key in [key for key in set(self.buffers) | set(self.writers) if key[0] == gallery_id]:
+            self.flush(key)
+            writer = self.writers.pop(key, None)
+            if writer:
+                writer.close()
+
+    def close(self):
+        for gallery_id in {key[0] for key in set(self.buffers) | set(self.writers)}:
+            self.close_gallery(gallery_id)
+
+def export_parquet(db, output_folder, include_comments=True, chunk_size=EXPORT_CHUNK_SIZE):
+    """게시물(과 댓글)을 갤러리/월별로 나눈 Parquet 데이터셋으로 내보낸다.
+
+    월은 posts.date(크롤러가 저장한 전체 작성 시각)로 정한다. 월을 알 수 없는 예전 'HH:MM' 행은
+    UNKNOWN_PARTITION에 들어가고, 크롤러가 그 게시물을 다시 보면 작성일이 고쳐진다.
+
+    output_folder/posts, output_folder/comments 아래의 이전 내보내기는 지우고 새로 쓴다.
+    반환값은 (게시물 수, 댓글 수).
+    """
+    try:
+        posts_schema, comments_schema = parquet_schemas()
+    except ImportError:
+        raise RuntimeError("Parquet 내보내기에는 pyarrow가 필요합니다: uv sync --extra analytics")
+
+    datasets = {}
+    for name, schema in (('posts', posts_schema), ('comments', comments_schema)):
+        root = os.path.join(output_folder, name)
+        if os.path.isdir(root):
+            shutil.rmtree(root)
+        datasets[name] = PartitionedParquetWriter(root, schema)
+    posts_writer, comments_writer = datasets['posts'], datasets['comments']
+
+    try:
+        for gallery_id in db.get_gallery_ids():
+            for post in db.iter_posts(chunk_size, include_comments=include_comments, gallery_ids=[gallery_id]):
+                posted_at = parse_post_date(post['date'])
+                month = posted_at.strftime('%Y-%m') if posted_at else UNKNOWN_PARTITION
+                posts_writer.write(gallery_id, month, {
+                    'id': post['id'],
+                    'number': to_int(post['number']),
+                    'title': post['title'],
+                    'author': post['author'],
+                    'author_id': post['author_id'] or None,
+                    'author_ip': post['author_ip'] or None,
+                    'date': post['date'],
+                    'posted_at': posted_at,
+                    'views': post['views'],
+                    'votes': post['votes'],
+                    'comment_count': post['comment_count'],
+                    'image_count': post['image_count'],
+                    'content': post['content'],
+                })
+                # 댓글은 게시물과 같은 파티션에 넣어 게시물과 함께 걸러 읽을 수 있게 한다
+                for comment in post.get('comments', []):
+                    comments_writer.write(gallery_id, month, dict(comment, post_id=post['id']))
+            posts_writer.close_gallery(gallery_id)
+            comments_writer.close_gallery(gallery_id)
+            logger.info(f"갤러리 {gallery_id or '(알 수 없음)'} Parquet 내보내기 완료 (누적 게시물 {posts_writer.rows}개)")
+    finally:
+        posts_writer.close()
+        comments_writer.close()
+    logger.info(f"Parquet 내보내기 완료: 게시물 {posts_writer.rows}개, 댓글 {comments_writer.rows}개 -> {output_folder}")
+    return posts_writer.rows, comments_writer.rows
@@ -0,0 +1,17 @@
+"""갤러리 URL과 config.GALLERIES 설정을 다루는 함수.
+
+크롤러뿐 아니라 스키마 마이그레이션(웹 서버가 처음 데이터베이스를 열 때)과 스케줄러도 쓰므로
+config 외에는 아무것도 가져오지 않는다.
+"""
+from urllib.parse import urlparse, parse_qs
+from config import GALLERIES
+
+def get_gallery_id(gallery_url):
+    return parse_qs(urlparse(gallery_url).query).get('id', [''])[0]
+
+def get_min_posting_id(gallery_id):
+    """config.GALLERIES에 적은 갤러리별 최소 글번호. 없으면 0 (모두 크롤링)."""
+    for gallery in GALLERIES:
+        if get_gallery_id(gallery['url']) == gallery_id:
+            return gallery.get('min_posting_id', 0)
+    return 0
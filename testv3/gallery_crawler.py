@@ -1,34 +1,24 @@
-import requests
-from bs4 import BeautifulSoup
 import time
 import random
 import logging
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
+import re
+from urllib.parse import urljoin
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from config import HEADERS, DELAY, MAX_PAGES, MIN_POSTING_ID
+from config import DELAY, MAX_PAGES, INCREMENTAL_SIGNALS
 from database import get_db
-from image_manager import manage_image, download_image
-from comment_crawler import crawl_comments
+from image_downloader import ImageDownloader
+from post_document import PostDocument
+from http_cache import cached_get
+from parsers import parse_list
+from driver_pool import get_driver_pool
+from checkpoints import CrawlRun
+from galleries import get_gallery_id, get_min_posting_id
 
 
 logger = logging.getLogger(__name__)
 
-def setup_driver():
-    logger.debug("Chrome driver 설정 중...")
-    options = webdriver.ChromeOptions()
-    # options.add_argument('--headless')
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
-    logger.debug("Chrome driver 설정 완료.")
-    return driver
-   
 def is_document_loaded(driver):
     logger.info("Checking if {} page is loaded.".format(driver.current_url))
     page_state = driver.execute_script('return document.readyState;')
@@ -40,8 +30,7 @@ def wait_until_document_loaded(driver):
     )
 
 def crawl_comments(post_url, post_number):
-    driver = setup_driver()
-    try:
+    with get_driver_pool().driver() as driver:
         driver.get(post_url)
         wait_until_document_loaded(driver);
 
@@ -53,6 +42,7 @@ def crawl_comments(post_url, post_number):
             content = comment.find_element(By.CSS_SELECTOR, '.reply_txt')
             
             comment_data = {
+                'data_no': comment.get_attribute('data-no'),
                 'author': author.text,
                 'author_id': author.get_attribute('data-uid'),
                 'author_ip': author.get_attribute('data-ip'),
@@ -61,102 +51,94 @@ def crawl_comments(post_url, post_number):
             comments.append(comment_data)
 
         return comments
-    finally:
-        driver.quit()
 
 
-def crawl_post_content(post_url, post_number):
-    logger.debug(f"게시물 내용 크롤링 시작: {post_url}")
-    response = requests.get(post_url, headers=HEADERS)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    content = soup.select_one('div.writing_view_box')
+def crawl_post_content(doc, post_number):
+    logger.debug(f"게시물 내용 크롤링 시작: {doc.url}")
     
-    if content:
-        text_content = content.get_text(strip=True)
+    if doc.text is not None:
+        text_content, image_urls = doc.text, doc.image_urls
         logger.debug(f"게시물 {post_number} 텍스트 내용 추출 완료")
-        
-        image_elements = content.select('img.tx-content-image')
-        image_urls = [img['src'] for img in image_elements if 'src' in img.attrs]
-        
-        file_box = soup.select_one('div.appending_file_box')
-        if file_box:
-            for file_link in file_box.select('li a'):
-                file_url = file_link['href']
-                if file_url.lower().endswith(('.png', '.jpg', '.jpeg', '.gif','.webp')):
-                    image_urls.append(file_url)
-        
         logger.debug(f"게시물 {post_number}에서 발견된 이미지 수: {len(image_urls)}")
-        
-        image_paths = []
-        for index, image_url in enumerate(image_urls):
-            logger.debug(f"이미지 발견: URL: {image_url}")
-            image_path = download_image(image_url, post_number, index, HEADERS)
-            if image_path:
-                image_paths.append(image_path)
-        
-        return text_content, image_paths
+        # 이미지는 save_post가 다운로드 작업으로 등록하고 ImageDownloader가 따로 받는다
+        return text_content, image_urls
     else:
         logger.warning(f"게시물 {post_number} 내용을 찾을 수 없음")
         return "내용을 불러올 수 없습니다.", []
 
-def crawl_gallery_page(url, db):
-    logger.info(f"갤러리 페이지 크롤링 시작: {url}")
-    response = requests.get(url, headers=HEADERS)
-    soup = BeautifulSoup(response.text, 'html.parser')
+def crawl_post_comments(doc, post_number, progress=None):
+    """댓글 AJAX 엔드포인트로 댓글을 가져오고, 실패한 경우에만 Selenium을 사용한다."""
+    comments = doc.comments(progress=progress)
+    if comments is None:
+        logger.info(f"게시물 {post_number} 댓글 AJAX 조회 실패, Selenium으로 재시도합니다.")
+        comments = crawl_comments(doc.url, post_number)
+    return comments
+
+def parse_count(value):
+    try:
+        return int(value.replace(',', ''))
+    except ValueError:
+        return 0
+
+def parse_reply_count(value):
+    # 목록의 댓글 수는 "[12]" 또는 "[12/3]" 형태다
+    match = re.search(r'\d+', value or '')
+    return int(match.group()) if match else 0
+
+def build_post(row, page_url):
+    """parsers.parse_list가 반환한 목록 행을 게시물 dict로 변환한다. 건너뛸 행이면 None."""
+    post = {}
+    post['number'] = row['number']
     
-    posts = []
-    rows = soup.select('tr.ub-content')
-    total_posts = len(rows)
-    logger.info(f"총 {total_posts}개의 게시물 발견")
+    post['gallery_id'] = get_gallery_id(page_url)
+    try:
+        post_number = int(post['number'])
+        min_posting_id = get_min_posting_id(post['gallery_id'])
+        if post_number < min_posting_id:
+            logger.info(f"글번호 {post_number}는 {min_posting_id} 미만이므로 건너뜁니다.")
+            return None
+    except ValueError:
+        logger.warning(f"글번호를 숫자로 변환할 수 없습니다: {post['number']}")
+        return None
     
-    for index, row in enumerate(rows, 1):
-        post = {}
-        post['number'] = row.select_one('.gall_num').text.strip()
-        
-        try:
-            post_number = int(post['number'])
-            if post_number < MIN_POSTING_ID:
-                logger.info(f"글번호 {post_number}는 {MIN_POSTING_ID} 미만이므로 건너뜁니다.")
-                continue
-        except ValueError:
-            logger.warning(f"글번호를 숫자로 변환할 수 없습니다: {post['number']}")
-            continue
-        
-        title_element = row.select_one('.gall_tit a')
-        author_element = row.select_one('.gall_writer')
-        post['title'] = title_element.text.strip()
-        post['author'] = author_element.text.strip()
-        post['author_id'] = author_element.get('data-uid', '')
-        post['author_ip'] = author_element.get('data-ip', '')
-        post['date'] = row.select_one('.gall_date').text.strip()
-        post['views'] = int(row.select_one('.gall_count').text.strip())
-        post['votes'] = int(row.select_one('.gall_recommend').text.strip())
-        
-        # 기존 코드...
-        post_url = title_element.get('href')
-        if post_url and not post_url.startswith('javascript:'):
-            post_url = "https://gall.dcinside.com" + post_url
-            # 게시물 내용 크롤링
-            post['content'], post['image_paths'] = crawl_post_content(post_url, post['number'])
-            # 댓글 크롤링
-            comments = crawl_comments(post_url, post['number'])
-            post['comments'] = comments
-            logger.info(f"게시물 {post['number']}에서 {len(comments)}개의 댓글을 크롤링했습니다.")
+    post['title'] = row['title']
+    post['author'] = row['author']
+    post['author_id'] = row['author_id'] or ''
+    post['author_ip'] = row['author_ip'] or ''
+    # 목록 칸은 오늘 글이면 'HH:MM'만 보이므로 title 속성의 전체 작성 시각을 저장한다
+    post['date'] = row.get('posted_at') or row['date']
+    post['views'] = parse_count(row['views'])
+    post['votes'] = parse_count(row['votes'])
+    post['comment_count'] = parse_reply_count(row.get('comment_count'))
 
-        # 나머지 코드...
-        else:
-            logger.warning(f"게시물 {post['number']}의 URL을 찾을 수 없음")
-            post['content'] = "내용을 불러올 수 없습니다."
-            post['image_paths'] = []
-            post['comments'] = []
-        
-        existing_post = db.get_post_by_number(post['number'])
+    post_url = row['href']
+    if post_url and not post_url.startswith('javascript:'):
+        post['url'] = urljoin(page_url, post_url)
+    else:
+        post['url'] = None
+    return post
+
+def save_post(db, post):
+    """크롤링한 게시물, 댓글, 이미지를 한 트랜잭션으로 저장하고 게시물 id를 반환한다.
+
+    본문을 받지 못한 게시물(post['fetch_failed'])은 목록의 조회수/추천수만 갱신하고 None을 반환한다.
+    """
+    with db.transaction():
+        existing_post = db.get_post_by_number(post['number'], post.get('gallery_id'))
+
+        if post.get('fetch_failed'):
+            # 저장된 내용을 덮어쓰지 않고 변경 신호도 남기지 않아 다음 크롤링이 본문을 다시 받는다
+            if existing_post:
+                db.update_post_counts([post])
+            logger.warning(f"게시물 {post['number']} 본문을 받지 못해 내용을 저장하지 않습니다")
+            return None
         
         if existing_post:
-            # 기존 게시물 업데이트
+            # 기존 게시물 업데이트. 예전에 'HH:MM'으로 저장된 작성일도 전체 작성 시각으로 고친다
             if (existing_post['views'] != post['views'] or
                 existing_post['votes'] != post['votes'] or
-                len(db.get_comments(existing_post['id'])) != len(post['comments'])):
+                existing_post['comment_count'] != len(post['comments']) or
+                existing_post['date'] != post['date']):
                 db.update_post(existing_post['id'], post)
                 logger.info(f"게시물 {post['number']} 업데이트됨")
             else:
@@ -168,10 +150,87 @@ def crawl_gallery_page(url, db):
             logger.info(f"새 게시물 {post['number']} 삽입됨")
         
         # 댓글 삽입 또는 업데이트
-        for comment in post['comments']:
-            db.insert_comment(post_id, comment)
+        db.insert_comments_bulk(post_id, post['comments'])
+        db.enqueue_image_jobs(post_id, post['image_urls'])
+        if post.get('gallery_id'):
+            db.save_post_signals(post['gallery_id'], [post])
+    return post_id
+
+def select_changed_posts(db, posts):
+    """증분 모드: 목록 값(INCREMENTAL_SIGNALS)이 바뀌었거나 처음 보는 게시물만 반환한다.
+
+    나머지 게시물은 본문을 다시 받지 않고 조회수/추천수만 목록 값으로 갱신한다.
+    """
+    if not posts:
+        return []
+    gallery_id = posts[0]['gallery_id']
+    signals = db.get_post_signals(gallery_id, [post['number'] for post in posts])
+
+    changed = []
+    unchanged = []
+    for post in posts:
+        previous = signals.get(int(post['number']))
+        if previous is not None:
+            previous = dict(zip(('views', 'votes', 'comment_count'), previous))
+            if all(previous[signal] == post[signal] for signal in INCREMENTAL_SIGNALS):
+                unchanged.append(post)
+                continue
+        changed.append(post)
+
+    if unchanged:
+        with db.transaction():
+            db.update_post_counts(unchanged)
+            db.save_post_signals(gallery_id, unchanged)
+        logger.info(f"변경 없는 게시물 {len(unchanged)}개는 본문을 다시 받지 않습니다")
+    return changed
+
+def reached_high_water_mark(posts, high_water_mark):
+    """목록 페이지가 이전 크롤링에서 이미 본 번호까지 내려왔는지 확인한다."""
+    return bool(posts) and high_water_mark > 0 and min(int(post['number']) for post in posts) <= high_water_mark
+
+def fetch_gallery_page(url):
+    """목록 페이지의 게시물. 페이지를 받지 못하면 None."""
+    logger.info(f"갤러리 페이지 크롤링 시작: {url}")
+    response = cached_get(url)
+    if response.status_code != 200:
+        logger.error(f"갤러리 페이지 요청 실패 ({response.status_code}): {url}")
+        return None
+    rows = parse_list(response.text)
+    logger.info(f"총 {len(rows)}개의 게시물 발견")
+    posts = [build_post(row, url) for row in rows]
+    return [post for post in posts if post is not None]
+
+def crawl_posts(posts, db, downloader=None, run=None):
+    """run(checkpoints.CrawlRun)을 주면 저장한 게시물과 댓글 페이지를 실행의 체크포인트로 남긴다.
+
+    본문을 받지 못한 게시물은 post['fetch_failed']가 True이고 체크포인트를 남기지 않는다.
+    """
+    total_posts = len(posts)
+    for index, post in enumerate(posts, 1):
+        post_url = post['url']
+        post['fetch_failed'] = False
+        if post_url:
+            # 게시물 페이지는 한 번만 받아 본문, 이미지, 댓글 추출에 함께 사용한다
+            doc = PostDocument.fetch(post_url)
+            # 게시물 내용 크롤링
+            post['content'], post['image_urls'] = crawl_post_content(doc, post['number'])
+            post['fetch_failed'] = doc.text is None
+            # 댓글 크롤링
+            comments = crawl_post_comments(doc, post['number'], run.comments(post['number']) if run else None)
+            post['comments'] = comments
+            logger.info(f"게시물 {post['number']}에서 {len(comments)}개의 댓글을 크롤링했습니다.")
+        else:
+            logger.warning(f"게시물 {post['number']}의 URL을 찾을 수 없음")
+            post['content'] = "내용을 불러올 수 없습니다."
+            post['image_urls'] = []
+            post['comments'] = []
         
-        posts.append(post)
+        with db.transaction():
+            post_id = save_post(db, post)
+            if run and post_id and not post['fetch_failed']:
+                run.post_done(post['number'], post_id)
+        if downloader and post_id:
+            downloader.submit_pending(db, post_id)
         
         logger.info(f"진행 중: {index}/{total_posts} 게시물 처리 완료")
         
@@ -179,19 +238,54 @@ def crawl_gallery_page(url, db):
         time.sleep(delay)
     
     # 게시글을 최신순으로 정렬
-    posts.sort(key=lambda x: int(x['number']), reverse=True)
-    
-    return posts
+    return sorted(posts, key=lambda x: int(x['number']), reverse=True)
+
+def crawl_gallery_page(url, db, downloader=None):
+    return crawl_posts(fetch_gallery_page(url) or [], db, downloader)
 
-def crawl_gallery(gallery_url, output_folder):
+def crawl_gallery(gallery_url, output_folder, incremental=False):
+    """갤러리 목록을 MAX_PAGES 페이지까지 크롤링한다. 중단된 실행이 있으면 체크포인트에서 이어받는다."""
     db = get_db()
+    run = CrawlRun.start(db, get_gallery_id(gallery_url), gallery_url, 'sync', incremental, MAX_PAGES)
     total_processed = 0
-    for page in range(1, MAX_PAGES + 1):
-        url = f"{gallery_url}&page={page}"
-        posts = crawl_gallery_page(url, db)
-        total_processed += len(posts)
-        logger.info(f"{page}/{MAX_PAGES} 페이지 크롤링 완료")
-        # 진행도 업데이트
-        db.update_crawling_progress(page, MAX_PAGES, total_processed)
-    
-    logger.info(f"크롤링 완료. 총 {total_processed}개의 게시물 처리됨.")
\ No newline at end of file
+    downloader = ImageDownloader().start()
+    try:
+        for job in run.pending_image_jobs():
+            downloader.submit(job)
+        for page in range(1, MAX_PAGES + 1):
+            if run.listing_finished:
+                break
+            if run.is_page_done(page):
+                continue
+            url = f"{gallery_url}&page={page}"
+            listed_posts = fetch_gallery_page(url)
+            if listed_posts is None:
+                run.page_failed(page)
+                # 증분 크롤링은 이 페이지가 최고 글번호에 닿는지 알 수 없으므로 더 진행하지 않는다
+                if incremental:
+                    break
+                continue
+            posts = run.pending_posts(listed_posts)
+            posts = select_changed_posts(db, posts) if incremental else posts
+            posts = crawl_posts(posts, db, downloader, run)
+            total_processed += len(posts)
+            if any(post['fetch_failed'] for post in posts):
+                logger.warning(f"{page}/{MAX_PAGES} 페이지의 게시물을 모두 받지 못했습니다. 다음 크롤링이 이어받습니다.")
+                run.page_failed(page)
+                # 뒤 페이지에서 멈추면 이어받을 때 이 페이지로 돌아오지 않는다
+                if incremental:
+                    break
+                continue
+            logger.info(f"{page}/{MAX_PAGES} 페이지 크롤링 완료")
+            reached = incremental and reached_high_water_mark(listed_posts, run.high_water_mark)
+            run.page_done(page, final=reached)
+            if reached:
+                logger.info(f"이전 크롤링의 최고 글번호 {run.high_water_mark}에 도달하여 {page} 페이지에서 멈춥니다.")
+    finally:
+        # 남은 이미지 다운로드가 끝날 때까지 기다린다
+        downloader.close()
+    # 예외로 빠져나가거나 받지 못한 페이지가 있으면 실행을 남겨 두어 다음 크롤링이 이어받는다
+    run.finish()
+
+    logger.info(f"크롤링 완료. 총 {total_processed}개의 게시물 처리됨.")
+    return total_processed
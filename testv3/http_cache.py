@@ -0,0 +1,209 @@
+"""조건부 요청용 HTTP 응답 캐시.
+
+응답 본문을 URL별로 압축해 SQLite 파일에 ETag/Last-Modified와 함께 저장한다.
+같은 URL을 다시 요청할 때 If-None-Match/If-Modified-Since를 보내고, 서버가 304로
+답하면 저장된 본문을 돌려준다. 전체 크기가 HTTP_CACHE_MAX_BYTES를 넘으면 가장 오래
+사용하지 않은 항목부터 지운다.
+"""
+import re
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+import requests
+from http_client import get_session
+from config import HTTP_CACHE_PATH, HTTP_CACHE_MAX_BYTES, HTTP_CACHE_ENABLED, HEADERS, REQUEST_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+MAX_AGE = re.compile(r'max-age=(\d+)')
+CHARSET = re.compile(r'charset=([\w-]+)', re.IGNORECASE)
+
+class CacheEntry:
+    def __init__(self, url, etag, last_modified, content_type, body, expires_at):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_type = content_type
+        self.body = body
+        self.expires_at = expires_at
+
+    @property
+    def is_fresh(self):
+        return self.expires_at is not None and self.expires_at > time.time()
+
+    @property
+    def charset(self):
+        match = CHARSET.search(self.content_type or '')
+        return match.group(1) if match else None
+
+    @property
+    def text(self):
+        return self.body.decode(self.charset or 'utf-8', errors='replace')
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+class ResponseCache:
+    def __init__(self, path=HTTP_CACHE_PATH, max_bytes=HTTP_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # 크롤러 스레드와 asyncio 루프가 함께 쓰므로 연결 하나를 잠금으로 보호한다
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_type TEXT,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses(accessed_at)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, url):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, content_type, body, expires_at FROM responses WHERE url = ?",
+                (url,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self.conn.commit()
+        etag, last_modified, content_type, body, expires_at = row
+        try:
+            body = zlib.decompress(body)
+        except zlib.error as e:
+            logger.warning(f"캐시 항목을 읽을 수 없어 버립니다: {url}: {e}")
+            self.delete(url)
+            return None
+        return CacheEntry(url, etag, last_modified, content_type, body, expires_at)
+
+    def put(self, url, headers, body):
+        """캐시할 수 있는 응답(검증자나 max-age가 있고 no-store가 아닌 응답)만 저장한다."""
+        cache_control = headers.get('Cache-Control', '').lower()
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        match = MAX_AGE.search(cache_control)
+        expires_at = time.time() + int(match.group(1)) if match and 'no-cache' not in cache_control else None
+        if 'no-store' in cache_control or not (etag or last_modified or expires_at):
+            return False
+
+        compressed = zlib.compress(body, 6)
+        if len(compressed) > self.max_bytes:
+            return False
+        with self.lock:
+            previous = self.conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self.conn.execute('''
+                INSERT OR REPLACE INTO responses
+                (url, etag, last_modified, content_type, body, size, expires_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (url, etag, last_modified, headers.get('Content-Type'), compressed, len(compressed),
+                  expires_at, time.time()))
+            self.total_bytes += len(compressed) - (previous[0] if previous else 0)
+            self.evict()
+            self.conn.commit()
+        return True
+
+    def refresh(self, entry, headers):
+        """304 응답의 새 검증자/만료 시각을 반영한다."""
+        cache_control = headers.get('Cache-Control', '').lower()
+        match = MAX_AGE.search(cache_control)
+        expires_at = time.time() + int(match.group(1)) if match and 'no-cache' not in cache_control else None
+        with self.lock:
+            self.conn.execute('''
+                UPDATE responses SET etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified),
+                                     expires_at = ?, accessed_at = ?
+                WHERE url = ?
+            ''', (headers.get('ETag'), headers.get('Last-Modified'), expires_at, time.time(), entry.url))
+            self.conn.commit()
+
+    def delete(self, url):
+        with self.lock:
+            row = self.conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            if row:
+                self.conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+                self.total_bytes -= row[0]
+            self.conn.commit()
+
+    def evict(self):
+        # 잠금을 잡은 상태에서 호출한다
+        if self.total_bytes <= self.max_bytes:
+            return
+        evicted = 0
+        # 한 번에 여유분(10%)까지 지워 넣을 때마다 정리하지 않도록 한다
+        target = self.max_bytes * 0.9
+        for url, size in self.conn.execute(
+                "SELECT url, size FROM responses ORDER BY accessed_at").fetchall():
+            if self.total_bytes <= target:
+                break
+            self.conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self.total_bytes -= size
+            evicted += 1
+        logger.debug(f"HTTP 캐시 항목 {evicted}개 정리 (현재 {self.total_bytes} 바이트)")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """프로세스 공용 응답 캐시. 비활성화되어 있으면 None."""
+    global _cache
+    if not HTTP_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+def restore_response(response, entry):
+    # 304 응답을 캐시된 본문을 가진 200 응답으로 바꿔 호출하는 쪽이 구분하지 않아도 되게 한다
+    response.status_code = 200
+    response._content = entry.body
+    if entry.content_type:
+        response.headers['Content-Type'] = entry.content_type
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+def cached_get(url, session=None, headers=HEADERS, timeout=REQUEST_TIMEOUT, **kwargs):
+    """캐시를 거치는 GET. 반환된 응답의 from_cache가 True면 본문은 캐시에서 왔다."""
+    cache = get_cache()
+    entry = cache.get(url) if cache else None
+    if entry and entry.is_fresh:
+        # max-age 안이면 요청하지 않는다
+        response = restore_response(requests.Response(), entry)
+        response.url = url
+        response.from_cache = True
+        return response
+
+    request_headers = dict(headers or {})
+    if entry:
+        request_headers.update(entry.conditional_headers())
+    session = session or get_session()
+    response = session.get(url, headers=request_headers, timeout=timeout, **kwargs)
+    response.from_cache = False
+
+    if response.status_code == 304 and entry:
+        logger.debug(f"304 Not Modified, 캐시 사용: {url}")
+        cache.refresh(entry, response.headers)
+        response = restore_response(response, entry)
+        response.from_cache = True
+    elif response.status_code == 200 and cache:
+        cache.put(url, response.headers, response.content)
+    return response
@@ -0,0 +1,80 @@
+"""프로세스 공용 HTTP 세션.
+
+모든 동기 요청은 get_session()이 반환하는 requests.Session 하나를 공유한다. 호스트별
+연결 풀로 keep-alive 연결을 재사용하고, 429/5xx와 연결 오류는 지수 백오프로 재시도한다.
+비동기 엔진(aiohttp)은 create_async_session()과 retry_delay()로 같은 설정을 따른다.
+"""
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import (HEADERS, HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_RETRIES,
+                    HTTP_BACKOFF_FACTOR, HTTP_BACKOFF_MAX, HTTP_RETRY_STATUSES, REQUEST_TIMEOUT,
+                    CONCURRENCY_PER_HOST)
+
+logger = logging.getLogger(__name__)
+
+def create_retry():
+    return Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=HTTP_RETRIES,
+        status=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        backoff_max=HTTP_BACKOFF_MAX,
+        status_forcelist=HTTP_RETRY_STATUSES,
+        # 댓글 조회 POST는 데이터를 바꾸지 않으므로 재시도해도 안전하다
+        allowed_methods=frozenset({'GET', 'HEAD', 'POST'}),
+        respect_retry_after_header=True,
+        # 재시도가 모두 실패하면 예외 대신 마지막 응답을 돌려줘 호출하는 쪽이 상태 코드로 처리한다
+        raise_on_status=False,
+    )
+
+def create_session():
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    # pool_connections: 연결 풀을 유지할 호스트 수, pool_maxsize: 호스트당 keep-alive 연결 수
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                          max_retries=create_retry())
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+def close_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def retry_delay(attempt, retry_after=None):
+    """attempt번째(0부터) 재시도 전 대기 시간. Retry-After가 있으면 그 값을 따른다."""
+    if retry_after:
+        try:
+            return min(float(retry_after), HTTP_BACKOFF_MAX)
+        except ValueError:
+            pass
+    delay = min(HTTP_BACKOFF_FACTOR * (2 ** attempt), HTTP_BACKOFF_MAX)
+    # 여러 요청이 동시에 실패했을 때 한꺼번에 재시도하지 않도록 지터를 더한다
+    return delay * random.uniform(0.5, 1.5)
+
+def create_async_session(concurrency_per_host=CONCURRENCY_PER_HOST):
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(limit=HTTP_POOL_MAXSIZE * HTTP_POOL_CONNECTIONS,
+                                     limit_per_host=concurrency_per_host, keepalive_timeout=60,
+                                     ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    return aiohttp.ClientSession(headers=HEADERS, timeout=timeout, connector=connector)
@@ -0,0 +1,177 @@
+"""썸네일/WebP 파생 이미지.
+
+목록과 상세 페이지는 원본 대신 크기를 줄인 WebP 파생 이미지를 쓴다. 파생 이미지는 처음 요청될 때
+(또는 다운로드 워커가 미리) 만들어 DERIVATIVES_FOLDER에 저장하고, 전체 크기가 DERIVATIVE_CACHE_MAX_BYTES를
+넘으면 가장 오래 쓰지 않은 것부터 지운다. 내용 주소 경로의 원본은 바뀌지 않으므로 원본 SHA-256과
+변형 이름으로 만든 ETag는 강한 검증자로 쓸 수 있다.
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from PIL import Image, ImageOps, ImageSequence, UnidentifiedImageError
+from config import DERIVATIVES_FOLDER, DERIVATIVE_CACHE_MAX_BYTES, IMAGE_VARIANTS
+from image_manager import get_image_full_path
+
+logger = logging.getLogger(__name__)
+
+SHA256_NAME = re.compile(r'[0-9a-f]{64}')
+# 읽을 때마다 mtime을 바꾸지 않도록 이 간격보다 오래된 경우에만 사용 시각을 갱신한다
+TOUCH_INTERVAL = 3600
+
+def source_key(file_path, full_path):
+    """원본을 식별하는 키와 불변 여부. 내용 주소 경로면 SHA-256, 예전 평면 경로면 크기/수정 시각 해시."""
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    if SHA256_NAME.fullmatch(name):
+        return name, True
+    stat = os.stat(full_path)
+    digest = hashlib.sha1(f"{file_path}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8')).hexdigest()
+    return digest, False
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+
+def resize_frame(frame, size):
+    frame = frame.convert('RGBA' if has_alpha(frame) else 'RGB')
+    frame.thumbnail(size, Image.Resampling.LANCZOS)
+    return frame
+
+def render_derivative(source_path, destination, variant):
+    """원본을 variant 설정대로 줄여 WebP로 저장한다. 움직이는 GIF는 animated 변형에서만 프레임을 유지한다."""
+    options = IMAGE_VARIANTS[variant]
+    size = options['size']
+    with Image.open(source_path) as image:
+        if getattr(image, 'is_animated', False) and options.get('animated'):
+            frames, durations = [], []
+            for frame in ImageSequence.Iterator(image):
+                durations.append(frame.info.get('duration', 100))
+                frames.append(resize_frame(frame, size))
+            frames[0].save(destination, 'WEBP', save_all=True, append_images=frames[1:],
+                           duration=durations, loop=image.info.get('loop', 0), quality=options['quality'])
+            return
+        # JPEG는 필요한 크기에 가깝게 축소 디코딩한다
+        image.draft('RGB', size)
+        frame = resize_frame(ImageOps.exif_transpose(image), size)
+        frame.save(destination, 'WEBP', quality=options['quality'], method=4)
+
+class DerivativeCache:
+    """DERIVATIVES_FOLDER/<variant>/<키 앞 2자>/<키>.webp 파일 캐시. mtime을 사용 시각으로 쓴다."""
+
+    def __init__(self, folder=DERIVATIVES_FOLDER, max_bytes=DERIVATIVE_CACHE_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # 같은 파생 이미지를 여러 요청이 동시에 만들지 않도록 키별 잠금을 둔다
+        self.key_locks = {}
+        self.total_bytes = None
+
+    def get_path(self, key, variant):
+        return os.path.join(self.folder, variant, key[:2], f"{key}.webp")
+
+    def files(self):
+        for root, _, names in os.walk(self.folder):
+            for name in names:
+                if name.endswith('.webp'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def key_lock(self, path):
+        with self.lock:
+            if path not in self.key_locks:
+                self.key_locks[path] = threading.Lock()
+            return self.key_locks[path]
+
+    def touch(self, path):
+        try:
+            if os.path.getmtime(path) < time.time() - TOUCH_INTERVAL:
+                os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def get(self, source_path, key, variant):
+        """파생 이미지 경로. 없으면 만들고, 만들 수 없으면 None."""
+        path = self.get_path(key, variant)
+        if os.path.exists(path):
+            self.touch(path)
+            return path
+        lock = self.key_lock(path)
+        with lock:
+            if os.path.exists(path):
+                return path
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                render_derivative(source_path, temp_path, variant)
+                os.replace(temp_path, path)
+            except (OSError, UnidentifiedImageError, ValueError) as e:
+                logger.warning(f"파생 이미지를 만들 수 없음 ({variant}): {source_path}: {e}")
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                return None
+            finally:
+                with self.lock:
+                    self.key_locks.pop(path, None)
+            self.added(os.path.getsize(path))
+        return path
+
+    def added(self, size):
+        with self.lock:
+            if self.total_bytes is None:
+                # 처음 한 번만 폴더를 훑어 현재 크기를 구한다 (방금 만든 파일도 포함된다)
+                self.total_bytes = sum(size for _, size, _ in self.files())
+            else:
+                self.total_bytes += size
+            self.evict()
+
+    def evict(self):
+        # 잠금을 잡은 상태에서 호출한다
+        if self.total_bytes <= self.max_bytes:
+            return
+        evicted = 0
+        # 한 번에 여유분(10%)까지 지워 파일을 만들 때마다 폴더를 훑지 않도록 한다
+        target = self.max_bytes * 0.9
+        for path, size, _ in sorted(self.files(), key=lambda item: item[2]):
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+            evicted += 1
+        logger.debug(f"파생 이미지 {evicted}개 정리 (현재 {self.total_bytes} 바이트)")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_derivative_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DerivativeCache()
+        return _cache
+
+def resolve_image(file_path, variant=None):
+    """전송할 (경로, 강한 ETag, 불변 여부). 원본이 없으면 None.
+
+    variant가 주어져도 파생 이미지를 만들 수 없으면(손상된 파일 등) 원본을 돌려준다.
+    """
+    full_path = get_image_full_path(file_path)
+    if not os.path.isfile(full_path):
+        return None
+    key, immutable = source_key(file_path, full_path)
+    if variant:
+        path = get_derivative_cache().get(full_path, key, variant)
+        if path:
+            return path, f"{key}-{variant}", immutable
+    return full_path, key, immutable
+
+def create_thumbnail(file_path):
+    """다운로드 워커가 새 이미지의 썸네일을 미리 만든다."""
+    return resolve_image(file_path, 'thumb')
@@ -0,0 +1,187 @@
+"""게시물 크롤링과 분리된 이미지 다운로드 워커 풀.
+
+크롤러는 게시물을 저장할 때 이미지 URL을 image_jobs에 등록하고, 작업을 제한된 크기의 큐에
+넣는다. 워커 스레드는 작업을 임대한 뒤 호스트별 동시 다운로드 수를 지키며 이미지를 받고, 실패하면
+백오프 후 받은 부분부터 이어받는다. 임대는 데이터베이스에 남으므로 다른 프로세스의 워커도 같은 작업이나
+같은 URL을 동시에 받지 않는다. 큐에 넣지 못했거나 끝내지 못한 작업은 `main.py --images`로 나중에
+다시 받을 수 있다.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from config import (DB_PATH, IMAGE_WORKERS, IMAGE_QUEUE_SIZE, IMAGE_CONCURRENCY_PER_HOST, IMAGE_RETRIES,
+                    IMAGE_EAGER_THUMBNAILS, IMAGE_JOB_LEASE, IMAGE_CLAIM_POLL)
+from database import Database
+from image_manager import download_image, get_partial_path
+from http_client import retry_delay
+from image_index import register_image, backfill_image_hashes, remove_unreferenced_images
+from image_derivatives import create_thumbnail
+
+logger = logging.getLogger(__name__)
+
+ImageJob = namedtuple('ImageJob', ['id', 'post_id', 'url', 'position'])
+
+class ImageDownloader:
+    def __init__(self, workers=IMAGE_WORKERS, queue_size=IMAGE_QUEUE_SIZE,
+                 concurrency_per_host=IMAGE_CONCURRENCY_PER_HOST, retries=IMAGE_RETRIES, db_path=DB_PATH,
+                 lease=IMAGE_JOB_LEASE):
+        self.workers = workers
+        self.concurrency_per_host = concurrency_per_host
+        self.retries = retries
+        self.lease = lease
+        self.db_path = db_path
+        # 큐가 가득 차면 submit이 기다리므로 크롤러가 다운로드보다 너무 앞서 나가지 않는다
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.host_limits = {}
+        # URL -> (잠금, 기다리는 워커 수). 같은 URL은 부분 파일을 함께 쓰므로 한 워커만 받는다.
+        # 다른 프로세스와는 claim_image_job의 임대로 나눈다
+        self.url_locks = {}
+        self.lock = threading.Lock()
+        self.threads = []
+        self.downloaded = 0
+        self.failed = 0
+
+    def host_limit(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.host_limits:
+                self.host_limits[host] = threading.BoundedSemaphore(self.concurrency_per_host)
+            return self.host_limits[host]
+
+    @contextmanager
+    def url_lock(self, url):
+        """같은 URL(공용 이미지, 디시콘 등)을 여러 워커가 동시에 받아 한 부분 파일에 이어 쓰지 않게 한다."""
+        with self.lock:
+            lock, users = self.url_locks.get(url, (threading.Lock(), 0))
+            self.url_locks[url] = (lock, users + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self.lock:
+                lock, users = self.url_locks[url]
+                if users == 1:
+                    del self.url_locks[url]
+                else:
+                    self.url_locks[url] = (lock, users - 1)
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self.worker, name=f"image-downloader-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def submit(self, job):
+        self.queue.put(ImageJob(*job))
+
+    def submit_pending(self, db, post_id=None, include_failed=False):
+        jobs = db.get_pending_image_jobs(post_id, include_failed)
+        for job in jobs:
+            self.submit(job)
+        return len(jobs)
+
+    def worker(self):
+        # sqlite 연결은 스레드마다 따로 연다
+        db = Database(self.db_path)
+        try:
+            while True:
+                job = self.queue.get()
+                try:
+                    if job is None:
+                        return
+                    self.process(db, job)
+                except Exception as e:
+                    logger.error(f"이미지 작업 처리 중 오류 발생 ({job.url}): {e}")
+                finally:
+                    self.queue.task_done()
+        finally:
+            db.close()
+
+    def process(self, db, job):
+        # 먼저 받던 워커가 끝나면 아래에서 그 결과를 URL로 찾아 연결만 추가한다
+        with self.url_lock(job.url):
+            if not self.claim(db, job):
+                return
+            try:
+                self.download(db, job)
+            except Exception:
+                # 임대를 풀어 같은 URL을 기다리는 워커가 임대가 만료될 때까지 기다리지 않게 한다
+                db.fail_image_job(job.id, "처리 중 오류")
+                raise
+
+    def claim(self, db, job):
+        """작업을 임대한다. 다른 프로세스가 같은 URL을 받는 중이면 끝날 때까지 기다린다.
+
+        이미 끝났거나 다른 프로세스가 임대한 작업이면 False.
+        """
+        while (status := db.claim_image_job(job.id, self.lease)) == 'busy':
+            time.sleep(IMAGE_CLAIM_POLL)
+        if status != 'claimed':
+            logger.debug(f"이미지 작업 {job.id}은 다른 워커가 처리했거나 처리 중이므로 건너뜁니다")
+            return False
+        return True
+
+    def download(self, db, job):
+        # 다른 게시물에서 이미 받은 URL이면 연결만 추가한다
+        image = db.get_image_by_url(job.url)
+        for attempt in range(self.retries + 1):
+            if image:
+                break
+            if attempt:
+                time.sleep(retry_delay(attempt - 1))
+            with self.host_limit(job.url):
+                image = download_image(job.url)
+
+        if image:
+            if 'phash' not in image:
+                # 새로 받은 이미지만 지각 해시를 계산한다 (URL로 재사용한 레코드에는 이미 있다)
+                register_image(db, image)
+                if IMAGE_EAGER_THUMBNAILS:
+                    # 목록 페이지의 첫 요청이 썸네일 생성을 기다리지 않게 한다
+                    create_thumbnail(image['file_path'])
+            image['position'] = job.position
+            if db.finish_image_job(job.id, job.post_id, image):
+                with self.lock:
+                    self.downloaded += 1
+            else:
+                # 레코드를 넣지 못했으면 대기 상태로 되돌려 main.py --images가 다시 처리하게 한다
+                db.fail_image_job(job.id, "이미지 레코드 저장 실패", image['size'])
+                with self.lock:
+                    self.failed += 1
+        else:
+            partial_path = get_partial_path(job.url)
+            bytes_done = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+            db.fail_image_job(job.id, "다운로드 실패", bytes_done, final=True)
+            with self.lock:
+                self.failed += 1
+
+    def join(self):
+        """큐에 넣은 작업이 모두 끝날 때까지 기다린다."""
+        self.queue.join()
+
+    def close(self):
+        self.join()
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        logger.info(f"이미지 다운로드 완료: {self.downloaded}개 성공, {self.failed}개 실패")
+
+def backfill_images(db, include_failed=True):
+    """등록만 되고 받지 못한 이미지 작업을 모두 처리하고, 지각 해시가 없는 이미지의 해시를 채운다 (main.py --images)."""
+    downloader = ImageDownloader().start()
+    try:
+        total = downloader.submit_pending(db, include_failed=include_failed)
+        logger.info(f"이미지 작업 {total}개 처리 시작")
+    finally:
+        downloader.close()
+    backfill_image_hashes(db)
+    remove_unreferenced_images(db)
+    return downloader.downloaded, downloader.failed
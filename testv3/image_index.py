@@ -0,0 +1,231 @@
+"""지각 해시(perceptual hash)를 이용한 유사 이미지 색인.
+
+같은 짤이 다시 인코딩되거나 크기가 바뀌면 SHA-256은 달라지지만 pHash/dHash는 몇 비트만 달라진다.
+pHash를 다중 색인 해시(MultiIndexHash)에 넣어 두면 해밍 거리 기준 이웃 검색이 전체 이미지
+수에 비례하지 않는다.
+"""
+import os
+import math
+import time
+import logging
+import threading
+from collections import defaultdict
+from PIL import Image, UnidentifiedImageError
+from config import IMAGE_NEAR_DUPLICATE_THRESHOLD, IMAGE_LINK_NEAR_DUPLICATES, IMAGE_ORPHAN_GRACE
+from image_manager import get_image_full_path
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+# pHash: 32x32 이미지의 DCT 중 왼쪽 위 8x8 저주파 성분만 쓰므로 그 코사인 값만 미리 계산한다
+DCT_SIZE = 32
+DCT_KEEP = 8
+DCT_COS = [[math.cos((2 * x + 1) * u * math.pi / (2 * DCT_SIZE)) for x in range(DCT_SIZE)]
+           for u in range(DCT_KEEP)]
+
+def load_grayscale(file_path):
+    image = Image.open(file_path)
+    # JPEG는 축소된 크기로 바로 디코딩해 큰 이미지도 빠르게 처리한다 (GIF는 첫 프레임)
+    image.draft('L', (DCT_SIZE * 4, DCT_SIZE * 4))
+    return image.convert('L')
+
+def bits_to_int(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | bit
+    return value
+
+def difference_hash(image):
+    """dHash: 가로로 이웃한 픽셀의 밝기 증감 64비트."""
+    pixels = list(image.resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    return bits_to_int(int(pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+                       for row in range(8) for col in range(8))
+
+def perceptual_hash(image):
+    """pHash: DCT 저주파 8x8 성분이 중앙값보다 큰지 나타내는 64비트."""
+    pixels = list(image.resize((DCT_SIZE, DCT_SIZE), Image.Resampling.LANCZOS).getdata())
+    rows = [pixels[y * DCT_SIZE:(y + 1) * DCT_SIZE] for y in range(DCT_SIZE)]
+    # 분리 가능한 2차원 DCT: 행 방향 후 열 방향
+    row_dct = [[sum(p * c for p, c in zip(row, DCT_COS[u])) for u in range(DCT_KEEP)] for row in rows]
+    coefficients = [sum(DCT_COS[v][y] * row_dct[y][u] for y in range(DCT_SIZE))
+                    for v in range(DCT_KEEP) for u in range(DCT_KEEP)]
+    # 직류 성분(평균 밝기)은 중앙값 계산에서 뺀다
+    median = sorted(coefficients[1:])[(len(coefficients) - 1) // 2]
+    return bits_to_int(int(c > median) for c in coefficients)
+
+def compute_hashes(file_path):
+    """(phash, dhash). 이미지로 읽을 수 없으면 (None, None)."""
+    try:
+        image = load_grayscale(file_path)
+        return perceptual_hash(image), difference_hash(image)
+    except (OSError, UnidentifiedImageError, ValueError) as e:
+        logger.warning(f"지각 해시를 계산할 수 없음: {file_path}: {e}")
+        return None, None
+
+def to_signed(value):
+    # SQLite INTEGER는 부호 있는 64비트이므로 저장할 때 변환한다
+    if value is None:
+        return None
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+def to_unsigned(value):
+    if value is None:
+        return None
+    return value & ((1 << HASH_BITS) - 1)
+
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
+
+class MultiIndexHash:
+    """해밍 거리 검색용 다중 색인 해시.
+
+    64비트 해시를 parts개 조각으로 나눠 조각마다 해시 테이블에 넣는다. 두 해시의 거리가 parts - 1
+    이하이면 비둘기집 원리로 적어도 한 조각은 완전히 같으므로, 조각이 같은 후보만 비교하면 된다.
+    """
+
+    def __init__(self, max_distance=IMAGE_NEAR_DUPLICATE_THRESHOLD):
+        self.parts = max_distance + 1
+        self.slices = []
+        shift = HASH_BITS
+        for index in range(self.parts):
+            width = HASH_BITS // self.parts + (1 if index < HASH_BITS % self.parts else 0)
+            shift -= width
+            self.slices.append((shift, (1 << width) - 1))
+        self.tables = [defaultdict(list) for _ in self.slices]
+        self.entries = []
+
+    def chunks(self, hash_value):
+        return [(hash_value >> shift) & mask for shift, mask in self.slices]
+
+    def add(self, hash_value, item):
+        position = len(self.entries)
+        self.entries.append((hash_value, item))
+        for table, chunk in zip(self.tables, self.chunks(hash_value)):
+            table[chunk].append(position)
+
+    def search(self, hash_value, threshold):
+        """거리가 threshold 이하인 (거리, 값) 목록을 가까운 순으로 반환한다."""
+        if threshold < self.parts:
+            candidates = set()
+            for table, chunk in zip(self.tables, self.chunks(hash_value)):
+                candidates.update(table.get(chunk, ()))
+        else:
+            # 색인이 보장하는 거리보다 크면 전체를 비교한다
+            candidates = range(len(self.entries))
+        results = []
+        for position in candidates:
+            candidate, item = self.entries[position]
+            distance = hamming_distance(hash_value, candidate)
+            if distance <= threshold:
+                results.append((distance, item))
+        results.sort(key=lambda result: result[0])
+        return results
+
+    def __len__(self):
+        return len(self.entries)
+
+class NearDuplicateIndex:
+    """images 테이블의 pHash로 만든 프로세스 공용 색인. 값은 (file_path, dhash)."""
+
+    def __init__(self):
+        self.tree = MultiIndexHash()
+        self.lock = threading.Lock()
+        self.loaded = False
+
+    def load(self, db):
+        with self.lock:
+            if self.loaded:
+                return
+            for file_path, phash, dhash in db.get_image_hashes():
+                self.tree.add(to_unsigned(phash), (file_path, to_unsigned(dhash)))
+            self.loaded = True
+            logger.info(f"유사 이미지 색인 로드: {len(self.tree)}개")
+
+    def add(self, phash, dhash, file_path):
+        with self.lock:
+            if self.loaded:
+                self.tree.add(phash, (file_path, dhash))
+
+    def find(self, db, phash, dhash=None, threshold=IMAGE_NEAR_DUPLICATE_THRESHOLD):
+        """(거리, file_path) 목록을 가까운 순으로 반환한다. dhash를 주면 dHash 거리도 threshold 이하여야 한다."""
+        self.load(db)
+        with self.lock:
+            results = self.tree.search(phash, threshold)
+        return [(distance, file_path) for distance, (file_path, candidate_dhash) in results
+                if dhash is None or candidate_dhash is None or hamming_distance(dhash, candidate_dhash) <= threshold]
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_image_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NearDuplicateIndex()
+        return _index
+
+def register_image(db, image):
+    """새로 받은 이미지의 지각 해시를 계산해 레코드에 넣고 색인에 등록한다.
+
+    IMAGE_LINK_NEAR_DUPLICATES가 켜져 있고 유사 이미지가 이미 있으면, 레코드가 기존 파일을 가리키게
+    한다 (duplicate_of에도 기존 파일 경로를 남긴다). 방금 저장한 파일은 같은 내용을 받은 다른 워커가
+    아직 레코드를 넣기 전일 수 있으므로 여기서 지우지 않고 image_orphans에 남겨 remove_unreferenced_images가
+    유예 시간 뒤에 정리한다.
+    """
+    phash, dhash = compute_hashes(get_image_full_path(image['file_path']))
+    image['phash'], image['dhash'] = to_signed(phash), to_signed(dhash)
+    if phash is None:
+        return image
+
+    index = get_image_index()
+    matches = index.find(db, phash, dhash)
+    if any(file_path == image['file_path'] for _, file_path in matches):
+        # 내용이 완전히 같은 파일은 이미 색인에 있다
+        return image
+    if matches and IMAGE_LINK_NEAR_DUPLICATES:
+        distance, original = matches[0]
+        db.add_image_orphan(image['file_path'])
+        logger.info(f"유사 이미지 (거리 {distance}): {image['file_path']} -> {original}")
+        image['file_path'] = image['duplicate_of'] = original
+        return image
+
+    index.add(phash, dhash, image['file_path'])
+    return image
+
+def find_similar_images(db, image_id, threshold=IMAGE_NEAR_DUPLICATE_THRESHOLD):
+    """이미지와 비슷한 이미지(재업로드, 리사이즈 등)가 연결된 images 행 목록. 거리순."""
+    image = db.get_image(image_id)
+    if not image or image['phash'] is None:
+        return []
+    matches = get_image_index().find(db, to_unsigned(image['phash']), to_unsigned(image['dhash']), threshold)
+    distances = {file_path: distance for distance, file_path in matches}
+    similar = [dict(row, distance=distances[row['file_path']])
+               for row in db.get_images_by_file_paths(list(distances)) if row['id'] != image_id]
+    return sorted(similar, key=lambda row: row['distance'])
+
+def remove_unreferenced_images(db, grace=IMAGE_ORPHAN_GRACE):
+    """register_image가 남긴 파일 중 grace초가 지나도 어떤 images 행도 가리키지 않는 파일을 지운다."""
+    removed = 0
+    for file_path in db.get_image_orphans(time.time() - grace):
+        full_path = get_image_full_path(file_path)
+        if db.count_image_references(file_path) == 0 and os.path.exists(full_path):
+            os.remove(full_path)
+            removed += 1
+        db.delete_image_orphan(file_path)
+    logger.info(f"참조 없는 이미지 파일 {removed}개 삭제")
+    return removed
+
+def backfill_image_hashes(db):
+    """지각 해시가 없는 기존 이미지의 해시를 계산한다. 파일은 지우거나 연결하지 않는다."""
+    updated = 0
+    for file_path in db.get_unhashed_image_paths():
+        full_path = get_image_full_path(file_path)
+        if not os.path.exists(full_path):
+            continue
+        phash, dhash = compute_hashes(full_path)
+        if phash is not None:
+            db.update_image_hashes(file_path, to_signed(phash), to_signed(dhash))
+            get_image_index().add(phash, dhash, file_path)
+            updated += 1
+    logger.info(f"이미지 {updated}개의 지각 해시 계산 완료")
+    return updated
@@ -1,64 +1,141 @@
 import os
 import hashlib
 import logging
+import mimetypes
+import posixpath
 import requests
-from config import IMAGES_FOLDER, HEADERS
 from urllib.parse import urlparse
-from database import get_db
+from config import IMAGES_FOLDER, HEADERS, REQUEST_TIMEOUT, IMAGE_CHUNK_SIZE
+from http_client import get_session
 
 logger = logging.getLogger(__name__)
 
-def calculate_md5(file_path):
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp')
+# mimetypes는 image/jpeg에 .jpe 같은 드문 확장자를 고를 수 있어 자주 쓰는 것만 직접 정한다
+CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'image/bmp': '.bmp',
+}
 
-def manage_image(post_id, file_path):
-    try:
-        md5_hash = calculate_md5(file_path)
-        db = get_db()
-        
-        existing_image = db.cursor.execute("SELECT file_path FROM images WHERE md5_hash = ?", (md5_hash,)).fetchone()
-
-        if existing_image:
-            # 중복 이미지 발견, 심볼릭 링크 생성
-            if os.path.exists(file_path) and file_path != existing_image[0]:
-                os.remove(file_path)
-                os.symlink(existing_image[0], file_path)
-                logger.info(f"중복 이미지 발견. 심볼릭 링크 생성: {file_path} -> {existing_image[0]}")
+def get_image_extension(image_url, headers=None):
+    """Content-Type, Content-Disposition 파일 이름, URL 경로 순으로 확장자를 정한다."""
+    headers = headers or {}
+    content_type = (headers.get('Content-Type') or '').split(';')[0].strip().lower()
+    if content_type in CONTENT_TYPE_EXTENSIONS:
+        return CONTENT_TYPE_EXTENSIONS[content_type]
+
+    # DCInside 이미지 URL은 viewimage.php?id=...처럼 확장자가 없어 첨부 파일 이름을 본다
+    disposition = headers.get('Content-Disposition') or ''
+    for candidate in (disposition.rsplit('filename=', 1)[-1].strip('"\' ') if 'filename=' in disposition else '',
+                      urlparse(image_url).path):
+        ext = os.path.splitext(candidate)[1].lower()
+        if ext in IMAGE_EXTENSIONS:
+            return '.jpg' if ext == '.jpeg' else ext
+
+    if content_type.startswith('image/'):
+        return mimetypes.guess_extension(content_type) or '.jpg'
+    return '.jpg'  # 기본 확장자
+
+def get_image_path(sha256, ext):
+    """내용 주소 경로 (IMAGES_FOLDER 기준, ab/cd/<sha256>.<ext>). DB와 URL에 그대로 쓰도록 '/'로 구분한다."""
+    return posixpath.join(sha256[:2], sha256[2:4], f"{sha256}{ext}")
+
+def get_image_full_path(file_path):
+    return os.path.join(IMAGES_FOLDER, *file_path.split('/'))
+
+def get_partial_path(image_url, images_folder=None):
+    """이어받기용 부분 파일 경로. 같은 URL이면 실행이 달라도 같은 경로가 된다."""
+    name = hashlib.sha1(image_url.encode('utf-8')).hexdigest()
+    return os.path.join(images_folder or IMAGES_FOLDER, '.partial', f"{name}.part")
+
+class ImageWriter:
+    """받는 대로 청크를 해시하면서 부분 파일에 쓰고, 끝나면 내용 주소 경로로 옮긴다.
+
+    부분 파일이 이미 있으면 그 뒤에 이어 쓰며, 받아 둔 부분은 해시에 먼저 반영한다.
+    같은 내용의 이미지가 이미 있으면 부분 파일을 지우므로 중복 이미지는 저장소에 쓰이지 않는다.
+    """
+
+    def __init__(self, partial_path, images_folder=None):
+        self.images_folder = images_folder or IMAGES_FOLDER
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        # os.replace가 원자적이려면 부분 파일이 같은 파일 시스템(IMAGES_FOLDER 아래)에 있어야 한다
+        os.makedirs(os.path.dirname(partial_path), exist_ok=True)
+        self.file = open(partial_path, 'a+b')
+        self.file.seek(0)
+        for chunk in iter(lambda: self.file.read(IMAGE_CHUNK_SIZE), b''):
+            self.sha256.update(chunk)
+            self.size += len(chunk)
+
+    def write(self, chunk):
+        self.sha256.update(chunk)
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def restart(self):
+        """서버가 Range를 무시하고 처음부터 보낼 때 받은 부분을 버린다."""
+        self.file.seek(0)
+        self.file.truncate()
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def close(self):
+        # 이어받을 수 있도록 받은 부분이 있으면 부분 파일을 남긴다
+        self.file.close()
+        if self.size == 0:
+            os.remove(self.file.name)
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.file.name):
+            os.remove(self.file.name)
+
+    def commit(self, image_url, ext):
+        """이미지 레코드 {'url', 'file_path', 'sha256', 'size'}를 반환한다."""
+        self.file.close()
+        sha256 = self.sha256.hexdigest()
+        file_path = get_image_path(sha256, ext)
+        destination = os.path.join(self.images_folder, *file_path.split('/'))
+        if os.path.exists(destination):
+            os.remove(self.file.name)
+            logger.debug(f"이미 저장된 이미지: {file_path}")
         else:
-            # 새로운 이미지, 데이터베이스에 저장
-            db.insert_image(post_id, file_path, md5_hash)
-            logger.info(f"새로운 이미지 저장: {file_path}")
-        
-        return file_path
-
-    except Exception as e:
-        logger.error(f"이미지 관리 중 오류 발생: {e}")
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        return None
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(self.file.name, destination)
+        return {'url': image_url, 'file_path': file_path, 'sha256': sha256, 'size': self.size}
+
+def download_image(image_url, session=None):
+    """이미지를 스트리밍으로 받아 저장하고 이미지 레코드를 반환한다. 실패하면 None.
 
-def download_image(image_url, post_number, file_index, headers):
-    # 파일 이름 및 저장할 경로 정하기
-    filename, ext = os.path.splitext(image_url)
-    if not ext:
-        ext = '.jpg'  # 기본 확장자 설정
-    
-    # 다운받을 이름맟 파일
-    created_file_name = f"{post_number}_image_{file_index}{ext}"
-    created_file_path = os.path.join(IMAGES_FOLDER, created_file_name);
-    if os.path.exists(created_file_path):
-        return created_file_path;
-    
-
-    response = requests.get(image_url,headers = HEADERS);
-    logger.info(f"content: {response.content}");
-
-    if response.status_code == 200:
-        with open(created_file_path, 'wb') as f:
-            f.write(response.content)
-        return created_file_name  # 파일 이름만 반환
-    return None
\ No newline at end of file
+    실패하면 받은 부분을 남겨 두고, 다음 호출에서 Range 요청으로 이어받는다.
+    """
+    session = session or get_session()
+    writer = ImageWriter(get_partial_path(image_url))
+    headers = dict(HEADERS)
+    if writer.size:
+        headers['Range'] = f"bytes={writer.size}-"
+    try:
+        with session.get(image_url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True) as response:
+            if response.status_code == 206:
+                logger.info(f"이미지 이어받기 ({writer.size} 바이트부터): {image_url}")
+            elif response.status_code == 200:
+                if writer.size:
+                    writer.restart()
+            else:
+                if response.status_code == 416:
+                    # 받은 부분이 서버의 파일과 맞지 않으므로 다음 시도는 처음부터 받는다
+                    writer.discard()
+                else:
+                    writer.close()
+                logger.warning(f"이미지 다운로드 실패 ({response.status_code}): {image_url}")
+                return None
+            for chunk in response.iter_content(IMAGE_CHUNK_SIZE):
+                writer.write(chunk)
+            return writer.commit(image_url, get_image_extension(image_url, response.headers))
+    except requests.RequestException as e:
+        writer.close()
+        logger.error(f"이미지 다운로드 실패: {image_url}: {e}")
+        return None
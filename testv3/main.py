@@ -1,10 +1,17 @@
 import argparse
 import logging
 from gallery_crawler import crawl_gallery
+from async_crawler import crawl_gallery_async
 from comment_crawler import crawl_comments
-from config import GALLERY_URL, OUTPUT_FOLDER
+from config import GALLERY_URL, OUTPUT_FOLDER, PARQUET_EXPORT_FOLDER, WORKER_PROCESSES
 from database import get_db  # db 대신 get_db 함수를 import
+from http_client import close_session
 from compression import compress_old_data
+from image_downloader import backfill_images
+from search import rebuild_search_index
+from export import export_parquet
+from worker import run_workers
+from scheduler import run_scheduler
 from web_interface import app as web_app
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,39 +20,85 @@ logger = logging.getLogger(__name__)
 def main():
     parser = argparse.ArgumentParser(description='DC Inside Gallery Crawler')
     parser.add_argument('--gallery', action='store_true', help='Crawl gallery posts')
+    parser.add_argument('--engine', choices=['sync', 'async'], default='sync',
+                        help='Gallery crawling engine (default: sync)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Stop at the last crawled post and only re-fetch posts whose list row changed')
     parser.add_argument('--comments', action='store_true', help='Crawl comments')
     parser.add_argument('--post-url', type=str, help='URL of the post to crawl comments from')
+    parser.add_argument('--images', action='store_true',
+                        help='Download images that were queued but not fetched yet (backfill)')
     parser.add_argument('--compress', action='store_true', help='Compress old data')
+    parser.add_argument('--rebuild-search', action='store_true',
+                        help='Rebuild the full-text search index (after changing SEARCH_TOKENIZER)')
+    parser.add_argument('--export-parquet', nargs='?', const=PARQUET_EXPORT_FOLDER, metavar='DIR',
+                        help=f'Export posts/comments as Parquet partitioned by gallery and month '
+                             f'(default: {PARQUET_EXPORT_FOLDER})')
+    parser.add_argument('--worker', action='store_true',
+                        help='Run queued crawl jobs (gallery/comments/images) registered from the admin panel')
+    parser.add_argument('-j', '--jobs', type=int, default=WORKER_PROCESSES,
+                        help=f'Number of worker processes for --worker (default: {WORKER_PROCESSES})')
+    parser.add_argument('--scheduler', action='store_true',
+                        help='Queue incremental crawls of config.GALLERIES within a shared request budget '
+                             '(run --worker to execute them)')
     parser.add_argument('--web', action='store_true', help='Start web interface')
     args = parser.parse_args()
 
     if args.gallery:
-        logger.info("Starting gallery crawling...")
-        crawl_gallery(GALLERY_URL, OUTPUT_FOLDER)
+        logger.info(f"Starting gallery crawling ({args.engine} engine)...")
+        if args.engine == 'async':
+            crawl_gallery_async(GALLERY_URL, OUTPUT_FOLDER, incremental=args.incremental)
+        else:
+            crawl_gallery(GALLERY_URL, OUTPUT_FOLDER, incremental=args.incremental)
     
     if args.comments:
         if args.post_url:
             logger.info(f"Starting comment crawling for post: {args.post_url}")
-            crawl_comments(args.post_url, OUTPUT_FOLDER)
+            crawl_comments(args.post_url)
         else:
             logger.error("Post URL is required for comment crawling. Use --post-url")
 
+    if args.images:
+        logger.info("Starting image backfill...")
+        backfill_images(get_db())
+
     if args.compress:
         logger.info("Starting data compression...")
         compress_old_data()
 
+    if args.rebuild_search:
+        logger.info("Rebuilding search index...")
+        rebuild_search_index(get_db())
+
+    if args.export_parquet:
+        logger.info(f"Exporting Parquet dataset to {args.export_parquet}...")
+        export_parquet(get_db(), args.export_parquet)
+
+    if args.worker:
+        logger.info(f"Starting {args.jobs} worker process(es)...")
+        run_workers(args.jobs)
+
+    if args.scheduler:
+        logger.info("Starting gallery scheduler...")
+        run_scheduler()
+
     if args.web:
         logger.info("Starting web interface...")
         web_app.run(host='0.0.0.0', port=5000, debug=True)
 
-    if not (args.gallery or args.comments or args.compress or args.web):
-        logger.warning("No action specified. Use --gallery, --comments, --compress, or --web")
+    if not (args.gallery or args.comments or args.images or args.compress or args.rebuild_search
+            or args.export_parquet or args.worker or args.scheduler or args.web):
+        logger.info("No action specified, starting web interface. Use --gallery, --comments, --images, "
+                    "--compress, --rebuild-search, --export-parquet, --worker, --scheduler, or --web")
+        web_app.run(host='0.0.0.0', port=5000, debug=True)
 
     # 프로그램 종료 시 데이터베이스 연결 닫기
     db = get_db()
     db.close()
+    close_session()
 
 
 
 if __name__ == "__main__":
-    web_app.run(debug=True, host='0.0.0.0', port=5000)
+    main()
+
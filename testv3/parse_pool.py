@@ -0,0 +1,51 @@
+"""비동기 엔진의 파싱 단계를 이벤트 루프 밖에서 실행하는 파서 풀.
+
+HTML/댓글 JSON 파싱은 GIL을 잡는 순수 파이썬 CPU 작업이라 이벤트 루프에서 하면 그동안 요청을
+보내지도 받지도 못한다. 받은 원본 바이트를 ProcessPoolExecutor의 자식 프로세스로 보내 파싱하고,
+크롤러에 필요한 작은 레코드만 돌려받는다. GIL 없는 빌드(3.13t 이상)에서는 스레드 풀을 쓴다.
+"""
+import sys
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from config import PARSE_WORKERS
+from parsers import get_parser, parse_list
+from comment_crawler import parse_comment_response
+from post_document import PostDocument
+
+logger = logging.getLogger(__name__)
+
+def decode(body, charset=None):
+    return body.decode(charset or 'utf-8', errors='replace')
+
+def parse_list_page(body, charset=None):
+    """목록 페이지 바이트 -> 목록 행 dict 리스트."""
+    return parse_list(decode(body, charset))
+
+def parse_view_page(body, charset=None):
+    """본문 페이지 바이트 -> {'text', 'image_urls', 'comment_params'}."""
+    doc = PostDocument(None, decode(body, charset))
+    return {'text': doc.text, 'image_urls': doc.image_urls, 'comment_params': doc.comment_params}
+
+def parse_comment_page(body):
+    """댓글 AJAX 응답 바이트 -> (댓글 목록, 전체 댓글 수)."""
+    return parse_comment_response(json.loads(body))
+
+def gil_enabled():
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled() if is_gil_enabled else True
+
+def warm_up():
+    # 첫 페이지가 파서 생성(XPath 컴파일 등)을 기다리지 않도록 자식 프로세스마다 미리 만든다
+    get_parser()
+
+def create_parse_executor(workers=PARSE_WORKERS):
+    """파서 풀을 만든다. workers가 0이면 None (이벤트 루프에서 직접 파싱)."""
+    if not workers:
+        return None
+    if not gil_enabled():
+        return ThreadPoolExecutor(workers, thread_name_prefix='parser', initializer=warm_up)
+    # fork는 부모의 sqlite 연결/스레드를 복사하므로 spawn으로 새 인터프리터를 띄운다
+    logger.info(f"파서 프로세스 {workers}개 시작")
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'), initializer=warm_up)
@@ -0,0 +1,221 @@
+"""목록/본문 페이지 파서 백엔드.
+
+각 백엔드는 같은 형태의 결과를 만든다.
+  parse_list(html) -> 목록 행 dict 리스트 (모든 값은 문자열, href/데이터 속성은 없으면 None).
+                      posted_at은 작성일 칸의 title 속성('YYYY-MM-DD HH:MM:SS')으로, 칸에는 오늘 글이면
+                      'HH:MM'만 보인다.
+  parse_view(html) -> {'text', 'content_images', 'attachment_urls', 'inputs'}
+"""
+import logging
+from bs4 import BeautifulSoup
+import soupsieve
+from config import PARSER_BACKEND
+
+logger = logging.getLogger(__name__)
+
+class Bs4Parser:
+    name = 'bs4'
+
+    ROWS = soupsieve.compile('tr.ub-content')
+    NUMBER = soupsieve.compile('.gall_num')
+    TITLE = soupsieve.compile('.gall_tit a')
+    WRITER = soupsieve.compile('.gall_writer')
+    DATE = soupsieve.compile('.gall_date')
+    VIEWS = soupsieve.compile('.gall_count')
+    VOTES = soupsieve.compile('.gall_recommend')
+    REPLY_COUNT = soupsieve.compile('.gall_tit .reply_num')
+    CONTENT = soupsieve.compile('div.writing_view_box')
+    CONTENT_IMAGES = soupsieve.compile('img.tx-content-image')
+    ATTACHMENTS = soupsieve.compile('div.appending_file_box li a')
+    HIDDEN_INPUTS = soupsieve.compile('input[type=hidden][id]')
+
+    def __init__(self, features='html.parser'):
+        self.features = features
+
+    @staticmethod
+    def text(element):
+        return element.text.strip() if element else ''
+
+    def parse_list(self, html):
+        soup = BeautifulSoup(html, self.features)
+        rows = []
+        for row in self.ROWS.select(soup):
+            title = self.TITLE.select_one(row)
+            writer = self.WRITER.select_one(row)
+            date = self.DATE.select_one(row)
+            rows.append({
+                'number': self.text(self.NUMBER.select_one(row)),
+                'title': self.text(title),
+                'href': title.get('href') if title else None,
+                'author': self.text(writer),
+                'author_id': writer.get('data-uid') if writer else None,
+                'author_ip': writer.get('data-ip') if writer else None,
+                'date': self.text(date),
+                'posted_at': date.get('title') if date else None,
+                'views': self.text(self.VIEWS.select_one(row)),
+                'votes': self.text(self.VOTES.select_one(row)),
+                'comment_count': self.text(self.REPLY_COUNT.select_one(row)),
+            })
+        return rows
+
+    def parse_view(self, html):
+        soup = BeautifulSoup(html, self.features)
+        content = self.CONTENT.select_one(soup)
+        inputs = {}
+        for element in self.HIDDEN_INPUTS.select(soup):
+            inputs.setdefault(element['id'], element.get('value'))
+        return {
+            'text': content.get_text(strip=True) if content else None,
+            'content_images': [img['src'] for img in self.CONTENT_IMAGES.select(content) if 'src' in img.attrs] if content else [],
+            'attachment_urls': [link['href'] for link in self.ATTACHMENTS.select(soup) if link.get('href')],
+            'inputs': inputs,
+        }
+
+class LxmlParser:
+    name = 'lxml'
+
+    def __init__(self):
+        from lxml import etree, html as lxml_html
+        self.fromstring = lxml_html.fromstring
+
+        def has_class(name):
+            return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+        # XPath는 생성자에서 한 번만 컴파일한다
+        self.rows = etree.XPath(f"//tr[{has_class('ub-content')}]")
+        self.number = etree.XPath(f".//*[{has_class('gall_num')}]")
+        self.title = etree.XPath(f".//*[{has_class('gall_tit')}]//a")
+        self.writer = etree.XPath(f".//*[{has_class('gall_writer')}]")
+        self.date = etree.XPath(f".//*[{has_class('gall_date')}]")
+        self.views = etree.XPath(f".//*[{has_class('gall_count')}]")
+        self.votes = etree.XPath(f".//*[{has_class('gall_recommend')}]")
+        self.reply_count = etree.XPath(f".//*[{has_class('gall_tit')}]//*[{has_class('reply_num')}]")
+        self.content = etree.XPath(f"//div[{has_class('writing_view_box')}]")
+        self.content_images = etree.XPath(f".//img[{has_class('tx-content-image')}][@src]/@src")
+        self.attachments = etree.XPath(f"//div[{has_class('appending_file_box')}]//li//a[@href]/@href")
+        self.hidden_inputs = etree.XPath("//input[@type='hidden'][@id]")
+        self.content_strings = etree.XPath(".//text()[not(parent::script) and not(parent::style)]")
+
+    @staticmethod
+    def first(xpath, node):
+        found = xpath(node)
+        return found[0] if found else None
+
+    @staticmethod
+    def text(element):
+        return element.text_content().strip() if element is not None else ''
+
+    def parse_list(self, html):
+        tree = self.fromstring(html)
+        rows = []
+        for row in self.rows(tree):
+            title = self.first(self.title, row)
+            writer = self.first(self.writer, row)
+            date = self.first(self.date, row)
+            rows.append({
+                'number': self.text(self.first(self.number, row)),
+                'title': self.text(title),
+                'href': title.get('href') if title is not None else None,
+                'author': self.text(writer),
+                'author_id': writer.get('data-uid') if writer is not None else None,
+                'author_ip': writer.get('data-ip') if writer is not None else None,
+                'date': self.text(date),
+                'posted_at': date.get('title') if date is not None else None,
+                'views': self.text(self.first(self.views, row)),
+                'votes': self.text(self.first(self.votes, row)),
+                'comment_count': self.text(self.first(self.reply_count, row)),
+            })
+        return rows
+
+    def parse_view(self, html):
+        tree = self.fromstring(html)
+        content = self.first(self.content, tree)
+        inputs = {}
+        for element in self.hidden_inputs(tree):
+            inputs.setdefault(element.get('id'), element.get('value'))
+        text = None
+        if content is not None:
+            text = ''.join(s.strip() for s in self.content_strings(content))
+        return {
+            'text': text,
+            'content_images': [str(src) for src in self.content_images(content)] if content is not None else [],
+            'attachment_urls': [str(href) for href in self.attachments(tree)],
+            'inputs': inputs,
+        }
+
+class SelectolaxParser:
+    name = 'selectolax'
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self.HTMLParser = LexborHTMLParser
+
+    @staticmethod
+    def text(node):
+        return node.text().strip() if node else ''
+
+    def parse_list(self, html):
+        tree = self.HTMLParser(html)
+        rows = []
+        for row in tree.css('tr.ub-content'):
+            title = row.css_first('.gall_tit a')
+            writer = row.css_first('.gall_writer')
+            date = row.css_first('.gall_date')
+            rows.append({
+                'number': self.text(row.css_first('.gall_num')),
+                'title': self.text(title),
+                'href': title.attributes.get('href') if title else None,
+                'author': self.text(writer),
+                'author_id': writer.attributes.get('data-uid') if writer else None,
+                'author_ip': writer.attributes.get('data-ip') if writer else None,
+                'date': self.text(date),
+                'posted_at': date.attributes.get('title') if date else None,
+                'views': self.text(row.css_first('.gall_count')),
+                'votes': self.text(row.css_first('.gall_recommend')),
+                'comment_count': self.text(row.css_first('.gall_tit .reply_num')),
+            })
+        return rows
+
+    def parse_view(self, html):
+        tree = self.HTMLParser(html)
+        content = tree.css_first('div.writing_view_box')
+        inputs = {}
+        for element in tree.css('input[type=hidden][id]'):
+            inputs.setdefault(element.attributes['id'], element.attributes.get('value'))
+        text = None
+        if content:
+            content.strip_tags(['script', 'style'])
+            text = content.text(separator='', strip=True)
+        return {
+            'text': text,
+            'content_images': [img.attributes['src'] for img in content.css('img.tx-content-image')
+                               if img.attributes.get('src') is not None] if content else [],
+            'attachment_urls': [link.attributes['href'] for link in tree.css('div.appending_file_box li a')
+                                if link.attributes.get('href')],
+            'inputs': inputs,
+        }
+
+BACKENDS = {
+    'bs4': Bs4Parser,
+    'lxml': LxmlParser,
+    'selectolax': SelectolaxParser,
+}
+
+_parsers = {}
+
+def get_parser(name=None):
+    """이름에 해당하는 파서를 반환한다. 라이브러리가 없으면 bs4로 대체한다."""
+    name = name or PARSER_BACKEND
+    if name not in _parsers:
+        try:
+            _parsers[name] = BACKENDS[name]()
+        except ImportError as e:
+            logger.warning(f"{name} 파서를 사용할 수 없어 bs4로 대체합니다: {e}")
+            _parsers[name] = get_parser('bs4')
+    return _parsers[name]
+
+def parse_list(html, backend=None):
+    return get_parser(backend).parse_list(html)
+
+def parse_view(html, backend=None):
+    return get_parser(backend).parse_view(html)
@@ -0,0 +1,54 @@
+import logging
+from functools import cached_property
+from http_cache import cached_get
+from comment_crawler import extract_comment_params, fetch_comments
+from parsers import parse_view
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+class PostDocument:
+    """게시물 페이지를 한 번만 받아 처음 필요할 때 한 번만 파싱한다."""
+
+    def __init__(self, url, html):
+        self.url = url
+        self.html = html
+
+    @classmethod
+    def fetch(cls, url, session=None):
+        logger.debug(f"게시물 페이지 요청: {url}")
+        response = cached_get(url, session)
+        return cls(url, response.text)
+
+    @cached_property
+    def view(self):
+        return parse_view(self.html)
+
+    @cached_property
+    def text(self):
+        return self.view['text']
+
+    @cached_property
+    def attachment_urls(self):
+        return self.view['attachment_urls']
+
+    @cached_property
+    def image_urls(self):
+        """본문 이미지와 이미지 첨부파일의 URL."""
+        if self.text is None:
+            return []
+        image_urls = list(self.view['content_images'])
+        image_urls.extend(url for url in self.attachment_urls if url.lower().endswith(IMAGE_EXTENSIONS))
+        return image_urls
+
+    @cached_property
+    def comment_params(self):
+        return extract_comment_params(self.view['inputs'])
+
+    def comments(self, session=None, progress=None):
+        """댓글 AJAX 조회 결과. 토큰이 없거나 요청이 실패하면 None."""
+        if '_comments' not in self.__dict__:
+            params = self.comment_params
+            self._comments = fetch_comments(self.url, params, session, progress) if params else None
+        return self._comments
@@ -0,0 +1,171 @@
+"""여러 갤러리를 공용 요청 예산 안에서 나눠 크롤링하는 스케줄러 (main.py --scheduler).
+
+갤러리마다 새 글 도착률(글/초)을 관찰해 폴링 간격을 정한다. 글이 많은 갤러리는 신선도 목표
+안에, 그리고 새 글이 목록 MAX_PAGES 페이지를 넘치기 전에 다시 보고, 목표 시간 동안 새 글이
+거의 없는 갤러리는 글이 쌓일 때까지 간격을 늘려 요청을 아낀다.
+
+폴링할 때가 된 갤러리는 가중 공정 큐(start-time fair queuing)로 줄을 세운다. 갤러리의 가상
+종료 시각은 가상 시작 시각 + 예상 요청 수 / weight이고, 공용 요청 예산(토큰 버킷)에 여유가
+있을 때 가상 종료 시각이 이른 갤러리부터 작업 큐에 증분 크롤링 작업을 등록한다. 예산이
+모자라면 갤러리들은 weight에 비례해 요청을 나눠 갖는다. 크롤링은 워커(main.py --worker)가
+하고, 끝나면 record_poll이 도착률과 요청 수를 갱신해 다음 폴링 시각을 정한다.
+"""
+import time
+import signal
+import logging
+import threading
+from config import (GALLERIES, MAX_PAGES, SCHEDULER_REQUESTS_PER_MINUTE, SCHEDULER_REQUEST_BURST,
+                    SCHEDULER_DEFAULT_FRESHNESS, SCHEDULER_TICK, SCHEDULER_MIN_INTERVAL,
+                    SCHEDULER_MAX_INTERVAL, SCHEDULER_MIN_POSTS_PER_POLL, SCHEDULER_MAX_POSTS_PER_POLL,
+                    SCHEDULER_RATE_SMOOTHING)
+from database import get_db
+from galleries import get_gallery_id
+from worker import enqueue_crawl, crawl_dedupe_key
+
+logger = logging.getLogger(__name__)
+
+class RequestBudget:
+    """분당 requests_per_minute개씩 채워지는 공용 요청 예산 (토큰 버킷)."""
+
+    def __init__(self, requests_per_minute=SCHEDULER_REQUESTS_PER_MINUTE, capacity=SCHEDULER_REQUEST_BURST):
+        self.rate = requests_per_minute / 60
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def try_spend(self, cost):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # 용량보다 비싼 크롤링도 버킷이 가득 차면 보내고, 넘친 만큼은 빚으로 남겨 다음 등록을 늦춘다
+        if self.tokens < min(cost, self.capacity):
+            return False
+        self.tokens -= cost
+        return True
+
+class FairQueue:
+    """갤러리별 가상 시작/종료 시각 (start-time fair queuing)."""
+
+    def __init__(self):
+        self.virtual_time = 0.0
+        self.finish_tags = {}
+
+    def tags(self, gallery_id, cost, weight):
+        # 한동안 쉬던 갤러리가 밀린 몫을 한꺼번에 쓰지 않도록 시작 시각은 현재 가상 시각부터 잡는다
+        start = max(self.virtual_time, self.finish_tags.get(gallery_id, 0.0))
+        return start, start + cost / weight
+
+    def dispatched(self, gallery_id, start, finish):
+        self.virtual_time = max(self.virtual_time, start)
+        self.finish_tags[gallery_id] = finish
+
+def smooth(previous, observed):
+    """지수 이동 평균. 이전 값이 없으면 관찰값을 그대로 쓴다."""
+    if previous is None:
+        return observed
+    return previous + SCHEDULER_RATE_SMOOTHING * (observed - previous)
+
+def next_interval(arrival_rate, freshness_target, previous_interval=None):
+    """도착률(글/초)과 신선도 목표(초)로 다음 폴링까지의 간격(초)을 정한다."""
+    if arrival_rate is None:
+        # 아직 관찰한 적이 없으면 신선도 목표대로 본다
+        interval = freshness_target
+    elif arrival_rate == 0:
+        # 새 글을 한 번도 보지 못했으면 간격을 두 배씩 늘린다
+        interval = (previous_interval or freshness_target) * 2
+    else:
+        # 신선도 목표 동안 새 글이 SCHEDULER_MIN_POSTS_PER_POLL개도 안 쌓이는 갤러리는 쌓일 때까지 기다리고,
+        # 글이 많은 갤러리는 목록 페이지를 넘칠 만큼 쌓이기 전에 본다
+        interval = max(freshness_target, SCHEDULER_MIN_POSTS_PER_POLL / arrival_rate)
+        interval = min(interval, SCHEDULER_MAX_POSTS_PER_POLL / arrival_rate)
+    return min(max(interval, SCHEDULER_MIN_INTERVAL), SCHEDULER_MAX_INTERVAL)
+
+def estimated_cost(gallery):
+    """크롤링 한 번의 예상 요청 수. 아직 관찰하지 않았으면 목록 MAX_PAGES 페이지로 잡는다."""
+    return gallery['request_cost'] or MAX_PAGES
+
+def sync_galleries(db, galleries=GALLERIES):
+    """config.GALLERIES를 gallery_schedule에 반영한다. 관찰한 도착률 등은 유지한다."""
+    entries = []
+    for gallery in galleries:
+        gallery_id = get_gallery_id(gallery['url'])
+        weight = gallery.get('weight', 1.0)
+        if not gallery_id or weight <= 0:
+            raise ValueError(f"갤러리 설정이 잘못되었습니다: {gallery}")
+        entries.append({'gallery_id': gallery_id, 'url': gallery['url'], 'weight': weight,
+                        'freshness_target': gallery.get('freshness', SCHEDULER_DEFAULT_FRESHNESS)})
+    db.sync_gallery_schedule(entries)
+    return len(entries)
+
+def record_poll(db, gallery_id, started_at, processed):
+    """스케줄러가 등록한 크롤링이 끝난 뒤 워커가 호출한다. processed: 본문을 받은 게시물 수."""
+    gallery = next((row for row in db.get_gallery_schedule() if row['gallery_id'] == gallery_id), None)
+    if gallery is None:
+        return
+    high_water_mark = db.get_high_water_mark(gallery_id)
+    new_posts = None
+    arrival_rate = gallery['arrival_rate']
+    if gallery['last_polled_at'] is not None and gallery['last_high_water_mark']:
+        elapsed = started_at - gallery['last_polled_at']
+        if elapsed > 0:
+            # 글번호는 갤러리 안에서 차례로 매겨지므로 최고 글번호 차이가 그동안 올라온 글 수다 (삭제된 글 포함)
+            new_posts = max(high_water_mark - gallery['last_high_water_mark'], 0)
+            arrival_rate = smooth(arrival_rate, new_posts / elapsed)
+    # 목록 페이지 수는 세지 않으므로 목록 한 페이지 + 본문을 받은 게시물마다 한 번으로 어림한다
+    request_cost = smooth(gallery['request_cost'], 1 + processed)
+    poll_interval = next_interval(arrival_rate, gallery['freshness_target'], gallery['poll_interval'])
+    db.record_gallery_poll(gallery_id, started_at, high_water_mark, new_posts, arrival_rate, request_cost,
+                           poll_interval)
+    logger.info(f"갤러리 {gallery_id}: 새 글 {new_posts if new_posts is not None else '-'}개, "
+                f"도착률 {(arrival_rate or 0) * 3600:.1f}개/시간, 다음 폴링 {poll_interval:.0f}초 뒤")
+
+class Scheduler:
+    def __init__(self, budget=None, tick=SCHEDULER_TICK):
+        self.budget = budget or RequestBudget()
+        self.queue = FairQueue()
+        self.tick = tick
+        self.stopping = threading.Event()
+
+    def request_stop(self, signum=None, frame=None):
+        logger.info("스케줄러를 종료합니다")
+        self.stopping.set()
+
+    def dispatch(self, db, now=None):
+        """폴링할 때가 된 갤러리를 가상 종료 시각 순으로 예산이 허락하는 만큼 등록하고 gallery_id 목록을 반환한다."""
+        now = now or time.time()
+        candidates = []
+        for gallery in db.get_gallery_schedule(due_before=now):
+            # 지난 크롤링이 아직 대기/실행 중이면 건너뛴다
+            if db.is_job_active(crawl_dedupe_key('gallery', gallery['url'])):
+                continue
+            cost = estimated_cost(gallery)
+            start, finish = self.queue.tags(gallery['gallery_id'], cost, gallery['weight'])
+            candidates.append((finish, start, cost, gallery))
+
+        dispatched = []
+        for finish, start, cost, gallery in sorted(candidates, key=lambda candidate: candidate[:2]):
+            if not self.budget.try_spend(cost):
+                # 뒤 갤러리가 앞지르지 않도록 가장 이른 갤러리가 예산을 기다리면 모두 기다린다
+                break
+            self.queue.dispatched(gallery['gallery_id'], start, finish)
+            job_id = enqueue_crawl(db, 'gallery', gallery['url'], incremental=True, scheduled=True)
+            # 작업이 실패해 record_poll이 불리지 않아도 한 간격 뒤에 다시 시도한다
+            db.set_gallery_next_poll(gallery['gallery_id'],
+                                     now + (gallery['poll_interval'] or gallery['freshness_target']))
+            dispatched.append(gallery['gallery_id'])
+            logger.info(f"갤러리 {gallery['gallery_id']} 크롤링 등록 (작업 {job_id}, 예상 요청 {cost:.0f}개)")
+        return dispatched
+
+    def run(self):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.request_stop)
+            signal.signal(signal.SIGINT, self.request_stop)
+        db = get_db()
+        count = sync_galleries(db)
+        logger.info(f"스케줄러 시작: 갤러리 {count}개, 분당 요청 예산 {SCHEDULER_REQUESTS_PER_MINUTE}개")
+        while not self.stopping.is_set():
+            self.dispatch(db)
+            self.stopping.wait(self.tick)
+
+def run_scheduler():
+    Scheduler().run()
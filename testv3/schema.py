@@ -0,0 +1,411 @@
+"""SQLite 연결 설정과 스키마 마이그레이션.
+
+기본 테이블은 Database.create_tables가 만들고, 이후 변경은 MIGRATIONS에 버전 순서대로
+추가한다. 적용된 버전은 PRAGMA user_version에 기록되므로 기존 dc_gallery.db 파일도
+연결할 때 제자리에서 갱신된다.
+"""
+import sqlite3
+import logging
+from config import SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE, SEARCH_TOKENIZER, GALLERY_URL
+from galleries import get_gallery_id
+
+logger = logging.getLogger(__name__)
+
+def apply_pragmas(conn):
+    # WAL 모드에서는 웹 UI의 읽기가 크롤러의 쓰기를 막지 않는다
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+def add_lookup_indexes(conn):
+    # posts.number에 UNIQUE 인덱스를 걸기 전에 중복 게시물을 가장 오래된 행으로 합친다
+    conn.execute('''
+        CREATE TEMP TABLE post_id_map AS
+        SELECT p.id AS old_id, keep.id AS new_id
+        FROM posts p
+        JOIN (SELECT number, MIN(id) AS id FROM posts GROUP BY number) keep ON keep.number = p.number
+        WHERE p.id != keep.id
+    ''')
+    for table in ('comments', 'images'):
+        conn.execute(f'''
+            UPDATE {table}
+            SET post_id = (SELECT new_id FROM post_id_map WHERE old_id = {table}.post_id)
+            WHERE post_id IN (SELECT old_id FROM post_id_map)
+        ''')
+    removed = conn.execute("DELETE FROM posts WHERE id IN (SELECT old_id FROM post_id_map)").rowcount
+    conn.execute("DROP TABLE post_id_map")
+    if removed:
+        logger.info(f"중복 게시물 {removed}개 병합")
+
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_posts_number ON posts(number)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_date ON posts(date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_comments_post_id ON comments(post_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_images_post_id ON images(post_id)")
+
+def add_comment_data_no(conn):
+    conn.execute("ALTER TABLE comments ADD COLUMN data_no TEXT")
+    # data_no가 없던 기존 댓글은 재크롤링마다 중복 저장되었으므로 완전히 같은 행을 하나로 줄인다
+    removed = conn.execute('''
+        DELETE FROM comments WHERE id NOT IN (
+            SELECT MIN(id) FROM comments GROUP BY post_id, author, content, date
+        )
+    ''').rowcount
+    if removed:
+        logger.info(f"중복 댓글 {removed}개 삭제")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_comments_post_data_no ON comments(post_id, data_no)")
+
+def add_incremental_state(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS gallery_state (
+            gallery_id TEXT PRIMARY KEY,
+            high_water_mark INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS post_signals (
+            gallery_id TEXT NOT NULL,
+            number INTEGER NOT NULL,
+            views INTEGER,
+            votes INTEGER,
+            comment_count INTEGER,
+            PRIMARY KEY (gallery_id, number)
+        ) WITHOUT ROWID
+    ''')
+
+def content_addressed_images(conn):
+    # md5_hash UNIQUE 때문에 같은 이미지를 여러 게시물에 연결할 수 없었으므로 테이블을 다시 만든다.
+    # 기존 행은 파일 이름/md5를 그대로 두고, 새 행은 sha256 내용 주소 경로(ab/cd/<sha256>.<ext>)를 쓴다.
+    conn.execute('''
+        CREATE TABLE images_new (
+            id INTEGER PRIMARY KEY,
+            post_id INTEGER,
+            file_path TEXT,
+            md5_hash TEXT,
+            sha256 TEXT,
+            url TEXT,
+            position INTEGER,
+            size INTEGER,
+            FOREIGN KEY (post_id) REFERENCES posts (id)
+        )
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO images_new (id, post_id, file_path, md5_hash)
+        SELECT id, post_id, file_path, md5_hash FROM images
+    ''')
+    conn.execute("DROP TABLE images")
+    conn.execute("ALTER TABLE images_new RENAME TO images")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_images_post_id ON images(post_id)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_images_post_file ON images(post_id, file_path)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_images_sha256 ON images(sha256)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_images_url ON images(url)")
+
+def add_image_jobs(conn):
+    # 이미지 다운로드를 게시물 크롤링과 분리하기 위한 작업 목록. 다운로드 진행 상황도 여기에 남는다.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS image_jobs (
+            id INTEGER PRIMARY KEY,
+            post_id INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            position INTEGER,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            bytes_done INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            updated_at TEXT,
+            UNIQUE (post_id, url),
+            FOREIGN KEY (post_id) REFERENCES posts (id)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_image_jobs_status ON image_jobs(status)")
+
+def add_image_hashes(conn):
+    conn.execute("ALTER TABLE images ADD COLUMN phash INTEGER")
+    conn.execute("ALTER TABLE images ADD COLUMN dhash INTEGER")
+    # 유사 이미지로 판단되어 기존 파일에 연결된 행은 그 파일 경로를 가진다
+    conn.execute("ALTER TABLE images ADD COLUMN duplicate_of TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_images_file_path ON images(file_path)")
+
+def add_post_counters(conn):
+    # 목록 페이지가 댓글/이미지 테이블을 집계하지 않도록 게시물마다 개수를 저장하고 트리거로 유지한다
+    conn.execute("ALTER TABLE posts ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE posts ADD COLUMN image_count INTEGER NOT NULL DEFAULT 0")
+    conn.execute('''
+        UPDATE posts SET
+            comment_count = (SELECT COUNT(*) FROM comments WHERE post_id = posts.id),
+            image_count = (SELECT COUNT(*) FROM images WHERE post_id = posts.id)
+    ''')
+    for table, column in (('comments', 'comment_count'), ('images', 'image_count')):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_count_insert")
+        conn.execute(f'''
+            CREATE TRIGGER trg_{table}_count_insert AFTER INSERT ON {table} BEGIN
+                UPDATE posts SET {column} = {column} + 1 WHERE id = new.post_id;
+            END
+        ''')
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_count_delete")
+        conn.execute(f'''
+            CREATE TRIGGER trg_{table}_count_delete AFTER DELETE ON {table} BEGIN
+                UPDATE posts SET {column} = {column} - 1 WHERE id = old.post_id;
+            END
+        ''')
+
+    # COUNT(*)는 테이블 전체를 훑으므로 전체 행 수도 트리거로 유지한다
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS row_counts (
+            table_name TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    for table in ('posts', 'comments'):
+        conn.execute("INSERT OR REPLACE INTO row_counts (table_name, row_count) "
+                     f"VALUES ('{table}', (SELECT COUNT(*) FROM {table}))")
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_row_count_insert")
+        conn.execute(f'''
+            CREATE TRIGGER trg_{table}_row_count_insert AFTER INSERT ON {table} BEGIN
+                UPDATE row_counts SET row_count = row_count + 1 WHERE table_name = '{table}';
+            END
+        ''')
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_row_count_delete")
+        conn.execute(f'''
+            CREATE TRIGGER trg_{table}_row_count_delete AFTER DELETE ON {table} BEGIN
+                UPDATE row_counts SET row_count = row_count - 1 WHERE table_name = '{table}';
+            END
+        ''')
+
+    # 목록의 키셋 페이지네이션 (date, id) 순서. 역방향 스캔으로 최신순도 이 인덱스를 쓴다.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_date_id ON posts(date, id)")
+    conn.execute("DROP INDEX IF EXISTS idx_posts_date")
+
+def create_search_index(conn, tokenizer=SEARCH_TOKENIZER):
+    """게시물 제목/본문과 댓글의 FTS5 색인을 (다시) 만들고 트리거로 원본 테이블과 동기화한다.
+
+    색인은 외부 콘텐츠 테이블이라 본문을 중복 저장하지 않는다. 토크나이저를 바꾸려면
+    main.py --rebuild-search로 색인을 다시 만든다.
+    """
+    for table in ('posts_fts', 'comments_fts'):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    try:
+        conn.execute(f"CREATE VIRTUAL TABLE posts_fts USING fts5(title, content, content='posts', "
+                     f"content_rowid='id', tokenize='{tokenizer}')")
+    except sqlite3.OperationalError as e:
+        # trigram은 SQLite 3.34 이상에서만 쓸 수 있다
+        logger.warning(f"검색 토크나이저 '{tokenizer}'를 쓸 수 없어 unicode61을 사용합니다: {e}")
+        tokenizer = 'unicode61'
+        conn.execute(f"CREATE VIRTUAL TABLE posts_fts USING fts5(title, content, content='posts', "
+                     f"content_rowid='id', tokenize='{tokenizer}')")
+    conn.execute(f"CREATE VIRTUAL TABLE comments_fts USING fts5(content, content='comments', "
+                 f"content_rowid='id', tokenize='{tokenizer}')")
+
+    for table, columns in (('posts', ('title', 'content')), ('comments', ('content',))):
+        names = ', '.join(columns)
+        new_values = ', '.join(f"new.{column}" for column in columns)
+        old_values = ', '.join(f"old.{column}" for column in columns)
+        changed = ' OR '.join(f"old.{column} IS NOT new.{column}" for column in columns)
+        for trigger in ('insert', 'delete', 'update'):
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_fts_{trigger}")
+        conn.execute(f'''
+            CREATE TRIGGER trg_{table}_fts_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {table}_fts (rowid, {names}) VALUES (new.id, {new_values});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER trg_{table}_fts_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO {table}_fts ({table}_fts, rowid, {names}) VALUES ('delete', old.id, {old_values});
+            END
+        ''')
+        # 조회수만 바뀐 게시물 갱신은 색인을 건드리지 않는다
+        conn.execute(f'''
+            CREATE TRIGGER trg_{table}_fts_update AFTER UPDATE ON {table} WHEN {changed} BEGIN
+                INSERT INTO {table}_fts ({table}_fts, rowid, {names}) VALUES ('delete', old.id, {old_values});
+                INSERT INTO {table}_fts (rowid, {names}) VALUES (new.id, {new_values});
+            END
+        ''')
+        conn.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+    conn.execute("INSERT OR REPLACE INTO search_settings (name, value) VALUES ('tokenizer', ?)", (tokenizer,))
+
+def add_search_index(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS search_settings (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        ) WITHOUT ROWID
+    ''')
+    create_search_index(conn)
+
+def add_post_author_columns(conn):
+    # 분석용 내보내기(갤러리/월 분할, 작성자 IP)에 필요한 목록 값을 게시물에 저장한다
+    conn.execute("ALTER TABLE posts ADD COLUMN gallery_id TEXT")
+    conn.execute("ALTER TABLE posts ADD COLUMN author_id TEXT")
+    conn.execute("ALTER TABLE posts ADD COLUMN author_ip TEXT")
+    # 기존 게시물의 갤러리는 증분 크롤링이 남긴 post_signals에서 찾는다
+    conn.execute('''
+        UPDATE posts SET gallery_id = (
+            SELECT gallery_id FROM post_signals WHERE post_signals.number = CAST(posts.number AS INTEGER)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_gallery_id ON posts(gallery_id, id)")
+
+def add_archive_index(conn):
+    # compression.compress_old_data가 보관한 게시물의 위치 (세그먼트 파일, 프레임 오프셋/길이)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archived_posts (
+            post_id INTEGER PRIMARY KEY,
+            number TEXT,
+            gallery_id TEXT,
+            date TEXT,
+            segment TEXT NOT NULL,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            archived_at TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_archived_posts_number ON archived_posts(number)")
+
+def add_job_queue(conn):
+    # 웹 프로세스가 등록하고 워커 프로세스(main.py --worker)가 실행하는 작업 목록.
+    # 시각은 모두 유닉스 시간(초)이다.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            status TEXT NOT NULL DEFAULT 'queued',
+            priority INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            dedupe_key TEXT,
+            run_at REAL NOT NULL,
+            lease_owner TEXT,
+            lease_expires_at REAL,
+            heartbeat_at REAL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            finished_at REAL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs(status, run_at)")
+    # 같은 작업(예: 같은 갤러리 크롤링)이 대기/실행 중이면 다시 등록하지 않는다
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe_key ON jobs(dedupe_key)
+        WHERE dedupe_key IS NOT NULL AND status IN ('queued', 'running')
+    ''')
+
+def add_gallery_schedule(conn):
+    # 글번호는 갤러리마다 따로 매겨지므로 여러 갤러리를 크롤링하려면 (gallery_id, number)로 구분해야 한다.
+    # 갤러리를 모르는 예전 행(gallery_id NULL)은 모두 GALLERY_URL 한 갤러리에서 크롤링한 것이므로 그 갤러리로 채운다.
+    # 글번호가 유일했으므로 (gallery_id, number) 유일 색인과 겹치지 않는다
+    conn.execute("UPDATE posts SET gallery_id = ? WHERE gallery_id IS NULL", (get_gallery_id(GALLERY_URL),))
+    conn.execute("DROP INDEX IF EXISTS idx_posts_number")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_number ON posts(number)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_posts_gallery_number ON posts(gallery_id, number)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS gallery_schedule (
+            gallery_id TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            weight REAL NOT NULL DEFAULT 1.0,
+            freshness_target REAL NOT NULL,
+            enabled INTEGER NOT NULL DEFAULT 1,
+            poll_interval REAL,
+            arrival_rate REAL,
+            request_cost REAL,
+            next_poll_at REAL NOT NULL DEFAULT 0,
+            last_polled_at REAL,
+            last_high_water_mark INTEGER,
+            last_new_posts INTEGER
+        )
+    ''')
+
+def add_crawl_checkpoints(conn):
+    # 하나뿐인 crawling_progress 행(id=1) 대신 갤러리 크롤링 실행마다 끝낸 작업을 기록한다
+    conn.execute("DROP TABLE IF EXISTS crawling_progress")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_runs (
+            id INTEGER PRIMARY KEY,
+            gallery_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            engine TEXT NOT NULL,
+            incremental INTEGER NOT NULL DEFAULT 0,
+            max_pages INTEGER NOT NULL,
+            high_water_mark INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'running',
+            summary TEXT,
+            started_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            finished_at REAL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_crawl_runs_gallery_status ON crawl_runs(gallery_id, status)")
+    # kind: 'list'(key: 목록 페이지), 'post'(key: 글번호), 'comments'(key: 글번호:댓글 페이지)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_checkpoints (
+            run_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            post_id INTEGER,
+            data TEXT,
+            done_at REAL NOT NULL,
+            PRIMARY KEY (run_id, kind, key)
+        ) WITHOUT ROWID
+    ''')
+
+def add_image_orphans(conn):
+    # 유사 이미지로 연결해 더 쓰지 않는 파일. 같은 내용을 받은 다른 워커가 아직 레코드를 넣기 전일 수 있어
+    # 바로 지우지 않고, 유예 시간이 지난 뒤에도 참조가 없으면 정리한다
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS image_orphans (
+            file_path TEXT PRIMARY KEY,
+            created_at REAL NOT NULL
+        )
+    ''')
+
+def add_image_job_leases(conn):
+    # 여러 프로세스(작업 워커, --images)가 같은 작업이나 같은 URL을 동시에 받아 한 부분 파일에 쓰지 않도록
+    # 작업을 받기 전에 임대한다. 프로세스가 죽으면 임대가 만료된 작업을 다시 받는다
+    conn.execute("ALTER TABLE image_jobs ADD COLUMN lease_expires_at REAL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_image_jobs_url ON image_jobs(url)")
+
+def get_search_tokenizer(conn):
+    row = conn.execute("SELECT value FROM search_settings WHERE name = 'tokenizer'").fetchone()
+    return row[0] if row else None
+
+# (버전, 설명, 적용 함수)
+MIGRATIONS = [
+    (1, "조회용 인덱스 추가 (posts.number UNIQUE, posts.date, comments/images.post_id)", add_lookup_indexes),
+    (2, "comments.data_no 추가 및 (post_id, data_no) UNIQUE", add_comment_data_no),
+    (3, "증분 크롤링 상태 (gallery_state, post_signals)", add_incremental_state),
+    (4, "내용 주소 이미지 저장소 (images.sha256/url/position/size, 게시물-이미지 다대다)", content_addressed_images),
+    (5, "이미지 다운로드 작업 목록 (image_jobs)", add_image_jobs),
+    (6, "이미지 지각 해시 (images.phash/dhash/duplicate_of)", add_image_hashes),
+    (7, "게시물 댓글/이미지 수, 전체 행 수 캐시, (date, id) 인덱스", add_post_counters),
+    (8, "게시물/댓글 전문 검색 색인 (posts_fts, comments_fts)", add_search_index),
+    (9, "게시물 갤러리 id, 작성자 id/IP (posts.gallery_id/author_id/author_ip)", add_post_author_columns),
+    (10, "보관 게시물 색인 (archived_posts)", add_archive_index),
+    (11, "작업 큐 (jobs)", add_job_queue),
+    (12, "갤러리별 글번호 UNIQUE (gallery_id, number), 다중 갤러리 스케줄 (gallery_schedule)", add_gallery_schedule),
+    (13, "크롤링 실행별 체크포인트 (crawl_runs, crawl_checkpoints), crawling_progress 삭제", add_crawl_checkpoints),
+    (14, "정리할 이미지 파일 후보 (image_orphans)", add_image_orphans),
+    (15, "이미지 작업 임대 (image_jobs.lease_expires_at, url 인덱스)", add_image_job_leases),
+]
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    for version, description, apply in MIGRATIONS:
+        if version <= get_schema_version(conn):
+            continue
+        # 다른 프로세스가 동시에 마이그레이션하지 않도록 쓰기 잠금을 먼저 잡고 버전을 다시 확인한다
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= get_schema_version(conn):
+                conn.rollback()
+                continue
+            logger.info(f"스키마 마이그레이션 {version}: {description}")
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
@@ -0,0 +1,80 @@
+"""게시물/댓글 전문 검색 (SQLite FTS5).
+
+색인(posts_fts, comments_fts)은 schema.create_search_index가 만들고 트리거가 원본 테이블과
+동기화한다. 검색어는 공백으로 나눈 단어를 모두 포함하는 게시물을 찾으며, 제목/본문 또는 댓글
+중 가장 잘 맞는 곳의 BM25 순위와 발췌문을 돌려준다.
+"""
+import re
+import logging
+from markupsafe import Markup, escape
+from config import SEARCH_TOKENIZER, SEARCH_SNIPPET_TOKENS
+from schema import create_search_index, get_search_tokenizer
+
+logger = logging.getLogger(__name__)
+
+# 발췌문의 일치 구간 표시. HTML 이스케이프 뒤에 <mark>로 바꾼다.
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+# trigram 토크나이저는 세 글자 미만 검색어를 색인으로 찾을 수 없다
+TRIGRAM_MIN_LENGTH = 3
+
+def parse_query(query):
+    """검색어를 단어 목록으로 나눈다. FTS5 문법 문자는 단어의 일부로 취급한다."""
+    return [term for term in re.split(r'\s+', (query or '').replace('"', ' ')) if term]
+
+def build_match_query(terms, tokenizer):
+    # 단어마다 큰따옴표로 감싸 사용자 입력이 FTS5 연산자(AND, NEAR, * 등)로 해석되지 않게 한다
+    if tokenizer == 'trigram':
+        return ' '.join(f'"{term}"' for term in terms)
+    # 단어 단위 색인에서는 '게임'으로 '게임을'도 찾도록 접두어 검색을 쓴다
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def highlight(text):
+    """발췌문/제목을 HTML 이스케이프하고 일치 구간을 <mark>로 감싼다."""
+    return Markup(str(escape(text or '')).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>'))
+
+def mark_terms(text, terms):
+    pattern = '|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+    return re.sub(pattern, lambda m: f"{MATCH_START}{m.group(0)}{MATCH_END}", text or '', flags=re.IGNORECASE)
+
+def make_snippet(text, terms, width=SEARCH_SNIPPET_TOKENS * 4):
+    """색인 없이 찾은 결과의 발췌문. 처음 일치한 단어 주변을 잘라 표시한다."""
+    text = text or ''
+    lowered = text.lower()
+    positions = [lowered.find(term.lower()) for term in terms if term.lower() in lowered]
+    start = max(min(positions) - width // 4, 0) if positions else 0
+    snippet = mark_terms(text[start:start + width], terms)
+    return ('…' if start else '') + snippet + ('…' if start + width < len(text) else '')
+
+def search_posts(db, query, limit=20, offset=0):
+    """검색 결과 (게시물 목록, 다음 결과가 있는지). 각 게시물에는 rank, title_html, snippet_html이 있다."""
+    terms = parse_query(query)
+    if not terms:
+        return [], False
+    tokenizer = get_search_tokenizer(db.conn) or SEARCH_TOKENIZER
+    if tokenizer == 'trigram' and any(len(term) < TRIGRAM_MIN_LENGTH for term in terms):
+        # 두 글자 검색어("게임", "짤")는 색인을 쓸 수 없어 최신순 전체 검색으로 찾는다
+        rows = db.search_posts_like(terms, limit + 1, offset)
+        for row in rows:
+            row['title_highlight'] = mark_terms(row['title'], terms)
+            row['snippet'] = make_snippet(row.pop('match_text'), terms)
+    else:
+        rows = db.search_posts(build_match_query(terms, tokenizer), limit + 1, offset)
+    results = []
+    for row in rows[:limit]:
+        row['title_html'] = highlight(row.pop('title_highlight', None) or row['title'])
+        row['snippet_html'] = highlight(row['snippet'])
+        row['snippet'] = (row['snippet'] or '').replace(MATCH_START, '').replace(MATCH_END, '')
+        results.append(row)
+    return results, len(rows) > limit
+
+def rebuild_search_index(db, tokenizer=SEARCH_TOKENIZER):
+    """검색 색인을 지정한 토크나이저로 다시 만든다 (main.py --rebuild-search)."""
+    db.conn.execute("BEGIN IMMEDIATE")
+    try:
+        create_search_index(db.conn, tokenizer)
+        db.conn.commit()
+    except BaseException:
+        db.conn.rollback()
+        raise
+    logger.info(f"검색 색인 재생성 완료 (토크나이저: {get_search_tokenizer(db.conn)})")
@@ -1,7 +1,12 @@
-from flask import Flask, render_template, send_from_directory, jsonify, request, abort
-import os
-from database import get_db
-from config import IMAGES_FOLDER
+from flask import Flask, render_template, send_file, jsonify, request, abort
+from werkzeug.security import safe_join
+from database import get_db, encode_cursor, decode_cursor
+from config import (IMAGES_FOLDER, IMAGE_NEAR_DUPLICATE_THRESHOLD, IMAGE_VARIANTS, IMAGE_CACHE_MAX_AGE,
+                    IMAGE_LEGACY_CACHE_MAX_AGE)
+from image_index import find_similar_images
+from image_derivatives import resolve_image
+from search import search_posts
+from compression import load_archived_post
 from admin import admin
 
 app = Flask(__name__)
@@ -14,25 +19,84 @@ def index():
 @app.route('/posts')
 def posts():
     db = get_db()
-    page = request.args.get('page', 1, type=int)
     per_page = 20
-    posts, total_posts = db.get_posts_with_details(page, per_page)
-    return render_template('posts.html', posts=posts, page=page, per_page=per_page, total_posts=total_posts)
+    # ?before=<커서>: 더 오래된 페이지, ?after=<커서>: 더 새 페이지 (커서는 경계 게시물의 date, id)
+    before = decode_cursor(request.args['before']) if 'before' in request.args else None
+    after = decode_cursor(request.args['after']) if 'after' in request.args else None
+    if ('before' in request.args and before is None) or ('after' in request.args and after is None):
+        abort(400)
+    posts, has_older, has_newer = db.get_posts_page(per_page, before=before, after=after)
+    older_cursor = encode_cursor(posts[-1]) if posts and has_older else None
+    newer_cursor = encode_cursor(posts[0]) if posts and has_newer else None
+    return render_template('posts.html', posts=posts, total_posts=db.get_total_posts(),
+                           older_cursor=older_cursor, newer_cursor=newer_cursor)
 
 @app.route('/post/<int:post_id>')
 def post_detail(post_id):
     db = get_db()
     post = db.get_post(post_id)
-    if not post:
-        abort(404)
-    comments = db.get_comments(post_id)
-    images = db.get_images(post_id)
+    if post:
+        comments = db.get_comments(post_id)
+        images = db.get_images(post_id)
+    else:
+        # 보관된 게시물은 세그먼트에서 읽는다
+        post = load_archived_post(db, post_id)
+        if not post:
+            abort(404)
+        comments = post.pop('comments', [])
+        images = post.pop('images', [])
     return render_template('post_detail.html', post=post, comments=comments, images=images)
     
     
 @app.route('/images/<path:filename>')
 def serve_image(filename):
-    return send_from_directory(IMAGES_FOLDER, filename)
+    # ?variant=thumb|medium이면 WebP 파생 이미지, 없으면 원본
+    variant = request.args.get('variant')
+    if variant is not None and variant not in IMAGE_VARIANTS:
+        abort(404)
+    if safe_join(IMAGES_FOLDER, filename) is None or filename.startswith('.partial/'):
+        abort(404)
+    resolved = resolve_image(filename, variant)
+    if not resolved:
+        abort(404)
+    path, etag, immutable = resolved
+    # conditional=True: If-None-Match에는 304, Range 요청에는 206으로 답한다
+    response = send_file(path, conditional=True, etag=etag,
+                         max_age=IMAGE_CACHE_MAX_AGE if immutable else IMAGE_LEGACY_CACHE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = immutable
+    return response
+
+@app.route('/api/images/<int:image_id>/similar')
+def api_similar_images(image_id):
+    db = get_db()
+    if not db.get_image(image_id):
+        abort(404)
+    threshold = request.args.get('threshold', IMAGE_NEAR_DUPLICATE_THRESHOLD, type=int)
+    return jsonify(find_similar_images(db, image_id, threshold))
+
+@app.route('/search')
+def search():
+    db = get_db()
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = 20
+    results, has_more = search_posts(db, query, per_page, (page - 1) * per_page)
+    return render_template('search.html', query=query, results=results, page=page, has_more=has_more)
+
+@app.route('/api/search')
+def api_search():
+    db = get_db()
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    results, has_more = search_posts(db, query, limit, offset)
+    return jsonify({
+        'query': query,
+        'results': [{key: str(value) if key.endswith('_html') else value for key, value in row.items()}
+                    for row in results],
+        'has_more': has_more,
+    })
 
 @app.route('/api/posts')
 def api_posts():
@@ -0,0 +1,192 @@
+"""작업 큐 워커.
+
+웹 관리자 페이지는 크롤링을 직접 실행하지 않고 jobs 테이블에 작업을 등록한다. 워커
+(`main.py --worker -j N`)는 작업을 임대(lease)해 실행하고, 실행하는 동안 하트비트로 임대를
+연장한다. 워커가 죽어 하트비트가 끊기면 임대가 만료되어 다른 워커가 이어받고, 실패한 작업은
+백오프 후 재시도하며 max_attempts번 실패하면 dead로 옮긴다 (관리자 페이지에서 다시 등록).
+"""
+import os
+import time
+import signal
+import socket
+import logging
+import threading
+import multiprocessing
+from urllib.parse import urlparse, parse_qs
+from config import (DB_PATH, OUTPUT_FOLDER, LOG_FORMAT, LOG_LEVEL, JOB_VISIBILITY_TIMEOUT,
+                    JOB_HEARTBEAT_INTERVAL, JOB_POLL_INTERVAL, JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF,
+                    JOB_RETRY_BACKOFF_MAX)
+from database import Database, get_db
+from galleries import get_gallery_id
+
+logger = logging.getLogger(__name__)
+
+JOB_KINDS = ('gallery', 'comments', 'images')
+
+def crawl_dedupe_key(kind, target_url=None):
+    return f"{kind}:{target_url or ''}"
+
+def enqueue_crawl(db, kind, target_url=None, priority=0, **options):
+    """크롤링 작업을 등록하고 작업 id를 반환한다. 같은 대상의 작업이 대기/실행 중이면 그 id."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"알 수 없는 작업 종류: {kind}")
+    if kind in ('gallery', 'comments') and not target_url:
+        raise ValueError(f"{kind} 작업에는 대상 URL이 필요합니다")
+    payload = dict(options, url=target_url) if target_url else dict(options)
+    return db.enqueue_job(kind, payload, priority=priority, max_attempts=JOB_MAX_ATTEMPTS,
+                          dedupe_key=crawl_dedupe_key(kind, target_url))
+
+def run_gallery_job(db, payload):
+    # 크롤러 모듈은 셀레니움 등 무거운 의존성을 불러오므로 작업을 실행할 때 가져온다
+    from gallery_crawler import crawl_gallery
+    from async_crawler import crawl_gallery_async
+    from scheduler import record_poll
+
+    started_at = time.time()
+    if payload.get('engine') == 'async':
+        processed = crawl_gallery_async(payload['url'], OUTPUT_FOLDER, incremental=payload.get('incremental', False))
+    else:
+        processed = crawl_gallery(payload['url'], OUTPUT_FOLDER, incremental=payload.get('incremental', False))
+    if payload.get('scheduled'):
+        # 스케줄러가 등록한 작업이면 관찰한 도착률로 다음 폴링 시각을 정한다
+        record_poll(db, get_gallery_id(payload['url']), started_at, processed or 0)
+
+def run_comments_job(db, payload):
+    from comment_crawler import crawl_comments
+
+    comments = crawl_comments(payload['url'])
+    query = parse_qs(urlparse(payload['url']).query)
+    number = query.get('no', [None])[0]
+    post = db.get_post_by_number(number, query.get('id', [None])[0]) if number else None
+    if post:
+        db.insert_comments_bulk(post['id'], comments)
+    else:
+        logger.warning(f"댓글을 저장할 게시물이 없습니다 (글번호 {number}): {payload['url']}")
+
+def run_images_job(db, payload):
+    from image_downloader import backfill_images
+
+    backfill_images(db, include_failed=payload.get('include_failed', True))
+
+JOB_HANDLERS = {
+    'gallery': run_gallery_job,
+    'comments': run_comments_job,
+    'images': run_images_job,
+}
+
+def job_retry_delay(attempts):
+    return min(JOB_RETRY_BACKOFF * (2 ** max(attempts - 1, 0)), JOB_RETRY_BACKOFF_MAX)
+
+class Heartbeat:
+    """작업을 실행하는 동안 별도 스레드에서 임대를 연장한다."""
+
+    def __init__(self, job_id, owner, db_path=DB_PATH, interval=JOB_HEARTBEAT_INTERVAL,
+                 visibility_timeout=JOB_VISIBILITY_TIMEOUT):
+        self.job_id = job_id
+        self.owner = owner
+        self.db_path = db_path
+        self.interval = interval
+        self.visibility_timeout = visibility_timeout
+        self.stopped = threading.Event()
+        self.lost = False
+        self.thread = threading.Thread(target=self.run, name=f"job-heartbeat-{job_id}", daemon=True)
+
+    def run(self):
+        # sqlite 연결은 스레드마다 따로 연다
+        db = Database(self.db_path)
+        try:
+            while not self.stopped.wait(self.interval):
+                if not db.heartbeat_job(self.job_id, self.owner, self.visibility_timeout):
+                    self.lost = True
+                    logger.warning(f"작업 {self.job_id}의 임대를 잃었습니다 (다른 워커가 다시 실행할 수 있음)")
+                    return
+        finally:
+            db.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+class Worker:
+    def __init__(self, name='0', db_path=DB_PATH, kinds=None, poll_interval=JOB_POLL_INTERVAL,
+                 visibility_timeout=JOB_VISIBILITY_TIMEOUT):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{name}"
+        self.db_path = db_path
+        self.kinds = kinds
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.stopping = threading.Event()
+
+    def request_stop(self, signum=None, frame=None):
+        if self.stopping.is_set():
+            # 두 번째 신호는 실행 중인 작업을 기다리지 않고 끝낸다 (임대가 만료되면 다른 워커가 이어받는다)
+            raise KeyboardInterrupt
+        logger.info(f"워커 {self.owner}: 실행 중인 작업을 마치고 종료합니다")
+        self.stopping.set()
+
+    def run(self):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.request_stop)
+            signal.signal(signal.SIGINT, self.request_stop)
+        # 크롤러 함수들이 get_db()를 쓰므로 같은 스레드 연결을 공유한다
+        db = get_db() if self.db_path == DB_PATH else Database(self.db_path)
+        logger.info(f"워커 {self.owner} 시작")
+        while not self.stopping.is_set():
+            job = db.lease_job(self.owner, self.visibility_timeout, self.kinds)
+            if job is None:
+                self.stopping.wait(self.poll_interval)
+                continue
+            self.execute(db, job)
+        logger.info(f"워커 {self.owner} 종료")
+
+    def execute(self, db, job):
+        handler = JOB_HANDLERS.get(job['kind'])
+        logger.info(f"작업 {job['id']} ({job['kind']}) 시작, {job['attempts']}/{job['max_attempts']}번째 시도")
+        with Heartbeat(job['id'], self.owner, self.db_path, visibility_timeout=self.visibility_timeout):
+            try:
+                if handler is None:
+                    raise ValueError(f"알 수 없는 작업 종류: {job['kind']}")
+                handler(db, job['payload'])
+            except Exception as e:
+                logger.error(f"작업 {job['id']} ({job['kind']}) 실패: {e}")
+                db.fail_job(job['id'], self.owner, e, job_retry_delay(job['attempts']))
+                return False
+        db.complete_job(job['id'], self.owner)
+        logger.info(f"작업 {job['id']} ({job['kind']}) 완료")
+        return True
+
+def run_worker(name='0'):
+    # spawn으로 시작한 프로세스는 main.py의 로깅 설정을 물려받지 않는다
+    logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
+    Worker(name).run()
+
+def run_workers(processes=1):
+    """워커를 processes개 실행한다. 2개 이상이면 프로세스마다 워커 하나 (GIL을 나눠 쓰지 않는다)."""
+    if processes <= 1:
+        Worker().run()
+        return
+    # fork는 부모의 sqlite 연결/스레드를 복사하므로 spawn으로 새 인터프리터를 띄운다
+    context = multiprocessing.get_context('spawn')
+    children = [context.Process(target=run_worker, args=(str(index),), name=f"crawl-worker-{index}")
+                for index in range(processes)]
+    for child in children:
+        child.start()
+
+    def forward_signal(signum, frame):
+        for child in children:
+            if child.is_alive():
+                os.kill(child.pid, signum)
+
+    signal.signal(signal.SIGTERM, forward_signal)
+    logger.info(f"워커 프로세스 {processes}개 시작")
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        # Ctrl+C는 같은 프로세스 그룹의 워커에도 전달되어 각자 실행 중인 작업을 마치고 끝난다
+        for child in children:
+            child.join()